@@ -0,0 +1,469 @@
+"""
+CineFluent analytics - rolling aggregates behind the admin and dashboard numbers
+
+Activity is folded into small fixed-size structures as it happens instead of
+being recomputed from the progress table on every dashboard load:
+
+- one HyperLogLog sketch of active users per day (DAU; WAU/MAU are unions)
+- a HyperLogLog of sign-ups per weekly cohort, so retention tables come from
+  sketch intersections rather than per-user state
+- Welford running means of lesson session time per day
+- plain counters for completions and languages
+
+A background thread refreshes a materialized snapshot of every dashboard
+figure on a schedule; endpoints read that snapshot, so a read is O(1) no
+matter how much history is behind it.
+
+Each worker only sees the activity it served. With a SharedState, every
+refresh publishes the worker's aggregates to the shared file and merges those
+of all workers, since sketches, counters and running means all merge exactly.
+Every worker then reports the same host-wide figures. Rows of workers that
+have exited are kept, so their activity still counts, until they are older
+than the history window. Without a SharedState the figures cover one worker,
+and the snapshot says so in ``scope``.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 60.0  # seconds
+HISTORY_DAYS = 120  # daily sketches kept; enough for 8 cohorts x 8 weeks
+COHORT_WEEKS = 8
+
+
+class HyperLogLog:
+    """Cardinality sketch with 2**precision one-byte registers (~1.04/sqrt(2**p) error).
+
+    Sketches of the same precision merge by taking register maxima, which is
+    how weekly and monthly actives are computed from the daily sketches.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+        self._rank_bits = 64 - precision
+
+    def add(self, item: str) -> None:
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = value >> self._rank_bits
+        rank = self._rank_bits - (value & ((1 << self._rank_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        import numpy as np  # Only the refresh thread needs numpy; keep it out of the API's cold start
+
+        merged = np.maximum(np.frombuffer(self.registers, dtype=np.uint8), np.frombuffer(other.registers, dtype=np.uint8))
+        self.registers = bytearray(merged.tobytes())
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = 12) -> "HyperLogLog":
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def count(self) -> int:
+        import numpy as np
+
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+
+def intersection_count(a: HyperLogLog, b: HyperLogLog) -> int:
+    """|A & B| by inclusion-exclusion, clamped to what is possible"""
+    size_a, size_b = a.count(), b.count()
+    union = a.copy()
+    union.merge(b)
+    return max(0, min(size_a, size_b, size_a + size_b - union.count()))
+
+
+class RunningMean:
+    """Welford's streaming mean/variance; merges with Chan's parallel formula"""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningMean") -> None:
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def format_duration(seconds: float) -> str:
+    """23m 45s / 1h 05m, the style the dashboard has always shown"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+def format_percent(fraction: Optional[float], signed: bool = False) -> str:
+    if fraction is None:
+        return "n/a"
+    return f"{100 * fraction:+.1f}%" if signed else f"{100 * fraction:.1f}%"
+
+
+def _merge_states(states: Iterable[Dict[str, Any]], precision: int, oldest: date) -> Dict[str, Any]:
+    """Combine exported worker aggregates (see Analytics._export) into one set, dropping days before ``oldest``"""
+    def sketch(registers: bytes) -> HyperLogLog:
+        return HyperLogLog(precision, bytearray(registers))
+
+    def merge_sketches(target: Dict[date, HyperLogLog], sketches: Dict[date, bytes]) -> None:
+        for day, registers in sketches.items():
+            if day < oldest:
+                continue
+            if day in target:
+                target[day].merge(sketch(registers))
+            else:
+                target[day] = sketch(registers)
+
+    merged: Dict[str, Any] = {
+        "all_users": HyperLogLog(precision),
+        "daily_active": {},
+        "cohorts": {},
+        "signups": Counter(),
+        "completions": Counter(),
+        "sessions": defaultdict(RunningMean),
+        "languages": Counter(),
+        "lessons_completed_total": 0,
+    }
+    for state in states:
+        merged["all_users"].merge(sketch(state["all_users"]))
+        merge_sketches(merged["daily_active"], state["daily_active"])
+        merge_sketches(merged["cohorts"], state["cohorts"])
+        merged["signups"].update(state["signups"])
+        merged["completions"].update(state["completions"])
+        for day, (count, mean, m2) in state["sessions"].items():
+            other = RunningMean()
+            other.count, other.mean, other.m2 = count, mean, m2
+            merged["sessions"][day].merge(other)
+        merged["languages"].update(state["languages"])
+        merged["lessons_completed_total"] += state["lessons_completed_total"]
+    return merged
+
+
+class Analytics:
+    """Incrementally maintained aggregates plus a periodically materialized snapshot"""
+
+    def __init__(self, precision: int = 12, history_days: int = HISTORY_DAYS, shared: Optional[SharedState] = None):
+        self.precision = precision
+        self.history_days = history_days
+        self.shared = shared
+        self.publish_errors = 0
+        self._worker: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._all_users = HyperLogLog(precision)
+        self._daily_active: Dict[date, HyperLogLog] = {}
+        self._cohorts: Dict[date, HyperLogLog] = {}
+        self._signups: Counter = Counter()  # day -> new users
+        self._completions: Counter = Counter()  # day -> lessons completed
+        self._sessions: Dict[date, RunningMean] = defaultdict(RunningMean)
+        self._languages: Counter = Counter()
+        self._lessons_completed_total = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if shared is not None:
+            shared.create_tables(
+                """
+                CREATE TABLE IF NOT EXISTS analytics_workers (worker TEXT PRIMARY KEY, state BLOB NOT NULL, updated REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS analytics_history (path TEXT PRIMARY KEY, worker TEXT NOT NULL, loaded REAL NOT NULL);
+                """
+            )
+
+    # Recording (called on the request path; O(1) each)
+
+    def record_signup(self, user_id: str, when: Optional[datetime] = None) -> None:
+        day = (when or datetime.now(timezone.utc)).date()
+        with self._lock:
+            self._all_users.add(user_id)
+            self._signups[day] += 1
+            self._sketch(self._cohorts, week_start(day)).add(user_id)
+
+    def record_activity(
+        self,
+        user_id: str,
+        when: Optional[datetime] = None,
+        time_spent: Optional[float] = None,
+        completed: bool = False,
+        language: Optional[str] = None,
+    ) -> None:
+        self._record(user_id, (when or datetime.now(timezone.utc)).date(), time_spent, completed, language)
+
+    def _record(self, user_id: str, day: date, time_spent: Optional[float], completed: bool, language: Optional[str]) -> None:
+        with self._lock:
+            self._all_users.add(user_id)
+            self._sketch(self._daily_active, day).add(user_id)
+            if time_spent:
+                self._sessions[day].add(float(time_spent))
+            if completed:
+                self._completions[day] += 1
+                self._lessons_completed_total += 1
+                if language:
+                    self._languages[language] += 1
+
+    def _sketch(self, sketches: Dict[date, HyperLogLog], key: date) -> HyperLogLog:
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = HyperLogLog(self.precision)
+        return sketch
+
+    def load_history(self, path: str) -> int:
+        """Replay users and progress events from a benchmarks.datagen SQLite file; returns events read"""
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            for user_id, created_at in connection.execute("SELECT id, created_at FROM users"):
+                self.record_signup(str(user_id), datetime.fromisoformat(created_at[:10]))
+            events = 0
+            rows = connection.execute("SELECT user_id, completed, time_spent, created_at FROM progress_events")
+            for user_id, completed, time_spent, created_at in rows:
+                self._record(str(user_id), date.fromisoformat(created_at[:10]), time_spent, bool(completed), None)
+                events += 1
+        finally:
+            connection.close()
+        logger.info(f"Analytics history loaded from {path}: {events} progress events")
+        return events
+
+    def latest_day(self) -> Optional[date]:
+        with self._lock:
+            return max(self._daily_active, default=None)
+
+    # Materialized snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest materialized aggregates (computed once if never refreshed)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self, today: Optional[date] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        today = today or datetime.now(timezone.utc).date()
+        with self._lock:
+            # Copy the small structures and compute outside the lock
+            self._prune(today)
+            state = self._export()
+        states = self._exchange(state) if self.shared is not None else [state]
+        merged = _merge_states(states, self.precision, today - timedelta(days=self.history_days))
+        daily, cohorts, all_users = merged["daily_active"], merged["cohorts"], merged["all_users"]
+        signups, completions = merged["signups"], merged["completions"]
+        sessions = RunningMean()
+        for day, mean in merged["sessions"].items():
+            if today - day < timedelta(days=7):
+                sessions.merge(mean)
+        languages = [language for language, _ in merged["languages"].most_common(3)]
+        completed_total = merged["lessons_completed_total"]
+
+        def active(first: date, days: int) -> HyperLogLog:
+            return HyperLogLog.union((daily[first + timedelta(days=i)] for i in range(days) if first + timedelta(days=i) in daily), self.precision)
+
+        this_week = active(today - timedelta(days=6), 7)
+        last_week = active(today - timedelta(days=13), 7)
+        weekly_active, previous_weekly_active = this_week.count(), last_week.count()
+        retained = intersection_count(last_week, this_week)
+
+        snapshot = {
+            "as_of": today.isoformat(),
+            "total_users": all_users.count(),
+            "new_users_today": signups.get(today, 0),
+            "new_users_this_week": sum(count for day, count in signups.items() if today - day < timedelta(days=7)),
+            "daily_active_users": daily[today].count() if today in daily else 0,
+            "weekly_active_users": weekly_active,
+            "monthly_active_users": active(today - timedelta(days=29), 30).count(),
+            "lessons_completed_today": completions.get(today, 0),
+            "lessons_completed_total": completed_total,
+            "average_session_seconds": sessions.mean if sessions.count else None,
+            "sessions_this_week": sessions.count,
+            "weekly_retention": retained / previous_weekly_active if previous_weekly_active else None,
+            "user_growth": (weekly_active - previous_weekly_active) / previous_weekly_active if previous_weekly_active else None,
+            "top_languages": languages,
+            "cohorts": self._cohort_table(cohorts, daily, today),
+            "scope": "host" if self.shared is not None else "worker",
+            "workers": len(states),
+            "refreshed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        snapshot["refresh_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _export(self) -> Dict[str, Any]:
+        """This worker's aggregates as plain values that pickle and merge (call under the lock)"""
+        return {
+            "all_users": bytes(self._all_users.registers),
+            "daily_active": {day: bytes(sketch.registers) for day, sketch in self._daily_active.items()},
+            "cohorts": {week: bytes(sketch.registers) for week, sketch in self._cohorts.items()},
+            "signups": dict(self._signups),
+            "completions": dict(self._completions),
+            "sessions": {day: (mean.count, mean.mean, mean.m2) for day, mean in self._sessions.items()},
+            "languages": dict(self._languages),
+            "lessons_completed_total": self._lessons_completed_total,
+        }
+
+    def _worker_id(self) -> str:
+        # Per process, not per instance: forked workers must not share the master's id
+        if self._worker is None or self._worker[0] != os.getpid():
+            self._worker = (os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        return self._worker[1]
+
+    def _exchange(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Publish this worker's state and return every worker's; falls back to this worker's alone"""
+        worker, now = self._worker_id(), time.time()
+        try:
+            with self.shared.transaction() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO analytics_workers (worker, state, updated) VALUES (?, ?, ?)",
+                    (worker, pickle.dumps(state, pickle.HIGHEST_PROTOCOL), now),
+                )
+                connection.execute("DELETE FROM analytics_workers WHERE updated < ?", (now - self.history_days * 86400,))
+            rows = self.shared.connection().execute("SELECT worker, state FROM analytics_workers").fetchall()
+        except sqlite3.Error as e:
+            self.publish_errors += 1
+            logger.warning(f"Analytics exchange failed, reporting this worker only: {e}")
+            return [state]
+        return [state] + [pickle.loads(data) for other, data in rows if other != worker]
+
+    def _claim_history(self, path: str) -> bool:
+        """True for the one worker that should replay ``path``; the others see its aggregates via the shared state"""
+        if self.shared is None:
+            return True
+        try:
+            with self.shared.transaction() as connection:
+                claimed = connection.execute(
+                    "INSERT OR IGNORE INTO analytics_history (path, worker, loaded) VALUES (?, ?, ?)",
+                    (os.path.abspath(path), self._worker_id(), time.time()),
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Could not claim analytics history {path}, skipping it: {e}")
+            return False
+        return claimed == 1
+
+    def _cohort_table(self, cohorts: Dict[date, HyperLogLog], daily: Dict[date, HyperLogLog], today: date) -> List[Dict[str, Any]]:
+        """Share of each weekly sign-up cohort active in each following week"""
+        current_week = week_start(today)
+        weekly: Dict[date, HyperLogLog] = {}
+        for day, sketch in daily.items():
+            weekly.setdefault(week_start(day), HyperLogLog(self.precision)).merge(sketch)
+
+        table = []
+        for offset in range(COHORT_WEEKS - 1, -1, -1):
+            cohort_week = current_week - timedelta(weeks=offset)
+            cohort = cohorts.get(cohort_week)
+            if cohort is None:
+                continue
+            size = cohort.count()
+            retention = []
+            for week in range(offset + 1):
+                active = weekly.get(cohort_week + timedelta(weeks=week))
+                retention.append(round(intersection_count(cohort, active) / size, 3) if active and size else 0.0)
+            table.append({"cohort": cohort_week.isoformat(), "users": size, "retention": retention})
+        return table
+
+    def _prune(self, today: date) -> None:
+        oldest = today - timedelta(days=self.history_days)
+        for sketches in (self._daily_active, self._cohorts, self._sessions, self._signups, self._completions):
+            for day in [day for day in sketches if day < oldest]:
+                del sketches[day]
+
+    # Scheduling
+
+    def start_refreshing(self, interval: float = DEFAULT_REFRESH_INTERVAL, history_path: Optional[str] = None) -> None:
+        """Refresh the snapshot every ``interval`` seconds on a daemon thread, after loading any history"""
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def refresh_loop() -> None:
+            if history_path and self._claim_history(history_path):
+                try:
+                    self.load_history(history_path)
+                except Exception as e:
+                    logger.error(f"Failed to load analytics history from {history_path}: {e}")
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Analytics refresh failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=refresh_loop, name="analytics-refresh", daemon=True)
+        self._thread.start()
+
+    def stop_refreshing(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compute CineFluent analytics from a generated activity history")
+    parser.add_argument("--db", required=True, help="SQLite file written by benchmarks.datagen")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="YYYY-MM-DD to report for (default: last activity day)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    analytics = Analytics()
+    started = time.perf_counter()
+    analytics.load_history(args.db)
+    loaded = time.perf_counter() - started
+    as_of = args.as_of or analytics.latest_day() or date.today()
+    snapshot = analytics.refresh(as_of)
+    print(json.dumps(snapshot, indent=2))
+    print(f"Loaded in {loaded:.1f}s; snapshot refresh took {snapshot['refresh_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+CineFluent vocabulary export - mastered-word store and streaming Anki/CSV decks
+
+Words a user masters (``POST /vocabulary/{word}/master``, or the
+``vocabularyMastered`` list of progress updates and graded quizzes) are
+remembered per user in mastering order, up to MAX_WORDS_PER_USER. With a
+SharedState they are kept in its SQLite file, so every worker exports the same
+deck. Without one, each worker keeps the words it served in memory.
+
+Exports are built incrementally so memory stays flat however large the deck is:
+
+- csv / tsv: rows are written into a small buffer and yielded every
+  ROWS_PER_CHUNK words, so the response streams while the deck is produced
+- apkg: an Anki package is a zip holding a SQLite collection
+  (``collection.anki2``, schema 11) and a media map. Notes and cards are
+  inserted into a temporary SQLite file in batches, the file is zipped into a
+  second temporary file, and that is streamed in CHUNK_SIZE reads and deleted.
+  Building it is blocking work, so callers run ``build_apkg`` in a worker
+  thread.
+
+Note GUIDs are derived from the word, so importing a newer export updates the
+existing notes instead of duplicating them.
+"""
+import csv
+import hashlib
+import html
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("apkg", "csv", "tsv")
+MEDIA_TYPES = {
+    "apkg": "application/octet-stream",
+    "csv": "text/csv; charset=utf-8",
+    "tsv": "text/tab-separated-values; charset=utf-8",
+}
+COLUMNS = ("word", "translation", "pronunciation", "example", "mastered_at")
+ROWS_PER_CHUNK = 500
+MAX_WORDS_PER_USER = 20_000  # far beyond any real vocabulary; further words are not recorded
+CHUNK_SIZE = 64 * 1024
+
+DECK_NAME = "CineFluent Vocabulary"
+DECK_ID = 1_609_459_200_001  # fixed ids, so repeated imports land in the same deck and note type
+MODEL_ID = 1_609_459_200_002
+FIELDS = ("Word", "Translation", "Pronunciation", "Example")
+NOTE_TAGS = " cinefluent "
+
+_FRONT = "<div class=word>{{Word}}</div><div class=pronunciation>{{Pronunciation}}</div>"
+_BACK = "{{FrontSide}}<hr id=answer><div>{{Translation}}</div><div class=example>{{Example}}</div>"
+_CSS = (
+    ".card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }\n"
+    ".word { font-size: 32px; }\n.pronunciation, .example { color: #666; }\n"
+)
+
+_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null, ver integer not null,
+    dty integer not null, usn integer not null, ls integer not null, conf text not null, models text not null,
+    decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null, usn integer not null,
+    tags text not null, flds text not null, sfld integer not null, csum integer not null, flags integer not null,
+    data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null, mod integer not null,
+    usn integer not null, type integer not null, queue integer not null, due integer not null, ivl integer not null,
+    factor integer not null, reps integer not null, lapses integer not null, left integer not null,
+    odue integer not null, odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null, ivl integer not null,
+    lastIvl integer not null, factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+
+class MasteredWords:
+    """Per-user mastered words (word -> first mastered time), in mastering order.
+
+    With a SharedState the calls block on SQLite, so callers on the event loop
+    run them on a worker thread.
+    """
+
+    def __init__(self, shared: Optional[SharedState] = None, max_words: int = MAX_WORDS_PER_USER):
+        self.shared = shared
+        self.max_words = max_words
+        self.recorded = 0
+        self.dropped = 0
+        self.errors = 0
+        self._users: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        if shared is not None:
+            shared.create_tables(
+                """
+                CREATE TABLE IF NOT EXISTS mastered_words (
+                    id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, word TEXT NOT NULL, mastered_at REAL NOT NULL,
+                    UNIQUE (user_id, word)
+                );
+                """
+            )
+
+    def record(self, user_id: str, words: Iterable[str]) -> int:
+        """Remember newly mastered words; returns how many were new"""
+        now = time.time()
+        words = [word.strip() for word in words if word.strip()]
+        if not words:
+            return 0
+        if self.shared is not None:
+            return self._record_shared(user_id, words, now)
+        added = 0
+        with self._lock:
+            mastered = self._users.setdefault(user_id, {})
+            for word in words:
+                if word in mastered:
+                    continue
+                if len(mastered) >= self.max_words:
+                    self.dropped += 1
+                    continue
+                mastered[word] = now
+                added += 1
+            self.recorded += added
+        return added
+
+    def _record_shared(self, user_id: str, words: List[str], now: float) -> int:
+        added = 0
+        try:
+            with self.shared.transaction() as connection:
+                count = connection.execute("SELECT COUNT(*) FROM mastered_words WHERE user_id = ?", (user_id,)).fetchone()[0]
+                for word in dict.fromkeys(words):
+                    if count + added >= self.max_words:
+                        self.dropped += 1
+                        continue
+                    added += connection.execute(
+                        "INSERT OR IGNORE INTO mastered_words (user_id, word, mastered_at) VALUES (?, ?, ?)",
+                        (user_id, word, now),
+                    ).rowcount
+        except sqlite3.Error as e:
+            # The progress update itself still succeeds; only the export misses these words
+            self.errors += 1
+            logger.error(f"Failed to record {len(words)} mastered words for {user_id}: {e}")
+            return 0
+        self.recorded += added
+        return added
+
+    def words(self, user_id: str) -> List[Tuple[str, float]]:
+        """(word, mastered at) pairs, oldest first; a copy, so exports don't hold the lock (or a transaction)"""
+        if self.shared is not None:
+            return self.shared.connection().execute(
+                "SELECT word, mastered_at FROM mastered_words WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+        with self._lock:
+            return list(self._users.get(user_id, {}).items())
+
+    def info(self) -> Dict[str, Any]:
+        counts = {"recorded": self.recorded, "dropped": self.dropped, "shared": self.shared is not None}
+        if self.shared is not None:
+            return {**counts, "errors": self.errors}
+        return {
+            "users": len(self._users),
+            "words": sum(len(words) for words in self._users.values()),
+            **counts,
+        }
+
+
+def deck_entries(catalog, mastered: Iterable[Tuple[str, float]]) -> Iterator[Dict[str, Any]]:
+    """Catalog vocabulary for each mastered word; words missing from the catalog keep empty fields"""
+    for word, mastered_at in mastered:
+        item = catalog.vocabulary_item(word) or {}
+        yield {
+            "word": word,
+            "translation": item.get("translation", ""),
+            "pronunciation": item.get("pronunciation", ""),
+            "example": item.get("example", ""),
+            "mastered_at": datetime.fromtimestamp(mastered_at, timezone.utc).isoformat(),
+        }
+
+
+def iter_delimited(entries: Iterable[Dict[str, Any]], delimiter: str) -> Iterator[str]:
+    """CSV (or TSV) text with a header row, yielded in chunks of ROWS_PER_CHUNK rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\r\n")
+    writer.writerow(COLUMNS)
+    rows = 0
+    for entry in entries:
+        writer.writerow([entry[column] for column in COLUMNS])
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _note_guid(word: str) -> str:
+    return hashlib.sha1(f"cinefluent:{word}".encode("utf-8")).hexdigest()[:16]
+
+
+def _checksum(field: str) -> int:
+    return int(hashlib.sha1(field.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _field(value: str) -> str:
+    # Anki fields are HTML, joined by the unit separator
+    return html.escape(value.replace("\x1f", " "), quote=False)
+
+
+def _collection_rows(now_ms: int) -> Tuple[Any, ...]:
+    model = {
+        "id": MODEL_ID,
+        "name": "CineFluent Word",
+        "type": 0,
+        "mod": now_ms // 1000,
+        "usn": -1,
+        "sortf": 0,
+        "did": DECK_ID,
+        "tmpls": [{"name": "Recognition", "ord": 0, "qfmt": _FRONT, "afmt": _BACK, "did": None, "bqfmt": "", "bafmt": ""}],
+        "flds": [
+            {"name": name, "ord": position, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+            for position, name in enumerate(FIELDS)
+        ],
+        "css": _CSS,
+        "latexPre": "\\documentclass[12pt]{article}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "tags": [],
+        "vers": [],
+        "req": [[0, "any", [0]]],
+    }
+    deck_defaults = {
+        "mod": now_ms // 1000, "usn": -1, "lrnToday": [0, 0], "revToday": [0, 0], "newToday": [0, 0],
+        "timeToday": [0, 0], "collapsed": False, "desc": "", "dyn": 0, "conf": 1, "extendNew": 10, "extendRev": 50,
+    }
+    decks = {
+        "1": {**deck_defaults, "id": 1, "name": "Default"},
+        str(DECK_ID): {**deck_defaults, "id": DECK_ID, "name": DECK_NAME, "desc": "Words mastered on CineFluent"},
+    }
+    dconf = {"1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0, "replayq": True,
+        "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7], "order": 1, "perDay": 20,
+                "separate": True},
+        "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1, "perDay": 100},
+        "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0},
+    }}
+    conf = {
+        "activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0, "estTimes": True,
+        "dueCounts": True, "curModel": str(MODEL_ID), "nextPos": 1, "sortType": "noteFld", "sortBackwards": False,
+        "addToCur": True,
+    }
+    return (
+        1, now_ms // 1000, now_ms, now_ms, 11, 0, 0, 0,
+        json.dumps(conf), json.dumps({str(MODEL_ID): model}), json.dumps(decks), json.dumps(dconf), "{}",
+    )
+
+
+def _write_collection(path: str, entries: Iterable[Dict[str, Any]]) -> int:
+    """Anki schema-11 collection with one note and one new card per entry; returns the note count"""
+    now_ms = int(time.time() * 1000)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(_SCHEMA)
+        connection.execute("INSERT INTO col VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", _collection_rows(now_ms))
+        notes: List[Tuple[Any, ...]] = []
+        cards: List[Tuple[Any, ...]] = []
+        count = 0
+
+        def flush():
+            connection.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", notes)
+            connection.executemany(
+                "INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", cards
+            )
+            notes.clear()
+            cards.clear()
+
+        for entry in entries:
+            fields = [_field(entry[column]) for column in ("word", "translation", "pronunciation", "example")]
+            note_id = now_ms + count  # ids only need to be unique; Anki uses creation milliseconds
+            notes.append((
+                note_id, _note_guid(entry["word"]), MODEL_ID, now_ms // 1000, -1, NOTE_TAGS, "\x1f".join(fields),
+                fields[0], _checksum(entry["word"]), 0, "",
+            ))
+            # New card, due in mastering order
+            cards.append((note_id, note_id, DECK_ID, 0, now_ms // 1000, -1, 0, 0, count + 1, 0, 0, 0, 0, 0, 0, 0, 0, ""))
+            count += 1
+            if len(notes) >= ROWS_PER_CHUNK:
+                flush()
+        flush()
+        connection.commit()
+        return count
+    finally:
+        connection.close()
+
+
+def build_apkg(entries: Iterable[Dict[str, Any]]) -> Tuple[str, int]:
+    """Write the entries as an Anki package to a temporary file; returns (path, note count). Blocking."""
+    with tempfile.TemporaryDirectory(prefix="cinefluent-anki-") as directory:
+        collection = os.path.join(directory, "collection.anki2")
+        count = _write_collection(collection, entries)
+        handle, path = tempfile.mkstemp(prefix="cinefluent-", suffix=".apkg")
+        try:
+            with os.fdopen(handle, "wb") as output, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as package:
+                package.write(collection, "collection.anki2")
+                package.writestr("media", "{}")
+        except BaseException:
+            os.unlink(path)
+            raise
+    return path, count
+
+
+def iter_file(path: str, remove: bool = True) -> Iterator[bytes]:
+    """The file's bytes in CHUNK_SIZE pieces; the file is deleted once read (or abandoned)"""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning(f"Could not remove export file {path}: {e}")
+
+
+def export_filename(extension: str, now: Optional[datetime] = None) -> str:
+    return f"cinefluent-vocabulary-{(now or datetime.now(timezone.utc)).strftime('%Y%m%d')}.{extension}"
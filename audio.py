@@ -0,0 +1,482 @@
+"""
+CineFluent audio - lesson clip serving with byte ranges, a hot-clip LRU and content-hashed URLs
+
+Clips come from ``AUDIO_DIR``:
+
+- ``clips/<name>.mp3``: a standalone clip; a lesson whose ``audioUrl`` is
+  ``/audio/<name>.mp3`` uses it
+- ``movies/<movie_id>.mp3`` with its frame index ``movies/<movie_id>.mp3.idx``:
+  the full movie audio. Lessons without a clip of their own are cut out of it,
+  from their ``timestamp`` to the next lesson's (at most MAX_CLIP_SECONDS).
+  MP3 is a sequence of self-contained frames, so a run of whole frames is
+  itself a playable stream and a lesson clip is just a byte range of the
+  movie file. The index (``python audio.py index AUDIO_DIR``) stores every
+  frame's byte offset, so a time maps to an offset with one division.
+
+Lesson payloads carry content-hashed URLs (``/audio/<name>.<digest>.mp3``);
+those responses are immutable and cached by browsers and CDNs for a year,
+while the plain catalog URL (or a stale digest) gets a short max-age.
+Requests may ask for a byte range (``Range: bytes=a-b``, as audio elements do
+when seeking). Small clips are kept in an in-process LRU of their bytes;
+larger ones are streamed from disk. A whole clip file is handed to the server
+with the ASGI path-send extension when it offers one (so it can sendfile it);
+slices and ranges are read in ``os.pread`` chunks off the event loop. The
+zero-copy-send extension (a file descriptor plus offset) would cover those
+too, but Starlette's ``@app.middleware("http")`` wrapper only passes path-send
+through.
+
+A digest is computed by reading the clip, once per file version and byte
+range, and the most recently used are remembered. Code on the event loop
+(lesson payloads) therefore builds URLs on a worker thread.
+"""
+import argparse
+import array
+import hashlib
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+
+from cache import LRUCache
+from singleflight import Entry
+from subtitles import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = "audio/mpeg"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # content-hashed URLs never change
+DEFAULT_MAX_AGE = 300  # plain or stale URLs
+DEFAULT_CLIP_SECONDS = 30.0  # last lesson of a movie
+MAX_CLIP_SECONDS = 60.0
+CHUNK_SIZE = 64 * 1024
+DIGEST_LENGTH = 16  # hex characters of sha256 in URLs and ETags
+MAX_DIGESTS = 100_000  # clip digests remembered (least recently used are forgotten and recomputed)
+
+_NAME_RE = re.compile(r"^[\w\-]+$")
+
+# Frame index file: header, then frame count + 1 little-endian uint64 offsets (the last is the end of the audio)
+INDEX_MAGIC = b"CFAX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHIII")  # magic, version, sample rate, samples per frame, frame count
+
+# MPEG audio header tables, indexed by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5) and layer bits
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_BITRATES = {  # kbit/s by bitrate index 1..14
+    (3, 3): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),  # MPEG-1 Layer I
+    (3, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),  # MPEG-1 Layer II
+    (3, 1): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG-1 Layer III
+    (2, 3): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),  # MPEG-2/2.5 Layer I
+    (2, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),  # MPEG-2/2.5 Layer II and III
+    (2, 1): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def parse_frame_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """(frame length in bytes, sample rate, samples per frame) of a 4-byte MPEG audio header, or None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    bitrate = _BITRATES[(3 if version == 3 else 2, layer)][bitrate_index - 1] * 1000
+    if layer == 3:  # Layer I
+        return (12 * bitrate // sample_rate + padding) * 4, sample_rate, 384
+    if layer == 1 and version != 3:  # Layer III of MPEG-2/2.5 has half-size frames
+        return 72 * bitrate // sample_rate + padding, sample_rate, 576
+    return 144 * bitrate // sample_rate + padding, sample_rate, 1152
+
+
+def _id3_size(data: bytes) -> int:
+    """Bytes taken by a leading ID3v2 tag (0 if there is none)"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+class FrameIndex(NamedTuple):
+    sample_rate: int
+    samples_per_frame: int
+    offsets: array.array  # frame count + 1 byte offsets
+
+    @property
+    def frames(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def duration(self) -> float:
+        return self.frames * self.samples_per_frame / self.sample_rate if self.sample_rate else 0.0
+
+    def byte_range(self, start: float, end: float) -> Tuple[int, int]:
+        """[first, last) bytes of the whole frames covering start..end seconds"""
+        frame_seconds = self.samples_per_frame / self.sample_rate
+        first = min(max(int(start / frame_seconds), 0), self.frames)
+        last = min(max(int(math.ceil(end / frame_seconds)), first), self.frames)
+        return self.offsets[first], self.offsets[last]
+
+
+def build_frame_index(path: str) -> FrameIndex:
+    """Scan an MP3 file's frame headers; bytes between frames (tags, junk) are skipped"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offsets = array.array("Q")
+    sample_rate = samples_per_frame = 0
+    position = _id3_size(data)
+    end = position
+    while position + 4 <= len(data):
+        header = parse_frame_header(data[position:position + 4])
+        if header is None or position + header[0] > len(data):
+            position += 1  # resynchronise on the next frame header
+            continue
+        length, rate, samples = header
+        if not sample_rate:
+            sample_rate, samples_per_frame = rate, samples
+        offsets.append(position)
+        position += length
+        end = position
+    offsets.append(end)
+    return FrameIndex(sample_rate, samples_per_frame, offsets)
+
+
+def write_frame_index(index: FrameIndex, path: str) -> None:
+    offsets = array.array("Q", index.offsets)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, index.sample_rate, index.samples_per_frame, index.frames))
+        f.write(offsets.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_frame_index(path: str) -> FrameIndex:
+    with open(path, "rb") as f:
+        magic, version, sample_rate, samples_per_frame, frames = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path} is not a version {INDEX_VERSION} frame index")
+        offsets = array.array("Q")
+        offsets.frombytes(f.read((frames + 1) * offsets.itemsize))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return FrameIndex(sample_rate, samples_per_frame, offsets)
+
+
+class Clip(NamedTuple):
+    name: str  # URL name: a clip file name or a lesson id
+    path: str
+    start: int  # byte range [start, end) of the file
+    end: int
+    mtime_ns: int
+    file_size: int
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (first, last) of a single ``bytes=`` range; None means the whole clip
+
+    Raises ValueError for an unsatisfiable range. Multiple ranges are answered
+    with the whole clip, which RFC 9110 allows.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, separator, last = header[len("bytes="):].strip().partition("-")
+    if not separator or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if not first:  # suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or length == 0:
+            raise ValueError("empty suffix range")
+        return max(length - suffix, 0), length - 1
+    first_byte = int(first)
+    last_byte = min(int(last), length - 1) if last else length - 1
+    if first_byte >= length or last_byte < first_byte:
+        raise ValueError("range starts past the end")
+    return first_byte, last_byte
+
+
+class FileRangeResponse(Response):
+    """Bytes [start, end) of a file; the whole file goes out with the server's path-send extension when it has one"""
+
+    def __init__(self, path: str, start: int, end: int, file_size: int, status_code: int, headers: Mapping[str, str]):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.whole_file = start == 0 and end == file_size
+        super().__init__(content=None, status_code=status_code, headers={**headers, "content-length": str(end - start)},
+                         media_type=MEDIA_TYPE)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.end <= self.start:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if self.whole_file and "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+        fd = await anyio.to_thread.run_sync(os.open, self.path, os.O_RDONLY)
+        try:
+            offset = self.start
+            while offset < self.end:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, self.end - offset), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset < self.end})
+            if offset < self.end:  # the file shrank underneath us
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
+
+
+class AudioLibrary:
+    """Resolves lesson clips under ``directory`` and builds their responses"""
+
+    def __init__(self, directory: Optional[str], cache_bytes: int, max_cached_clip: int):
+        self.directory = directory
+        self.max_cached_clip = max_cached_clip
+        self.cache = LRUCache(cache_bytes)
+        self.stats = {"memory": 0, "disk": 0, "ranges": 0, "not_modified": 0}
+        self._digests: "OrderedDict[Clip, str]" = OrderedDict()  # keyed by path, mtime, size and range
+        self._indexes: Dict[str, Tuple[int, FrameIndex]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    # Resolution
+
+    def _file(self, *parts: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(os.path.join(self.directory, *parts))
+        except OSError:
+            return None
+
+    def frame_index(self, movie_id: str, audio: os.stat_result) -> Optional[FrameIndex]:
+        """The movie's frame index, reloaded when the index file changes; None if missing or older than the audio"""
+        path = os.path.join(self.directory, "movies", f"{movie_id}.mp3.idx")
+        stat = self._file("movies", f"{movie_id}.mp3.idx")
+        if stat is None or stat.st_mtime_ns < audio.st_mtime_ns:
+            return None
+        cached = self._indexes.get(movie_id)
+        if cached is not None and cached[0] == stat.st_mtime_ns:
+            return cached[1]
+        try:
+            index = read_frame_index(path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Unreadable frame index {path}: {e}")
+            return None
+        with self._lock:
+            self._indexes[movie_id] = (stat.st_mtime_ns, index)
+        return index
+
+    def _slice(self, catalog, lesson: Dict[str, Any]) -> Optional[Clip]:
+        """The lesson's part of its movie's audio, from its timestamp to the next lesson's"""
+        movie_id = lesson["movieId"]
+        stat = self._file("movies", f"{movie_id}.mp3")
+        index = self.frame_index(movie_id, stat) if stat is not None else None
+        if index is None or not index.frames:
+            return None
+        try:
+            start = parse_timestamp(lesson["timestamp"])
+            starts = [parse_timestamp(other["timestamp"]) for other in catalog.lessons_for_movie(movie_id)]
+        except (KeyError, ValueError):
+            logger.warning(f"Lessons of movie {movie_id} have unusable timestamps; no clip for {lesson['id']}")
+            return None
+        end = min(min((s for s in starts if s > start), default=start + DEFAULT_CLIP_SECONDS), start + MAX_CLIP_SECONDS)
+        first, last = index.byte_range(start, end)
+        if last <= first:
+            return None
+        path = os.path.join(self.directory, "movies", f"{movie_id}.mp3")
+        return Clip(lesson["id"], path, first, last, stat.st_mtime_ns, stat.st_size)
+
+    def resolve(self, name: str, catalog) -> Optional[Clip]:
+        """Clip for a URL name: a clip file first, else the lesson with that id cut from its movie"""
+        if not self.enabled or not _NAME_RE.match(name):
+            return None
+        stat = self._file("clips", f"{name}.mp3")
+        if stat is not None:
+            path = os.path.join(self.directory, "clips", f"{name}.mp3")
+            return Clip(name, path, 0, stat.st_size, stat.st_mtime_ns, stat.st_size)
+        lesson = catalog.lesson(name)
+        return self._slice(catalog, lesson) if lesson else None
+
+    def lesson_clip(self, catalog, lesson: Dict[str, Any]) -> Optional[Clip]:
+        if not self.enabled:
+            return None
+        # The clip its audioUrl names, else the lesson's slice of the movie audio
+        names = (os.path.basename(lesson.get("audioUrl", "")).split(".", 1)[0], lesson["id"])
+        for name in dict.fromkeys(name for name in names if name):
+            clip = self.resolve(name, catalog)
+            if clip is not None:
+                return clip
+        return None
+
+    def lesson_url(self, catalog, lesson: Dict[str, Any]) -> str:
+        """Content-hashed URL of the lesson's clip, or its catalog audioUrl when there is no clip"""
+        clip = self.lesson_clip(catalog, lesson)
+        if clip is None:
+            return lesson["audioUrl"]
+        return f"/audio/{clip.name}.{self.digest(clip)}.mp3"
+
+    # Content
+
+    def read(self, clip: Clip) -> bytes:
+        with open(clip.path, "rb") as f:
+            f.seek(clip.start)
+            return f.read(clip.length)
+
+    def cached_bytes(self, clip: Clip) -> Optional[bytes]:
+        """The clip's bytes from the LRU (loaded on a miss), or None for clips too big to keep"""
+        if clip.length > self.max_cached_clip:
+            return None
+        entry = self.cache.get(clip)
+        if entry is not None:
+            return entry.value
+        data = self.read(clip)
+        self.cache.set(clip, Entry(data, math.inf, math.inf), len(data))
+        return data
+
+    def digest(self, clip: Clip) -> str:
+        """sha256 of the clip's bytes (truncated), remembered per file version and range; reads the clip on a miss"""
+        with self._lock:
+            digest = self._digests.get(clip)
+            if digest is not None:
+                self._digests.move_to_end(clip)
+        if digest is None:
+            data = self.cached_bytes(clip)
+            if data is not None:
+                digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+            else:
+                hasher = hashlib.sha256()
+                with open(clip.path, "rb") as f:
+                    f.seek(clip.start)
+                    remaining = clip.length
+                    while remaining > 0:
+                        chunk = f.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        hasher.update(chunk)
+                        remaining -= len(chunk)
+                digest = hasher.hexdigest()[:DIGEST_LENGTH]
+            with self._lock:
+                self._digests[clip] = digest
+                if len(self._digests) > MAX_DIGESTS:
+                    self._digests.popitem(last=False)
+        return digest
+
+    def response(self, filename: str, catalog, headers: Mapping[str, str]) -> Optional[Response]:
+        """Response for ``/audio/<filename>``, or None when there is no such clip"""
+        stem, _, extension = filename.rpartition(".")
+        if extension != "mp3":
+            return None
+        name, _, requested = stem.rpartition(".") if "." in stem else (stem, "", "")
+        clip = self.resolve(name, catalog)
+        if clip is None:
+            return None
+
+        digest = self.digest(clip)
+        etag = f'"{digest}"'
+        response_headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            # A URL names one version only if its digest matches what is there now
+            "cache-control": f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if requested == digest
+            else f"public, max-age={DEFAULT_MAX_AGE}",
+        }
+        if headers.get("if-none-match") in (etag, f"W/{etag}", "*"):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=response_headers)
+
+        byte_range = None
+        if headers.get("if-range") in (None, etag):
+            try:
+                byte_range = parse_range(headers.get("range"), clip.length)
+            except ValueError:
+                return Response(status_code=416, headers={**response_headers, "content-range": f"bytes */{clip.length}"})
+        first, last = byte_range or (0, clip.length - 1)
+        status_code = 200
+        if byte_range is not None:
+            status_code = 206
+            response_headers["content-range"] = f"bytes {first}-{last}/{clip.length}"
+            self.stats["ranges"] += 1
+
+        data = self.cached_bytes(clip)
+        if data is not None:
+            self.stats["memory"] += 1
+            return Response(data[first:last + 1], status_code=status_code, headers=response_headers, media_type=MEDIA_TYPE)
+        self.stats["disk"] += 1
+        return FileRangeResponse(clip.path, clip.start + first, clip.start + last + 1, clip.file_size, status_code, response_headers)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "cached_clips": len(self.cache),
+            "cached_bytes": self.cache.size,
+            "frame_indexes": len(self._indexes),
+            "digests": len(self._digests),
+            **self.stats,
+        }
+
+
+def index_directory(directory: str, force: bool = False) -> List[Tuple[str, FrameIndex]]:
+    """Build missing or outdated frame indexes for every movies/*.mp3 under ``directory``"""
+    movies = os.path.join(directory, "movies")
+    built = []
+    for filename in sorted(os.listdir(movies)):
+        if not filename.endswith(".mp3"):
+            continue
+        path = os.path.join(movies, filename)
+        index_path = f"{path}.idx"
+        if not force and os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+            continue
+        index = build_frame_index(path)
+        write_frame_index(index, index_path)
+        built.append((filename, index))
+        logger.info(f"Indexed {filename}: {index.frames} frames, {index.duration:.1f}s at {index.sample_rate} Hz")
+    return built
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build and inspect MP3 frame indexes for lesson clip slicing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    index = commands.add_parser("index", help="index every movies/<movie_id>.mp3 under an AUDIO_DIR")
+    index.add_argument("directory")
+    index.add_argument("--force", action="store_true", help="rebuild indexes that look up to date")
+    info = commands.add_parser("info", help="print an MP3 file's frame count and duration")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "index":
+        built = index_directory(args.directory, args.force)
+        print(f"Indexed {len(built)} movie audio files")
+        return
+
+    frame_index = build_frame_index(args.path)
+    print(f"frames: {frame_index.frames}")
+    print(f"sample rate: {frame_index.sample_rate} Hz, {frame_index.samples_per_frame} samples per frame")
+    print(f"duration: {frame_index.duration:.2f}s")
+    print(f"audio bytes: {frame_index.offsets[0]}-{frame_index.offsets[-1]}")
+
+
+if __name__ == "__main__":
+    main()
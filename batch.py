@@ -0,0 +1,113 @@
+"""
+CineFluent batch requests - several GET endpoints answered in one round trip
+
+Screens that load several resources at once (profile, stats, languages,
+achievements, weekly progress) can send them as one ``POST /api/v1/batch``.
+The batch request passes admission control and authentication once, and is
+charged the sum of its items' route costs (see ``batch_cost``). Each
+sub-request is then dispatched in-process through the whole ASGI app, so it
+gets the same routing, dependencies and error handling as a real request.
+Sub-requests carry the batch's user in their scope: admission control lets
+them through (the batch already paid for them and holds a concurrency slot)
+and authentication reuses that user instead of verifying the token again.
+Sub-requests run concurrently with ``asyncio.gather`` and each gets its own
+status, so one failing item does not fail the batch.
+
+Sub-request bodies are JSON already; they are spliced into the batch response
+as raw bytes rather than decoded and encoded again.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_REQUESTS = 10
+API_PREFIX = "/api/v1/"
+BATCH_PATH = "/api/v1/batch"
+BATCH_USER_KEY = "cinefluent.batch_user"  # scope key of the user the batch was authenticated as
+
+
+def split_target(target: str) -> Tuple[str, str]:
+    """(path, query string) of a batch item; only API paths other than the batch itself are allowed"""
+    parts = urlsplit(target)
+    if parts.scheme or parts.netloc or not parts.path.startswith(API_PREFIX) or parts.path.rstrip("/") == BATCH_PATH:
+        raise ValueError(f"Batch items must be API paths under {API_PREFIX}: {target}")
+    return parts.path, parts.query
+
+
+def batch_cost(targets: Sequence[str], cost: Callable[[str, str], float]) -> float:
+    """Tokens a batch spends: what its items would cost as separate GET requests"""
+    return sum(cost("GET", split_target(target)[0]) for target in targets)
+
+
+def _sub_scope(parent: Dict[str, Any], path: str, query: str, user_id: Optional[str]) -> Dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("latin-1"),
+        "headers": [(b"accept", b"application/json")],
+        "app": parent.get("app"),
+        "state": {},
+        "extensions": {},
+        BATCH_USER_KEY: user_id,
+    }
+
+
+class _Collector:
+    """ASGI send() target that keeps a sub-response's status, content type and body"""
+
+    def __init__(self):
+        self.status = 500
+        self.content_type = b""
+        self.chunks: List[bytes] = []
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            self.chunks.append(message.get("body", b""))
+
+    def json_body(self) -> bytes:
+        body = b"".join(self.chunks)
+        if self.content_type.startswith(b"application/json") and body:
+            return body
+        return json.dumps(body.decode("utf-8", "replace") if body else None).encode("utf-8")
+
+
+async def _receive() -> Dict[str, Any]:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def dispatch(app, parent_scope: Dict[str, Any], target: str, user_id: Optional[str]) -> Tuple[int, bytes]:
+    """Run one GET sub-request through the app; returns (status, JSON body bytes)"""
+    path, query = split_target(target)
+    collector = _Collector()
+    try:
+        await app(_sub_scope(parent_scope, path, query, user_id), _receive, collector.send)
+    except Exception as exc:
+        # The app's error middleware has already sent the 500 from its handler; it re-raises for the server log
+        logger.error(f"Batch item {target} failed: {exc}")
+    return collector.status, collector.json_body()
+
+
+async def run_batch(app, parent_scope: Dict[str, Any], targets: Sequence[str], user_id: Optional[str]) -> bytes:
+    """The batch response body: ``{"responses": [{"path", "status", "body"}, ...]}`` in request order"""
+    results = await asyncio.gather(*(dispatch(app, parent_scope, target, user_id) for target in targets))
+    items = [
+        b'{"path":%s,"status":%d,"body":%s}' % (json.dumps(target).encode("utf-8"), status, body)
+        for target, (status, body) in zip(targets, results)
+    ]
+    return b'{"responses":[' + b",".join(items) + b"]}"
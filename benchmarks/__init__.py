@@ -0,0 +1,3 @@
+"""
+CineFluent benchmarks - micro-benchmarks, in-process load tests and synthetic data
+"""
@@ -0,0 +1,319 @@
+"""
+Synthetic activity data at production volumes - users, progress events, posts and likes
+
+Everything is derived from ``--seed`` with an independent RNG per entity, so a
+run is fully deterministic and any user's history can be regenerated on its
+own. Rows are produced by generators and written in fixed-size batches, which
+keeps memory flat whether the output is a thousand rows or a hundred million:
+
+    python -m benchmarks.datagen --users 1000000 --movies 10000 --db /tmp/activity.db --snapshot /tmp/catalog.snap
+
+The catalog streams into the binary snapshot format (catalog_snapshot.py) and
+the activity tables into a SQLite file, which stands in for the persistence
+layer until the app has one.
+"""
+import argparse
+import logging
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from benchmarks.synthetic import LANGUAGES, SYLLABLES, lesson_count, write_catalog_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Fixed so that the same seed produces the same timestamps on every run
+DEFAULT_END = datetime(2024, 6, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 10_000
+PROGRESS_INTERVAL = 2.0  # seconds between progress log lines
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    native_language TEXT NOT NULL,
+    learning_language TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS progress_events (
+    user_id INTEGER NOT NULL,
+    movie_id TEXT NOT NULL,
+    lesson_id TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    time_spent INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    movie_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS likes (
+    post_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+) WITHOUT ROWID;
+"""
+
+# Created after the bulk load; maintaining them row by row would dominate the run
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_progress_user ON progress_events (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_progress_created ON progress_events (created_at);
+CREATE INDEX IF NOT EXISTS idx_posts_user ON posts (user_id);
+"""
+
+FIRST_NAMES = ("Alex", "Sam", "Maria", "Jon", "Lea", "Noah", "Ines", "Yuki", "Omar", "Lena", "Ravi", "Zoe")
+NATIVE_LANGUAGES = ("English", "English", "English", "Spanish", "French", "German", "Portuguese", "Japanese")
+
+
+def entity_rng(seed: int, kind: str, number: int) -> random.Random:
+    return random.Random(f"{seed}:{kind}:{number}")
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _skewed_pick(rng: random.Random, count: int) -> int:
+    """1..count with a popular head and a long tail (log-uniform)"""
+    return min(count, int(count ** rng.random()))
+
+
+def _signup(seed: int, user_id: int, end: datetime, days: int) -> datetime:
+    rng = entity_rng(seed, "signup", user_id)
+    return end - timedelta(days=days * rng.random() ** 0.7, seconds=rng.randint(0, 86_399))
+
+
+def iter_users(count: int, seed: int = 0, end: datetime = DEFAULT_END, days: int = 365) -> Iterator[tuple]:
+    for user_id in range(1, count + 1):
+        rng = entity_rng(seed, "user", user_id)
+        name = f"{rng.choice(FIRST_NAMES)} {''.join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()}"
+        yield (
+            user_id,
+            f"user{user_id}@example.com",
+            name,
+            rng.choice(NATIVE_LANGUAGES),
+            rng.choice(LANGUAGES),
+            1 + int(rng.expovariate(0.25)),
+            _timestamp(_signup(seed, user_id, end, days)),
+        )
+
+
+def iter_progress_events(
+    user_count: int,
+    movie_count: int,
+    seed: int = 0,
+    events_per_user: float = 20.0,
+    end: datetime = DEFAULT_END,
+    days: int = 365,
+) -> Iterator[tuple]:
+    """Each user works through lessons of a few movies in order, in sessions after signup.
+
+    Activity per user is exponentially distributed, so most users have a
+    handful of events and a few have hundreds, as on any consumer app.
+    """
+    for user_id in range(1, user_count + 1):
+        rng = entity_rng(seed, "activity", user_id)
+        moment = _signup(seed, user_id, end, days)
+        remaining = int(rng.expovariate(1.0 / events_per_user)) if events_per_user > 0 else 0
+        while remaining > 0:
+            movie_number = _skewed_pick(rng, movie_count)
+            total = lesson_count(seed, movie_number)
+            for lesson_number in range(1, min(total, remaining) + 1):
+                moment += timedelta(minutes=rng.randint(3, 20)) if rng.random() < 0.8 else timedelta(days=rng.expovariate(0.5))
+                if moment >= end:
+                    remaining = 0
+                    break
+                time_spent = rng.randint(60, 900)
+                score = min(100, max(0, int(rng.gauss(78, 15))))
+                yield (
+                    user_id,
+                    str(movie_number),
+                    f"{movie_number}_lesson_{lesson_number}",
+                    int(score >= 60),
+                    score,
+                    time_spent,
+                    _timestamp(moment),
+                )
+                remaining -= 1
+
+
+def iter_posts(count: int, user_count: int, movie_count: int, seed: int = 0, end: datetime = DEFAULT_END, days: int = 365) -> Iterator[tuple]:
+    for post_id in range(1, count + 1):
+        rng = entity_rng(seed, "post", post_id)
+        words = " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(5, 30)))
+        moment = end - timedelta(days=days * rng.random())
+        yield (post_id, _skewed_pick(rng, user_count), str(_skewed_pick(rng, movie_count)), words.capitalize() + ".", _timestamp(moment))
+
+
+def iter_likes(post_count: int, user_count: int, seed: int = 0, likes_per_post: float = 8.0, end: datetime = DEFAULT_END, days: int = 365) -> Iterator[tuple]:
+    """Likes per post are heavy-tailed; a repeated (post, user) pair is dropped on insert"""
+    for post_id in range(1, post_count + 1):
+        rng = entity_rng(seed, "likes", post_id)
+        moment = end - timedelta(days=days * rng.random())
+        for _ in range(min(user_count, int(rng.paretovariate(1.5) * likes_per_post / 3))):
+            moment += timedelta(minutes=rng.expovariate(0.1))
+            if moment >= end:
+                break
+            yield (post_id, rng.randint(1, user_count), _timestamp(moment))
+
+
+class Progress:
+    """Logs rows written and throughput at most every ``interval`` seconds"""
+
+    def __init__(self, label: str, total: Optional[int] = None, interval: float = PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def advance(self, rows: int) -> None:
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._log(now)
+
+    def finish(self) -> None:
+        self._log(time.perf_counter(), done=True)
+
+    def _log(self, now: float, done: bool = False) -> None:
+        elapsed = max(now - self.started, 1e-9)
+        share = f" ({100 * self.rows / self.total:.0f}%)" if self.total and not done else ""
+        state = "done" if done else "..."
+        logger.info(f"{self.label}: {self.rows:,} rows{share} in {elapsed:.1f}s, {self.rows / elapsed:,.0f} rows/s {state}")
+
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_insert(
+    connection: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[tuple],
+    total: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+    ignore_duplicates: bool = False,
+) -> int:
+    """executemany() in fixed-size batches, one transaction each; returns rows offered"""
+    verb = "INSERT OR IGNORE" if ignore_duplicates else "INSERT"
+    statement = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    progress = Progress(table, total)
+    for batch in _batches(rows, batch_size):
+        with connection:
+            connection.executemany(statement, batch)
+        progress.advance(len(batch))
+    progress.finish()
+    return progress.rows
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    # Bulk load: a crash means regenerating, so skip the journal and fsyncs
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.execute("PRAGMA cache_size=-65536")  # 64 MB page cache, the only memory that grows with output
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def generate(
+    db_path: Optional[str],
+    snapshot_path: Optional[str],
+    users: int,
+    movies: int,
+    posts: int,
+    seed: int = 0,
+    events_per_user: float = 20.0,
+    likes_per_post: float = 8.0,
+    days: int = 365,
+    end: datetime = DEFAULT_END,
+) -> dict:
+    """Write the requested datasets; returns row counts per table"""
+    counts = {}
+    if snapshot_path:
+        started = time.perf_counter()
+        write_catalog_snapshot(snapshot_path, movies, seed, progress=lambda section, rows: logger.info(f"catalog {section}: {rows:,} records"))
+        counts["movies"] = movies
+        logger.info(f"catalog snapshot: {movies:,} movies in {time.perf_counter() - started:.1f}s -> {snapshot_path}")
+
+    if db_path:
+        connection = open_database(db_path)
+        try:
+            counts["users"] = bulk_insert(
+                connection, "users",
+                ("id", "email", "name", "native_language", "learning_language", "level", "created_at"),
+                iter_users(users, seed, end, days), total=users,
+            )
+            counts["progress_events"] = bulk_insert(
+                connection, "progress_events",
+                ("user_id", "movie_id", "lesson_id", "completed", "score", "time_spent", "created_at"),
+                iter_progress_events(users, movies, seed, events_per_user, end, days),
+                total=int(users * events_per_user),
+            )
+            counts["posts"] = bulk_insert(
+                connection, "posts", ("id", "user_id", "movie_id", "content", "created_at"),
+                iter_posts(posts, users, movies, seed, end, days), total=posts,
+            )
+            counts["likes"] = bulk_insert(
+                connection, "likes", ("post_id", "user_id", "created_at"),
+                iter_likes(posts, users, seed, likes_per_post, end, days), ignore_duplicates=True,
+            )
+            logger.info("Creating indexes")
+            connection.executescript(INDEXES)
+        finally:
+            connection.close()
+    return counts
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic CineFluent catalogs and activity at scale")
+    parser.add_argument("--db", help="SQLite file for users, progress events, posts and likes")
+    parser.add_argument("--snapshot", help="catalog snapshot (.snap) to write")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--movies", type=int, default=1_000)
+    parser.add_argument("--posts", type=int, default=None, help="default: one per 5 users")
+    parser.add_argument("--events-per-user", type=float, default=20.0, help="mean progress events per user")
+    parser.add_argument("--likes-per-post", type=float, default=8.0)
+    parser.add_argument("--days", type=int, default=365, help="length of the activity history")
+    parser.add_argument("--end-date", type=_parse_date, default=DEFAULT_END, help="YYYY-MM-DD the history ends on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not args.db and not args.snapshot:
+        parser.error("nothing to do: pass --db and/or --snapshot")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    started = time.perf_counter()
+    counts = generate(
+        args.db, args.snapshot, args.users, args.movies,
+        args.posts if args.posts is not None else max(1, args.users // 5),
+        args.seed, args.events_per_user, args.likes_per_post, args.days, args.end_date,
+    )
+    summary = ", ".join(f"{table}={rows:,}" for table, rows in counts.items())
+    logger.info(f"Generated {summary} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
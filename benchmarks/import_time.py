@@ -0,0 +1,114 @@
+"""
+Cold-start import time of the API module, checked against a budget
+
+Imports ``main`` in fresh interpreters (nothing cached in sys.modules), reports
+the median wall time and, from ``-X importtime``, which of main's direct
+imports cost the most. Exits non-zero when the median exceeds ``--budget`` or
+when a module that is meant to load lazily shows up at import time, so CI
+catches cold-start regressions:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 9 --budget 600 --json import-time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = "main"
+DEFAULT_BUDGET_MS = 800.0
+# Loaded on first use (token handling, analytics refresh, event export), never by the import itself
+LAZY_MODULES = ("jose", "passlib", "numpy", "pyarrow")
+
+CHILD = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    f"import {MODULE}\n"
+    "elapsed = (time.perf_counter() - start) * 1000\n"
+    "print(json.dumps({'ms': elapsed, 'modules': sorted(sys.modules)}))\n"
+)
+
+
+def run_once(importtime: bool = False) -> Tuple[dict, str]:
+    """Import the module in a new interpreter; returns (measurement, -X importtime log)"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false")
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def direct_imports(log: str, parent: str = MODULE) -> List[Tuple[str, float]]:
+    """(module, cumulative ms) for each import made directly by ``parent``, heaviest first"""
+    entries = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+
+    # -X importtime lists children before their parent
+    for i, (depth, name, _) in enumerate(entries):
+        if depth == 0 and name == parent:
+            children = []
+            for child_depth, child, cumulative in reversed(entries[:i]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    children.append((child, cumulative))
+            return sorted(children, key=lambda item: -item[1])
+    return []
+
+
+def measure(runs: int) -> Dict[str, object]:
+    timings = []
+    modules: List[str] = []
+    for _ in range(runs):
+        measurement, _ = run_once()
+        timings.append(measurement["ms"])
+        modules = measurement["modules"]
+    _, log = run_once(importtime=True)
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "eager_lazy_modules": [name for name in LAZY_MODULES if name in modules],
+        "heaviest_imports": [(name, round(ms, 1)) for name, ms in direct_imports(log)[:10]],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the API module's cold import time against a budget")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", str(DEFAULT_BUDGET_MS))),
+                        help="maximum median import time in ms")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = measure(args.runs)
+    print(f"import {MODULE}: median {report['median_ms']:.1f} ms "
+          f"(min {report['min_ms']:.1f}, max {report['max_ms']:.1f}) over {args.runs} runs, budget {args.budget:.0f} ms")
+    print("Heaviest direct imports (cumulative, -X importtime):")
+    for name, ms in report["heaviest_imports"]:
+        print(f"  {name:<32} {ms:>8.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["median_ms"] > args.budget:
+        failures.append(f"median import time {report['median_ms']:.1f} ms exceeds the {args.budget:.0f} ms budget")
+    if report["eager_lazy_modules"]:
+        failures.append(f"modules meant to load lazily were imported eagerly: {', '.join(report['eager_lazy_modules'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
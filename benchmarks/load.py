@@ -0,0 +1,175 @@
+"""
+In-process ASGI load generator replaying a realistic mix of frontend calls
+
+Requests go straight into the app through httpx's ASGITransport (no sockets),
+so the numbers isolate the API's own cost. Reports p50/p95/p99 latency and
+requests/sec per route and overall:
+
+    python -m benchmarks.load --requests 5000 --concurrency 32
+    python -m benchmarks.load --scale 100 --duration 20 --json load-100x.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # Measure the routes, not the limiter
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.stats import percentile  # noqa: E402
+from benchmarks.synthetic import generate_catalog, install_catalog  # noqa: E402
+
+
+class Call(NamedTuple):
+    name: str  # route template used for reporting
+    weight: int
+    method: str
+    path: Callable[[random.Random, "Fixtures"], str]
+    body: Optional[dict] = None
+
+
+class Fixtures(NamedTuple):
+    movie_ids: List[str]
+    lesson_ids: List[str]
+    languages: List[str]
+
+
+# Weights approximate what the screens fire: Learn (movies, lessons), Lesson,
+# Progress/Profile (user, stats, languages, achievements, weekly) and Community
+MIX = [
+    Call("GET /api/v1/movies", 20, "GET", lambda rng, f: "/api/v1/movies"),
+    Call("GET /api/v1/movies?language=", 8, "GET", lambda rng, f: f"/api/v1/movies?language={rng.choice(f.languages)}"),
+    Call("GET /api/v1/movies/{id}", 8, "GET", lambda rng, f: f"/api/v1/movies/{rng.choice(f.movie_ids)}"),
+    Call("GET /api/v1/movies/{id}/lessons", 12, "GET", lambda rng, f: f"/api/v1/movies/{rng.choice(f.movie_ids)}/lessons"),
+    Call("GET /api/v1/lessons/{id}", 15, "GET", lambda rng, f: f"/api/v1/lessons/{rng.choice(f.lesson_ids)}"),
+    Call("POST /api/v1/progress", 6, "POST", lambda rng, f: "/api/v1/progress",
+         {"lessonId": "1", "completed": True, "score": 80, "timeSpent": 300, "vocabularyMastered": ["océano"]}),
+    Call("GET /api/v1/user/me", 6, "GET", lambda rng, f: "/api/v1/user/me"),
+    Call("GET /api/v1/user/stats", 4, "GET", lambda rng, f: "/api/v1/user/stats"),
+    Call("GET /api/v1/user/languages", 3, "GET", lambda rng, f: "/api/v1/user/languages"),
+    Call("GET /api/v1/achievements", 3, "GET", lambda rng, f: "/api/v1/achievements"),
+    Call("GET /api/v1/progress/weekly", 3, "GET", lambda rng, f: "/api/v1/progress/weekly"),
+    Call("GET /api/v1/community/posts", 5, "GET", lambda rng, f: "/api/v1/community/posts"),
+    Call("GET /api/v1/community/leaderboard", 3, "GET", lambda rng, f: "/api/v1/community/leaderboard"),
+    Call("GET /api/v1/search/movies", 3, "GET", lambda rng, f: f"/api/v1/search/movies?q={rng.choice('aeiou')}"),
+    Call("GET /api/v1/search/vocabulary", 1, "GET", lambda rng, f: f"/api/v1/search/vocabulary?q={rng.choice('aeiou')}"),
+]
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, dict]:
+    report = {}
+    everything: List[float] = []
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        everything.extend(values)
+        report[name] = {
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    everything.sort()
+    report["TOTAL"] = {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": len(everything) / elapsed,
+        "p50_ms": percentile(everything, 0.50) * 1000,
+        "p95_ms": percentile(everything, 0.95) * 1000,
+        "p99_ms": percentile(everything, 0.99) * 1000,
+    }
+    return report
+
+
+async def run_load(
+    requests: int = 2000,
+    duration: Optional[float] = None,
+    concurrency: int = 16,
+    seed: int = 0,
+    app=None,
+) -> Tuple[Dict[str, dict], float]:
+    """Fire the weighted mix at the app from ``concurrency`` clients; returns (report, elapsed)"""
+    app = app or main.app
+    catalog = main.catalog_store.current()
+    fixtures = Fixtures(
+        movie_ids=[movie["id"] for movie in catalog.movies],
+        lesson_ids=[lesson["id"] for lesson in catalog.lessons] or ["1"],
+        languages=sorted({movie["language"] for movie in catalog.movies}),
+    )
+    weights = [call.weight for call in MIX]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    remaining = [requests]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        login = await client.post("/api/v1/auth/login", json={"username": "demo@cinefluent.com", "password": "demo123"})
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        start = time.perf_counter()
+        deadline = start + duration if duration else None
+
+        async def worker(worker_seed: int) -> None:
+            rng = random.Random(worker_seed)
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                call = rng.choices(MIX, weights)[0]
+                sent = time.perf_counter()
+                response = await client.request(call.method, call.path(rng, fixtures), json=call.body, headers=headers)
+                latencies[call.name].append(time.perf_counter() - sent)
+                if response.status_code >= 400:
+                    errors[call.name] += 1
+
+        await asyncio.gather(*(worker(seed * 1000 + i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed), elapsed
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    print(f"{'route':<38} {'reqs':>7} {'err':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in report.items():
+        print(
+            f"{name:<38} {row['requests']:>7} {row['errors']:>5} {row['rps']:>9.1f} "
+            f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+        )
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process load test of the CineFluent API")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="run for this many seconds instead")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scale", type=int, default=1, help="synthetic catalog scale: 10, 100, 1000, ...")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("main").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.scale > 1:
+        catalog = generate_catalog(args.scale, args.seed)
+        install_catalog(catalog)
+        print(f"Installed synthetic catalog: {len(catalog['movies'])} movies, {len(catalog['lessons'])} lessons")
+
+    report, elapsed = asyncio.run(run_load(args.requests, args.duration, args.concurrency, args.seed))
+    print_report(report)
+    print(f"{report['TOTAL']['requests']} requests in {elapsed:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": args.scale, "concurrency": args.concurrency, "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,236 @@
+"""
+Micro-benchmarks for model construction, serialization, JWT handling, search and catalog lookups
+
+Benchmarks follow the pytest-benchmark calling convention (each takes a
+``benchmark`` callable and passes it the function under test), but run with a
+small built-in harness so no extra dependency is needed:
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --scale 100 --filter search --json micro.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # Measure the code under test, not the limiter
+
+import main  # noqa: E402
+from benchmarks.synthetic import generate_catalog, install_catalog  # noqa: E402
+from catalog_snapshot import Snapshot, write_snapshot  # noqa: E402
+from cue_index import movie_cues  # noqa: E402
+from grading import LessonKey  # noqa: E402
+from progress_overlay import ProgressOverlay  # noqa: E402
+from rate_limit import MemoryBucketBackend, RateLimitRule  # noqa: E402
+from recommendations import Recommender, declared_profile  # noqa: E402
+
+BENCHMARKS: List[Callable] = []
+
+
+def bench(fn: Callable) -> Callable:
+    BENCHMARKS.append(fn)
+    return fn
+
+
+class Benchmark:
+    """Minimal stand-in for the pytest-benchmark fixture: calibrates, runs rounds, keeps stats"""
+
+    def __init__(self, min_round_time: float = 0.005, rounds: int = 20):
+        self.min_round_time = min_round_time
+        self.rounds = rounds
+        self.stats: Optional[Dict[str, float]] = None
+
+    def __call__(self, fn: Callable, *args, **kwargs):
+        iterations = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = fn(*args, **kwargs)
+            if time.perf_counter() - start >= self.min_round_time or iterations >= 1 << 20:
+                break
+            iterations *= 2
+
+        timings = []
+        for _ in range(self.rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn(*args, **kwargs)
+            timings.append((time.perf_counter() - start) / iterations)
+        self.stats = {
+            "min_us": min(timings) * 1e6,
+            "median_us": statistics.median(timings) * 1e6,
+            "mean_us": statistics.fmean(timings) * 1e6,
+            "stddev_us": statistics.pstdev(timings) * 1e6,
+            "ops": 1.0 / statistics.median(timings),
+            "iterations": iterations,
+        }
+        return result
+
+
+_loop = asyncio.new_event_loop()
+
+
+def run(coroutine):
+    return _loop.run_until_complete(coroutine)
+
+
+# Models and serialization
+
+@bench
+def bench_movie_model(benchmark):
+    movie = main.catalog_store.current().movies[0]
+    benchmark(main.Movie, **movie)
+
+
+@bench
+def bench_lesson_model(benchmark):
+    lesson = main.catalog_store.current().lessons[0]
+    benchmark(main.Lesson, **lesson)
+
+
+@bench
+def bench_lesson_serialize(benchmark):
+    lesson = main.Lesson(**main.catalog_store.current().lessons[0])
+    benchmark(lesson.model_dump_json)
+
+
+@bench
+def bench_movie_list_serialize(benchmark):
+    movies = [main.Movie(**movie) for movie in main.catalog_store.current().movies[:50]]
+    benchmark(lambda: [movie.model_dump(mode="json") for movie in movies])
+
+
+# Authentication
+
+@bench
+def bench_jwt_create(benchmark):
+    benchmark(main.create_access_token, "1")
+
+
+@bench
+def bench_jwt_verify(benchmark):
+    token = main.create_access_token("1")
+    benchmark(main.verify_token, token)
+
+
+@bench
+def bench_rate_limit_consume(benchmark):
+    backend = MemoryBucketBackend()
+    rule = RateLimitRule(rate=1e9, capacity=1e9)
+    benchmark(backend.consume, "user:1", 1.0, rule)
+
+
+# Catalog and search
+
+@bench
+def bench_get_movies(benchmark):
+    benchmark(lambda: run(main.get_movies(language=None, user_id=None)))
+
+
+@bench
+def bench_get_movie_lessons(benchmark):
+    movie_id = main.catalog_store.current().movies[-1]["id"]
+    benchmark(lambda: run(main.get_movie_lessons(movie_id, user_id=None)))
+
+
+@bench
+def bench_cue_window(benchmark):
+    # The ten seconds a player asks for around the current position
+    catalog = main.catalog_store.current()
+    index = movie_cues(catalog, catalog.movies[-1]["id"])
+    position = index.duration / 2
+    benchmark(index.window, position, position + 10)
+
+
+@bench
+def bench_search_movies(benchmark):
+    benchmark(lambda: run(main.search_movies(q="night", language="Spanish", difficulty=None, min_difficulty=None,
+                                             max_difficulty=None, sort="difficulty", limit=20, user_id=None)))
+
+
+@bench
+def bench_progress_overlay(benchmark):
+    # A user who has completed a lesson in every third movie, overlaid on the full (cached) list
+    catalog = main.catalog_store.current()
+    overlay = ProgressOverlay()
+    for movie in catalog.movies[::3]:
+        lessons = catalog.lessons_for_movie(movie["id"])
+        overlay.record_completion("bench-user", catalog, lessons[0]["id"] if lessons else f"{movie['id']}_lesson_1")
+    movies = run(main.get_movies(language=None, user_id=None))
+    benchmark(overlay.movies, "bench-user", catalog, movies)
+
+
+@bench
+def bench_grade_answers(benchmark):
+    # A ten-question quiz with a typo in every free-text answer, the slow path of matching
+    quiz = list(main.catalog_store.current().quizzes[:10])
+    key = LessonKey("bench", quiz)
+    answers = {
+        question["id"]: question["correctAnswer"] if question.get("options") else "x" + question["correctAnswer"][1:]
+        for question in quiz
+    }
+    benchmark(key.grade, answers)
+
+
+@bench
+def bench_recommendations(benchmark):
+    # Online top-10 for one user with some history (the cache miss path of /movies/recommended)
+    catalog = main.catalog_store.current()
+    recommender = Recommender(catalog.movies, catalog.version)
+    languages, target = declared_profile(main.MOCK_USER_LANGUAGES)
+    completed = {movie["id"]: 1 for movie in catalog.movies[::7]}
+    benchmark(recommender.recommend, "bench-user", languages, target, completed, 10)
+
+
+@bench
+def bench_search_vocabulary(benchmark):
+    benchmark(lambda: run(main.search_vocabulary(q="ma", language=None, limit=50)))
+
+
+@bench
+def bench_snapshot_lookup(benchmark):
+    current = main.catalog_store.current()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snap")
+        write_snapshot({"version": current.version, "movies": list(current.movies), "lessons": list(current.lessons)}, path)
+        snapshot = Snapshot(path)
+        lesson_id = snapshot.lessons[len(snapshot.lessons) // 2]["id"]
+        benchmark(snapshot.lessons.get, lesson_id)
+        snapshot.close()
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run CineFluent micro-benchmarks")
+    parser.add_argument("--scale", type=int, default=1, help="synthetic catalog scale (1 = mock data size)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("main").setLevel(logging.WARNING)
+    if args.scale > 1:
+        install_catalog(generate_catalog(args.scale))
+
+    results = {}
+    print(f"{'benchmark':<32} {'min (us)':>10} {'median (us)':>12} {'mean (us)':>10} {'ops/s':>12}")
+    for fn in BENCHMARKS:
+        name = fn.__name__.replace("bench_", "")
+        if args.filter not in name:
+            continue
+        benchmark = Benchmark(rounds=args.rounds)
+        fn(benchmark)
+        stats = results[name] = benchmark.stats
+        print(f"{name:<32} {stats['min_us']:>10.2f} {stats['median_us']:>12.2f} {stats['mean_us']:>10.2f} {stats['ops']:>12,.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": args.scale, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
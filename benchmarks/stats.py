@@ -0,0 +1,12 @@
+"""
+Small statistics helpers shared by the benchmark reports
+"""
+import math
+from typing import List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
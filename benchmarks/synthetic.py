@@ -0,0 +1,171 @@
+"""
+Synthetic catalogs for benchmarks - the mock catalog scaled up 10x, 100x, 1000x with realistic shapes
+
+Usage:
+    python -m benchmarks.synthetic --scale 100 --out /tmp/catalog-100x.json
+    python -m benchmarks.synthetic --scale 1000 --out /tmp/catalog-1000x.snap
+"""
+import argparse
+import random
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LANGUAGES = ("Spanish", "French", "German", "Italian", "Portuguese")
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+THUMBNAILS = ("🐠", "🤠", "🐭", "💪", "👹", "💀", "❄️", "🌊", "🚀", "🦁")
+TITLE_WORDS = (
+    "Finding", "Lost", "Ocean", "Night", "City", "Toy", "Story", "Frozen", "Kingdom", "Secret",
+    "Garden", "Monsters", "Journey", "River", "Star", "Dream", "Little", "Great", "Wild", "Home",
+)
+SYLLABLES = ("ma", "lo", "ri", "te", "sa", "no", "ca", "vi", "de", "pu", "ga", "le", "mi", "so", "ta", "ne")
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _vocabulary_item(rng: random.Random) -> Dict[str, str]:
+    word = _word(rng)
+    return {
+        "word": word,
+        "translation": _word(rng),
+        "pronunciation": f"/{word.upper()}/",
+        "example": f"{word.capitalize()} {_word(rng)} {_word(rng)}.",
+    }
+
+
+def _quiz(rng: random.Random, question_id: str, item: Dict[str, str]) -> Dict[str, Any]:
+    options = [item["translation"]] + [_word(rng) for _ in range(3)]
+    rng.shuffle(options)
+    return {
+        "id": question_id,
+        "type": "multiple-choice",
+        "question": f"What does '{item['word']}' mean?",
+        "options": options,
+        "correctAnswer": item["translation"],
+        "explanation": f"'{item['word']}' means {item['translation']}.",
+    }
+
+
+def movie_rng(seed: int, movie_number: int) -> random.Random:
+    """Independent RNG per movie, so any movie can be regenerated without the ones before it"""
+    return random.Random(f"{seed}:movie:{movie_number}")
+
+
+def lesson_count(seed: int, movie_number: int) -> int:
+    return movie_rng(seed, movie_number).randint(10, 15)
+
+
+def generate_movie(seed: int, movie_number: int) -> Tuple[dict, List[dict]]:
+    """One movie and its lessons (vocabulary and quizzes embedded), deterministic per seed"""
+    rng = movie_rng(seed, movie_number)
+    movie_id = str(movie_number)
+    total_lessons = rng.randint(10, 15)  # Must stay the first draw, see lesson_count()
+    movie = {
+        "id": movie_id,
+        "title": f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {movie_number}",
+        "language": rng.choice(LANGUAGES),
+        "difficulty": rng.choice(LEVELS),
+        "difficultyScore": round(rng.uniform(0, 100), 1),
+        "rating": round(rng.uniform(3.5, 5.0), 1),
+        "duration": f"{rng.randint(80, 130)} min",
+        "scenes": f"{total_lessons} scenes",
+        "progress": 0,
+        "thumbnail": rng.choice(THUMBNAILS),
+        "totalLessons": total_lessons,
+        "completedLessons": 0,
+    }
+    lessons = []
+    for lesson_number in range(1, total_lessons + 1):
+        lesson_id = f"{movie_id}_lesson_{lesson_number}"
+        items = [_vocabulary_item(rng) for _ in range(rng.randint(2, 5))]
+        seconds = lesson_number * 420 + rng.randint(0, 300)
+        lessons.append({
+            "id": lesson_id,
+            "movieId": movie_id,
+            "title": f"Scene {lesson_number}",
+            "subtitle": " ".join(item["example"] for item in items[:2]),
+            "translation": " ".join(item["translation"] for item in items[:2]),
+            "audioUrl": f"/audio/{lesson_id}.mp3",
+            "timestamp": f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}",
+            "vocabulary": items,
+            "quiz": [_quiz(rng, f"{lesson_id}_q{i}", item) for i, item in enumerate(items[:3], start=1)],
+            "completed": False,
+        })
+    return movie, lessons
+
+
+def iter_catalog(movie_count: int, seed: int = 0) -> Iterator[Tuple[dict, List[dict]]]:
+    for movie_number in range(1, movie_count + 1):
+        yield generate_movie(seed, movie_number)
+
+
+def generate_catalog(scale: int = 1, seed: int = 0, base_movies: int = 8) -> Dict[str, Any]:
+    """An in-memory catalog with ``base_movies * scale`` movies and 10-15 lessons each"""
+    movies: List[dict] = []
+    lessons: List[dict] = []
+    for movie, movie_lessons in iter_catalog(base_movies * scale, seed):
+        movies.append(movie)
+        lessons.extend(movie_lessons)
+    return {
+        "version": f"synthetic-{scale}x-{seed}",
+        "movies": movies,
+        "lessons": lessons,
+        "vocabulary": [item for lesson in lessons for item in lesson["vocabulary"]],
+        "quizzes": [question for lesson in lessons for question in lesson["quiz"]],
+    }
+
+
+def write_catalog_snapshot(path: str, movie_count: int, seed: int = 0, progress: Optional[Callable[[str, int], None]] = None) -> None:
+    """Stream a synthetic catalog straight into a snapshot file.
+
+    Each section regenerates the movies from their per-movie seeds instead of
+    holding the catalog, so memory does not grow with the catalog (apart from
+    the snapshot writer's 8-byte offset and index entries per record).
+    """
+    from catalog_snapshot import SECTION_INDEXES, SnapshotWriter
+
+    def counted(section: str, records: Iterator[dict]) -> Iterator[dict]:
+        for number, record in enumerate(records, start=1):
+            if progress and number % 100_000 == 0:
+                progress(section, number)
+            yield record
+
+    sections = {
+        "movies": lambda: (movie for movie, _ in iter_catalog(movie_count, seed)),
+        "lessons": lambda: (lesson for _, lessons in iter_catalog(movie_count, seed) for lesson in lessons),
+        "vocabulary": lambda: (item for _, lessons in iter_catalog(movie_count, seed) for lesson in lessons for item in lesson["vocabulary"]),
+        "quizzes": lambda: (question for _, lessons in iter_catalog(movie_count, seed) for lesson in lessons for question in lesson["quiz"]),
+    }
+    with SnapshotWriter(path, f"synthetic-{movie_count}-{seed}") as writer:
+        for name, records in sections.items():
+            writer.add_section(name, counted(name, records()), SECTION_INDEXES[name])
+
+
+def install_catalog(catalog: Dict[str, Any]) -> None:
+    """Swap a generated catalog into the running app's catalog store"""
+    import main
+    from catalog_store import CatalogVersion
+
+    main.catalog_store.swap(CatalogVersion(catalog, source="synthetic"))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from catalog import save_catalog
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog")
+    parser.add_argument("--scale", type=int, default=10, help="multiple of the 8-movie mock catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="catalog .json, or .snap for a binary snapshot")
+    args = parser.parse_args(argv)
+
+    if args.out.endswith(".snap"):
+        write_catalog_snapshot(args.out, 8 * args.scale, args.seed)
+        print(f"Wrote {8 * args.scale} movies to {args.out}")
+        return
+    catalog = generate_catalog(args.scale, args.seed)
+    save_catalog(catalog, args.out)
+    print(f"Wrote {len(catalog['movies'])} movies and {len(catalog['lessons'])} lessons to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Over-the-wire throughput of the production server at different worker counts
+
+Unlike benchmarks.load (in-process, no sockets), this starts serve.py as a
+real server on a free local port for each worker count, drives it from
+several client processes over keep-alive HTTP connections, and reports
+requests/sec and latency percentiles, so the gain from extra workers shows up
+directly:
+
+    python -m benchmarks.throughput --workers 1,4 --duration 15
+    python -m benchmarks.throughput --workers 1,2,4 --clients 4 --json throughput.json
+
+The client processes compete with the server for CPU, so run it on a machine
+with a few spare cores; on a single core extra workers cannot help.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.stats import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cheap, cacheable reads the frontend makes on every page load
+PATHS = [
+    "/api/v1/movies",
+    "/api/v1/movies?difficulty=beginner",
+    "/api/v1/movies/1/lessons",
+    "/api/v1/search/movies?q=the",
+    "/health",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, server: str) -> subprocess.Popen:
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false", PYTHONUNBUFFERED="1")
+    command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--server", server]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy within 60s")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def drive(base_url: str, connections: int, duration: float) -> Dict[str, list]:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10) as client:
+        async def connection(offset: int) -> None:
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                path = PATHS[i % len(PATHS)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(connection(c) for c in range(connections)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def client_process(args: tuple) -> Dict[str, list]:
+    base_url, connections, duration = args
+    return asyncio.run(drive(base_url, connections, duration))
+
+
+def measure(workers: int, clients: int, connections: int, duration: float, server: str) -> Dict[str, float]:
+    port = free_port()
+    process = start_server(port, workers, server)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        # Short warm-up so every worker has built its caches before timing starts
+        with multiprocessing.Pool(clients) as pool:
+            pool.map(client_process, [(base_url, connections, 1.0)] * clients)
+            started = time.perf_counter()
+            results = pool.map(client_process, [(base_url, connections, duration)] * clients)
+            elapsed = time.perf_counter() - started
+    finally:
+        stop_server(process)
+
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(result["errors"] for result in results),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Measure server throughput at different worker counts")
+    parser.add_argument("--workers", default=f"1,{max(2, cpus // 2)}", help="comma-separated worker counts to compare")
+    parser.add_argument("--clients", type=int, default=max(1, cpus // 2), help="client processes generating load")
+    parser.add_argument("--connections", type=int, default=16, help="keep-alive connections per client process")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "uvicorn"), default="auto")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for workers in (int(count) for count in args.workers.split(",")):
+        result = measure(workers, args.clients, args.connections, args.duration, args.server)
+        results.append(result)
+        print(f"{workers:>3} workers: {result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>7.2f} ms  "
+              f"p99 {result['p99_ms']:>7.2f} ms  errors {result['errors']}")
+
+    baseline = results[0]["rps"] or 1.0
+    for result in results[1:]:
+        print(f"{result['workers']} workers vs {results[0]['workers']}: {result['rps'] / baseline:.2f}x throughput")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+CineFluent builtin catalog - the mock movies, lessons, vocabulary and quiz served without a catalog file
+
+Kept apart from main.py so the batch jobs can fall back to it without
+importing the app. catalog.default_catalog() wraps it as a catalog.
+"""
+
+MOCK_MOVIES = [
+    {
+        "id": "1",
+        "title": "Finding Nemo",
+        "language": "Spanish",
+        "difficulty": "Beginner",
+        "rating": 4.8,
+        "duration": "100 min",
+        "scenes": "12 scenes",
+        "progress": 35,
+        "thumbnail": "🐠",
+        "totalLessons": 12,
+        "completedLessons": 4
+    },
+    {
+        "id": "2",
+        "title": "Toy Story",
+        "language": "Spanish",
+        "difficulty": "Beginner",
+        "rating": 4.9,
+        "duration": "81 min",
+        "scenes": "10 scenes",
+        "progress": 100,
+        "thumbnail": "🤠",
+        "totalLessons": 10,
+        "completedLessons": 10
+    },
+    {
+        "id": "3",
+        "title": "Ratatouille",
+        "language": "French",
+        "difficulty": "Intermediate",
+        "rating": 4.7,
+        "duration": "111 min",
+        "scenes": "15 scenes",
+        "progress": 0,
+        "thumbnail": "🐭",
+        "totalLessons": 15,
+        "completedLessons": 0
+    },
+    {
+        "id": "4",
+        "title": "The Incredibles",
+        "language": "Spanish",
+        "difficulty": "Intermediate",
+        "rating": 4.6,
+        "duration": "115 min",
+        "scenes": "14 scenes",
+        "progress": 20,
+        "thumbnail": "💪",
+        "totalLessons": 14,
+        "completedLessons": 3
+    },
+    {
+        "id": "5",
+        "title": "Monsters, Inc.",
+        "language": "German",
+        "difficulty": "Beginner",
+        "rating": 4.5,
+        "duration": "92 min",
+        "scenes": "11 scenes",
+        "progress": 0,
+        "thumbnail": "👹",
+        "totalLessons": 11,
+        "completedLessons": 0
+    },
+    {
+        "id": "6",
+        "title": "Coco",
+        "language": "Spanish",
+        "difficulty": "Intermediate",
+        "rating": 4.9,
+        "duration": "105 min",
+        "scenes": "13 scenes",
+        "progress": 60,
+        "thumbnail": "💀",
+        "totalLessons": 13,
+        "completedLessons": 8
+    },
+    {
+        "id": "7",
+        "title": "Frozen",
+        "language": "French",
+        "difficulty": "Beginner",
+        "rating": 4.7,
+        "duration": "102 min",
+        "scenes": "12 scenes",
+        "progress": 0,
+        "thumbnail": "❄️",
+        "totalLessons": 12,
+        "completedLessons": 0
+    },
+    {
+        "id": "8",
+        "title": "Moana",
+        "language": "Spanish",
+        "difficulty": "Intermediate",
+        "rating": 4.8,
+        "duration": "107 min",
+        "scenes": "14 scenes",
+        "progress": 45,
+        "thumbnail": "🌊",
+        "totalLessons": 14,
+        "completedLessons": 6
+    }
+]
+
+MOCK_VOCABULARY = [
+    {
+        "word": "océano",
+        "translation": "ocean",
+        "pronunciation": "/oh-SEH-ah-no/",
+        "example": "El pez vive en el océano."
+    },
+    {
+        "word": "familia",
+        "translation": "family",
+        "pronunciation": "/fah-MEE-lee-ah/",
+        "example": "Mi familia es muy grande."
+    },
+    {
+        "word": "aventura",
+        "translation": "adventure",
+        "pronunciation": "/ah-ben-TOO-rah/",
+        "example": "Esta es una gran aventura."
+    },
+    {
+        "word": "amistad",
+        "translation": "friendship",
+        "pronunciation": "/ah-mees-TAHD/",
+        "example": "La amistad es muy importante."
+    }
+]
+
+MOCK_QUIZ = [
+    {
+        "id": "1",
+        "type": "multiple-choice",
+        "question": "What does 'océano' mean?",
+        "options": ["river", "ocean", "lake", "sea"],
+        "correctAnswer": "ocean",
+        "explanation": "'Océano' means ocean in Spanish."
+    },
+    {
+        "id": "2",
+        "type": "multiple-choice",
+        "question": "How do you say 'family' in Spanish?",
+        "options": ["amigo", "familia", "casa", "comida"],
+        "correctAnswer": "familia",
+        "explanation": "'Familia' means family in Spanish."
+    },
+    {
+        "id": "3",
+        "type": "fill-blank",
+        "question": "Complete: 'Mi _____ es grande.'",
+        "correctAnswer": "familia",
+        "explanation": "The correct word is 'familia' (family)."
+    }
+]
+
+MOCK_LESSONS = [
+    {
+        "id": "1",
+        "movieId": "1",
+        "title": "Meeting Nemo",
+        "subtitle": "Hola, soy Nemo. Vivo en el océano con mi familia.",
+        "translation": "Hello, I am Nemo. I live in the ocean with my family.",
+        "audioUrl": "/audio/lesson1.mp3",
+        "timestamp": "00:03:24",
+        "vocabulary": MOCK_VOCABULARY[:3],
+        "quiz": MOCK_QUIZ[:2],
+        "completed": False
+    },
+    {
+        "id": "2",
+        "movieId": "1",
+        "title": "The Great Barrier Reef",
+        "subtitle": "Este es nuestro hogar, el arrecife de coral.",
+        "translation": "This is our home, the coral reef.",
+        "audioUrl": "/audio/lesson2.mp3",
+        "timestamp": "00:05:12",
+        "vocabulary": [
+            {
+                "word": "hogar",
+                "translation": "home",
+                "pronunciation": "/oh-GAHR/",
+                "example": "Mi hogar está en el océano."
+            },
+            {
+                "word": "arrecife",
+                "translation": "reef",
+                "pronunciation": "/ah-reh-SEE-feh/",
+                "example": "El arrecife es hermoso."
+            }
+        ],
+        "quiz": [
+            {
+                "id": "4",
+                "type": "multiple-choice",
+                "question": "What does 'hogar' mean?",
+                "options": ["house", "home", "hotel", "hospital"],
+                "correctAnswer": "home",
+                "explanation": "'Hogar' means home in Spanish."
+            }
+        ],
+        "completed": True
+    }
+]
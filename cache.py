@@ -0,0 +1,377 @@
+"""
+CineFluent two-tier cache - a per-process LRU in front of a cache shared by all workers
+
+L1 is an in-process LRU bounded by the pickled size of its values, so it can
+hand back objects without any decoding. L2 is a pluggable backend shared by
+every worker on the host (SQLiteCacheBackend is the local stand-in for Redis
+or memcached): a value built by one worker is reused by the others instead of
+being recomputed and duplicated per process.
+
+Invalidation works by tag. ``invalidate_tag()`` drops matching entries from
+L2, drops them from the local L1 and appends a message to the backend's
+invalidation log; the other workers poll that log (at most every
+``poll_interval`` seconds, on their next cache read) and evict the same tag
+from their own L1.
+
+TwoTierCache implements singleflight.Store, so single-flight reads sit on top
+of it unchanged. With a shared tier it is a blocking store: single-flight
+reads serve L1 hits on the event loop and send L2 reads, writes and
+invalidation polls to a worker thread. Entry times are wall-clock because they
+are shared between processes; use ``SingleFlight(..., clock=time.time)``.
+"""
+import logging
+import math
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from singleflight import Entry, Store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_L1_BYTES = 64 * 1024 * 1024
+DEFAULT_POLL_INTERVAL = 1.0  # seconds between invalidation log polls
+PRUNE_INTERVAL = 60.0  # seconds between sweeps of expired shared entries
+INVALIDATION_RETENTION = 3600.0  # seconds invalidation messages are kept
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by total value size in bytes; expired entries drop on read"""
+
+    def __init__(self, max_bytes: int = DEFAULT_L1_BYTES, clock: Callable[[], float] = time.time):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Entry, int, Tuple[str, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0].stale_until <= self.clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key: Hashable, entry: Entry, size: int, tags: Tuple[str, ...] = ()) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (entry, size, tags)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = [key for key, (_, _, tags) in self._entries.items() if tag in tags]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedBackend:
+    """L2 storage shared between workers, plus the invalidation log they poll"""
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float, Tuple[str, ...]]]:
+        """(pickled value, fresh_until, stale_until, tags)"""
+        raise NotImplementedError
+
+    def set(self, key: str, data: bytes, fresh_until: float, stale_until: float, tags: Tuple[str, ...]) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_tag(self, tag: str) -> None:
+        """Delete entries with ``tag`` and publish an invalidation message"""
+        raise NotImplementedError
+
+    def invalidations(self, after: int) -> List[Tuple[int, str]]:
+        """(id, tag) messages published after message ``after``"""
+        raise NotImplementedError
+
+    def last_invalidation(self) -> int:
+        raise NotImplementedError
+
+    def prune(self, now: float) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def open(self) -> None:
+        """Connect for the calling thread ahead of its first request"""
+
+
+class SQLiteCacheBackend(SharedBackend):
+    """Shared cache in a SQLite file (WAL) for all workers on one host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL,
+                fresh_until REAL NOT NULL, stale_until REAL NOT NULL, tags TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS invalidations (id INTEGER PRIMARY KEY AUTOINCREMENT, tag TEXT NOT NULL, created REAL NOT NULL);
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # A connection must not cross fork(): workers forked from a preloading master open their own
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")  # A lost cache write only costs a recompute
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def open(self) -> None:
+        self._connection()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float, Tuple[str, ...]]]:
+        row = self._connection().execute(
+            "SELECT value, fresh_until, stale_until, tags FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, fresh_until, stale_until, tags = row
+        return value, fresh_until, stale_until, tuple(tags.split("\n")) if tags else ()
+
+    def set(self, key: str, data: bytes, fresh_until: float, stale_until: float, tags: Tuple[str, ...]) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, fresh_until, stale_until, tags) VALUES (?, ?, ?, ?, ?)",
+                (key, data, _finite(fresh_until), _finite(stale_until), "\n".join(tags)),
+            )
+            connection.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+
+    def delete(self, key: str) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            connection.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+
+    def invalidate_tag(self, tag: str) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            keys = connection.execute("SELECT key FROM cache_tags WHERE tag = ?", (tag,)).fetchall()
+            connection.executemany("DELETE FROM cache WHERE key = ?", keys)
+            connection.executemany("DELETE FROM cache_tags WHERE key = ?", keys)
+            connection.execute("INSERT INTO invalidations (tag, created) VALUES (?, ?)", (tag, time.time()))
+
+    def invalidations(self, after: int) -> List[Tuple[int, str]]:
+        return self._connection().execute("SELECT id, tag FROM invalidations WHERE id > ? ORDER BY id", (after,)).fetchall()
+
+    def last_invalidation(self) -> int:
+        return self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+
+    def prune(self, now: float) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            connection.execute("DELETE FROM cache_tags WHERE key IN (SELECT key FROM cache WHERE stale_until <= ?)", (now,))
+            connection.execute("DELETE FROM cache WHERE stale_until <= ?", (now,))
+            connection.execute("DELETE FROM invalidations WHERE created < ?", (now - INVALIDATION_RETENTION,))
+
+    def clear(self) -> None:
+        connection = self._connection()
+        with _transaction(connection):
+            connection.execute("DELETE FROM cache")
+            connection.execute("DELETE FROM cache_tags")
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT on an autocommit connection, rolled back on error"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _finite(value: float) -> float:
+    # SQLite stores inf, but keep the column comparable and portable
+    return value if math.isfinite(value) else 1e300
+
+
+def create_backend(url: str) -> Optional[SharedBackend]:
+    """L2 backend from a CACHE_BACKEND setting: "memory" (no shared tier) or "sqlite:///path/to/file.db" """
+    if url.startswith("sqlite:///"):
+        return SQLiteCacheBackend(url[len("sqlite:///"):])
+    if url in ("", "memory"):
+        return None
+    raise ValueError(f"Unsupported cache backend: {url}")
+
+
+class TwoTierCache(Store):
+    """singleflight.Store with an L1 LRU per process and an optional shared L2"""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_L1_BYTES,
+        backend: Optional[SharedBackend] = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.l1 = LRUCache(max_bytes, clock)
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.l2_errors = 0
+        self._last_seen = backend.last_invalidation() if backend else 0
+        self._last_poll = self._last_prune = clock()
+        self._poll_lock = threading.Lock()
+
+    @property
+    def blocking(self) -> bool:
+        return self.backend is not None
+
+    def local(self, key: Hashable) -> Optional[Entry]:
+        """L1 only; None while an invalidation poll is due, so get() runs it off the event loop"""
+        if self._poll_due():
+            return None
+        entry = self.l1.get(key)
+        if entry is not None:
+            self.l1_hits += 1
+        return entry
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        self._poll()
+        entry = self.l1.get(key)
+        if entry is not None:
+            self.l1_hits += 1
+            return entry
+        if self.backend is not None:
+            try:
+                row = self.backend.get(repr(key))
+            except sqlite3.Error as e:
+                self.l2_errors += 1
+                logger.warning(f"Shared cache read failed: {e}")
+                row = None
+            if row is not None and row[2] > self.clock():
+                data, fresh_until, stale_until, tags = row
+                entry = Entry(pickle.loads(data), fresh_until, stale_until)
+                self.l1.set(key, entry, len(data), tags)
+                self.l2_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, entry: Entry, tags: Tuple[str, ...] = ()) -> None:
+        data = pickle.dumps(entry.value, pickle.HIGHEST_PROTOCOL)
+        self.l1.set(key, entry, len(data), tags)
+        if self.backend is not None:
+            try:
+                self.backend.set(repr(key), data, entry.fresh_until, entry.stale_until, tags)
+            except sqlite3.Error as e:
+                self.l2_errors += 1
+                logger.warning(f"Shared cache write failed: {e}")
+
+    def delete(self, key: Hashable) -> None:
+        self.l1.delete(key)
+        if self.backend is not None:
+            try:
+                self.backend.delete(repr(key))
+            except sqlite3.Error as e:
+                self.l2_errors += 1
+                logger.warning(f"Shared cache delete failed: {e}")
+
+    def invalidate_tag(self, tag: str) -> None:
+        """Evict ``tag`` here, in the shared tier, and (via the invalidation log) in every other worker"""
+        evicted = self.l1.invalidate_tag(tag)
+        if self.backend is not None:
+            try:
+                self.backend.invalidate_tag(tag)
+            except sqlite3.Error as e:
+                # Other workers keep their entries until they expire
+                self.l2_errors += 1
+                logger.warning(f"Shared cache invalidation of {tag} failed: {e}")
+        logger.info(f"Cache invalidated tag {tag} ({evicted} local entries)")
+
+    def clear(self) -> None:
+        self.l1.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except sqlite3.Error as e:
+                self.l2_errors += 1
+                logger.warning(f"Shared cache clear failed: {e}")
+
+    def _poll_due(self) -> bool:
+        return self.backend is not None and self.clock() - self._last_poll >= self.poll_interval
+
+    def _poll(self) -> None:
+        """Apply invalidations published by other workers since the last poll"""
+        if not self._poll_due():
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = now = self.clock()
+            for message_id, tag in self.backend.invalidations(self._last_seen):
+                self.l1.invalidate_tag(tag)
+                self._last_seen = message_id
+            if now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                self.backend.prune(now)
+        except sqlite3.Error as e:
+            self.l2_errors += 1
+            logger.warning(f"Cache invalidation poll failed: {e}")
+        finally:
+            self._poll_lock.release()
+
+    def open(self) -> None:
+        """Connect to the shared tier from the calling thread (the app does this during warmup)"""
+        if self.backend is not None:
+            self.backend.open()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "l1_entries": len(self.l1),
+            "l1_bytes": self.l1.size,
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "l2_errors": self.l2_errors,
+            "shared": self.backend is not None,
+        }
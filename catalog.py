@@ -0,0 +1,78 @@
+"""
+CineFluent catalog files - load and save the movie/lesson catalog written by the batch jobs
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from builtin_catalog import MOCK_LESSONS, MOCK_MOVIES, MOCK_QUIZ, MOCK_VOCABULARY
+from catalog_snapshot import Snapshot, is_snapshot
+
+CATALOG_SECTIONS = ("movies", "lessons", "vocabulary", "quizzes")
+
+# Score used for movies and lessons that only have a hand-set difficulty label
+LEVEL_SCORES = {"Beginner": 20.0, "Intermediate": 50.0, "Advanced": 80.0}
+
+
+def new_version() -> str:
+    """Sortable catalog version string, e.g. "20261019T120000.123456Z" """
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+
+
+def level_score(label: str) -> float:
+    return LEVEL_SCORES.get(label, LEVEL_SCORES["Intermediate"])
+
+
+def default_catalog() -> Dict[str, Any]:
+    """The built-in mock catalog (builtin_catalog.py), used when no catalog file is given"""
+    movies = [dict(movie) for movie in MOCK_MOVIES]
+    for movie in movies:
+        # Hand-labelled movies get the default score for their label (difficulty.py computes real ones)
+        movie.setdefault("difficultyScore", level_score(movie["difficulty"]))
+    return {
+        "version": "builtin",
+        "movies": movies,
+        "lessons": [dict(lesson) for lesson in MOCK_LESSONS],
+        "vocabulary": list(MOCK_VOCABULARY),
+        "quizzes": list(MOCK_QUIZ),
+    }
+
+
+def load_catalog(path: str = None) -> Dict[str, Any]:
+    """Load a catalog JSON file or binary snapshot (see catalog_snapshot.py).
+
+    Snapshot sections are read-only sequences decoded lazily from the mapping;
+    JSON catalogs are plain lists with missing difficulty scores filled in.
+    """
+    if not path:
+        return default_catalog()
+    if is_snapshot(path):
+        return Snapshot(path).as_catalog()
+    with open(path, "rb") as f:
+        data = f.read()
+    catalog = json.loads(data)
+    for section in CATALOG_SECTIONS:
+        catalog.setdefault(section, [])
+    if not catalog.get("version"):
+        # Hand-written catalogs: versions key the response caches, so derive one from the content
+        catalog["version"] = f"content-{hashlib.blake2b(data, digest_size=8).hexdigest()}"
+    for movie in catalog["movies"]:
+        movie.setdefault("difficultyScore", level_score(movie["difficulty"]))
+    return catalog
+
+
+def save_catalog(catalog: Dict[str, Any], path: str) -> None:
+    """Write the catalog atomically so running workers never see a half-written file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
@@ -0,0 +1,307 @@
+"""
+CineFluent catalog snapshots - versioned binary catalog files opened read-only via mmap
+
+Workers map the snapshot instead of parsing the catalog, so every uvicorn
+worker shares the same page-cache pages and startup only reads the header.
+Records are stored as compact JSON and decoded lazily on access; lookups by id
+(and other indexed fields) binary-search sorted key tables inside the mapping
+without decoding anything up front.
+
+Layout (little-endian, every table 8-byte aligned):
+
+    header     MAGIC, format version, catalog version, directory offset/length
+    records    per section: concatenated JSON records
+    tables     per section: record offsets (u64 x count+1) and one key index
+               per indexed field: sorted key bytes, key offsets, posting
+               offsets and postings (record numbers)
+    directory  JSON describing where every section and index lives
+
+Usage:
+    python catalog_snapshot.py export --catalog catalog.json --out catalog.snap
+    python catalog_snapshot.py info catalog.snap
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+MAGIC = b"CFSNAP01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sI64sQQ")  # magic, format, catalog version, directory offset, directory length
+HEADER_SIZE = 128
+
+# Fields indexed per section; the first one is the primary key used by get()
+SECTION_INDEXES = {
+    "movies": ("id", "language"),
+    "lessons": ("id", "movieId"),
+    "vocabulary": ("word",),
+    "quizzes": ("id",),
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def is_snapshot(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class SnapshotWriter:
+    """Streams sections into a snapshot file and renames it into place on close.
+
+    Records are written as they arrive; only the fixed-width offsets and the
+    index keys are kept in memory until the section is finished.
+    """
+
+    def __init__(self, path: str, version: str):
+        self.path = path
+        self.version = version
+        self.directory: Dict[str, Any] = {"version": version, "sections": {}}
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".snapshot-", suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(b"\0" * HEADER_SIZE)
+
+    def _align(self) -> int:
+        position = self._file.tell()
+        padding = -position % 8
+        if padding:
+            self._file.write(b"\0" * padding)
+        return position + padding
+
+    def _write_array(self, values: array) -> int:
+        position = self._align()
+        values.tofile(self._file)
+        return position
+
+    def add_section(self, name: str, records: Iterable[dict], index_fields: Sequence[str] = ()) -> int:
+        """Write one section; returns the number of records written"""
+        offsets = array("Q", [0])
+        keys: Dict[str, Dict[str, List[int]]] = {field: {} for field in index_fields}
+        data_start = self._align()
+        size = 0
+        for number, record in enumerate(records):
+            encoded = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._file.write(encoded)
+            size += len(encoded)
+            offsets.append(size)
+            for field in index_fields:
+                value = record.get(field)
+                if value is not None:
+                    keys[field].setdefault(str(value), []).append(number)
+
+        section = {
+            "count": len(offsets) - 1,
+            "data": data_start,
+            "offsets": self._write_array(offsets),
+            "indexes": {},
+        }
+        for field, postings_by_key in keys.items():
+            section["indexes"][field] = self._write_index(postings_by_key)
+        self.directory["sections"][name] = section
+        return section["count"]
+
+    def _write_index(self, postings_by_key: Dict[str, List[int]]) -> Dict[str, int]:
+        encoded_keys = sorted((key.encode("utf-8"), postings) for key, postings in postings_by_key.items())
+        key_offsets, posting_offsets, postings = array("Q", [0]), array("Q", [0]), array("Q")
+        blob_start = self._align()
+        size = 0
+        for key, key_postings in encoded_keys:
+            self._file.write(key)
+            size += len(key)
+            key_offsets.append(size)
+            postings.extend(key_postings)
+            posting_offsets.append(len(postings))
+        return {
+            "count": len(encoded_keys),
+            "keys": blob_start,
+            "key_offsets": self._write_array(key_offsets),
+            "posting_offsets": self._write_array(posting_offsets),
+            "postings": self._write_array(postings),
+        }
+
+    def close(self) -> None:
+        directory = json.dumps(self.directory).encode("utf-8")
+        directory_offset = self._align()
+        self._file.write(directory)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.version.encode("utf-8")[:64], directory_offset, len(directory)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.unlink(self._tmp_path)
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_snapshot(catalog: Dict[str, Any], path: str) -> None:
+    with SnapshotWriter(path, catalog.get("version", "unversioned")) as writer:
+        for name, fields in SECTION_INDEXES.items():
+            writer.add_section(name, catalog.get(name, []), fields)
+
+
+class KeyIndex:
+    """Sorted key table inside the mapping; lookups binary-search the key bytes"""
+
+    def __init__(self, view: memoryview, spec: Dict[str, int]):
+        count = spec["count"]
+        self._view = view
+        self._keys = spec["keys"]
+        self._key_offsets = view[spec["key_offsets"]:spec["key_offsets"] + 8 * (count + 1)].cast("Q")
+        self._posting_offsets = view[spec["posting_offsets"]:spec["posting_offsets"] + 8 * (count + 1)].cast("Q")
+        total = self._posting_offsets[count]
+        self._postings = view[spec["postings"]:spec["postings"] + 8 * total].cast("Q")
+        self.count = count
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._view[self._keys + self._key_offsets[i]:self._keys + self._key_offsets[i + 1]])
+
+    def lookup(self, value: str) -> Sequence[int]:
+        target = value.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._key(low) == target:
+            return self._postings[self._posting_offsets[low]:self._posting_offsets[low + 1]]
+        return ()
+
+
+class RecordSection(Sequence):
+    """Read-only list of catalog records decoded on access"""
+
+    def __init__(self, view: memoryview, spec: Dict[str, Any]):
+        self._view = view
+        self._data = spec["data"]
+        self._count = spec["count"]
+        self._offsets = view[spec["offsets"]:spec["offsets"] + 8 * (self._count + 1)].cast("Q")
+        self.indexes = {field: KeyIndex(view, index) for field, index in spec["indexes"].items()}
+        self._primary = next(iter(self.indexes.values()), None)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _decode(self, i: int) -> dict:
+        start = self._data + self._offsets[i]
+        return json.loads(bytes(self._view[start:self._data + self._offsets[i + 1]]))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._decode(j) for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("record index out of range")
+        return self._decode(i)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(self._count):
+            yield self._decode(i)
+
+    def copy(self) -> List[dict]:
+        return list(self)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Record by primary key (the first indexed field), or None"""
+        postings = self._primary.lookup(key) if self._primary else ()
+        return self._decode(postings[0]) if len(postings) else None
+
+    def find(self, field: str, value: str) -> List[dict]:
+        """All records whose indexed ``field`` equals ``value``"""
+        return [self._decode(i) for i in self.indexes[field].lookup(value)]
+
+
+class Snapshot:
+    """A mapped snapshot file; sections are exposed as RecordSection attributes"""
+
+    def __init__(self, path: str):
+        start = time.perf_counter()
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, fmt, version, directory_offset, directory_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self.close()
+            raise SnapshotError(f"{path} is not a catalog snapshot (format {FORMAT_VERSION})")
+        self.version = version.rstrip(b"\0").decode("utf-8")
+        directory = json.loads(bytes(self._view[directory_offset:directory_offset + directory_length]))
+        self.sections = {name: RecordSection(self._view, spec) for name, spec in directory["sections"].items()}
+        self.open_seconds = time.perf_counter() - start
+
+    def __getattr__(self, name: str) -> RecordSection:
+        sections = self.__dict__.get("sections", {})
+        if name in sections:
+            return sections[name]
+        raise AttributeError(name)
+
+    def as_catalog(self) -> Dict[str, Any]:
+        """Catalog dict whose sections are the lazy RecordSections (see catalog.load_catalog)"""
+        catalog: Dict[str, Any] = {"version": self.version}
+        catalog.update(self.sections)
+        return catalog
+
+    def close(self) -> None:
+        sections = self.__dict__.get("sections", {})
+        for section in sections.values():
+            for index in section.indexes.values():
+                index._key_offsets.release()
+                index._posting_offsets.release()
+                index._postings.release()
+            section._offsets.release()
+        self.sections = {}
+        self._view.release()
+        self._mmap.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from catalog import load_catalog
+
+    parser = argparse.ArgumentParser(description="Export and inspect catalog snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a catalog JSON (or the built-in catalog) as a snapshot")
+    export.add_argument("--catalog", help="catalog JSON (defaults to the built-in mock catalog)")
+    export.add_argument("--out", required=True)
+    info = commands.add_parser("info", help="print a snapshot's version, sections and open time")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        catalog = load_catalog(args.catalog)
+        write_snapshot(catalog, args.out)
+        print(f"Wrote snapshot {catalog.get('version')} to {args.out} ({os.path.getsize(args.out)} bytes)")
+        return
+
+    snapshot = Snapshot(args.path)
+    print(f"version: {snapshot.version}")
+    print(f"opened in {snapshot.open_seconds * 1000:.2f} ms")
+    for name, section in snapshot.sections.items():
+        print(f"{name}: {len(section)} records, indexes: {', '.join(section.indexes) or '-'}")
+    snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
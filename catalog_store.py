@@ -0,0 +1,220 @@
+"""
+CineFluent catalog store - the active catalog version, hot-swapped when a new catalog file appears
+
+Every request takes ``catalog_store.current()`` once and works on that
+CatalogVersion for its whole lifetime. Reloads build the next version (loading
+the file and its lookup indexes) on a background thread and then flip a single
+reference, so in-flight requests finish on the version they started with and
+the old version is freed when the last of them drops it. Response caches live
+on the CatalogVersion, so a swap invalidates them all at once.
+
+A catalog loaded from a file has a ``version`` made of the version the file
+declares and a revision derived from the file itself (inode, size, mtime).
+Shared caches key and tag their entries by it, so a file rewritten in place
+under the same declared version still gets a new version. Requests finishing
+on the old catalog then write under the old keys, which are never served
+again. The revision is the same in every worker that loads the same file.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from catalog import load_catalog
+from catalog_snapshot import RecordSection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_INTERVAL = 5.0  # seconds
+
+
+class CatalogVersion:
+    """One immutable catalog plus the lookup indexes and response caches built for it"""
+
+    def __init__(self, catalog: Dict[str, Any], source: Optional[str] = None, load_seconds: float = 0.0,
+                 revision: Optional[str] = None):
+        start = time.perf_counter()
+        # As written by the batch jobs; precomputed recommendations are matched against it
+        self.declared_version: str = catalog.get("version", "unversioned")
+        self.version = f"{self.declared_version}+{revision}" if revision else self.declared_version
+        self.source = source
+        self.movies = catalog["movies"]
+        self.lessons = catalog["lessons"]
+        self.vocabulary = catalog["vocabulary"]
+        self.quizzes = catalog["quizzes"]
+        self.loaded_at = datetime.now(timezone.utc)
+
+        # Snapshots carry their own on-disk indexes; plain lists get dict indexes
+        self._indexed = isinstance(self.movies, RecordSection)
+        if not self._indexed:
+            self._movies_by_id = {movie["id"]: movie for movie in self.movies}
+            self._lessons_by_id = {lesson["id"]: lesson for lesson in self.lessons}
+            self._vocabulary_by_word: Dict[str, dict] = {}
+            for item in self.vocabulary:
+                self._vocabulary_by_word.setdefault(item["word"], item)
+            self._lessons_by_movie: Dict[str, List[dict]] = {}
+            for lesson in self.lessons:
+                self._lessons_by_movie.setdefault(lesson["movieId"], []).append(lesson)
+            self._movies_by_language: Dict[str, List[dict]] = {}
+            for movie in self.movies:
+                self._movies_by_language.setdefault(movie["language"], []).append(movie)
+
+        self._cache: Dict[Hashable, Any] = {}
+        self._cache_lock = threading.Lock()
+        self.load_seconds = load_seconds + time.perf_counter() - start
+
+    def movie(self, movie_id: str) -> Optional[dict]:
+        return self.movies.get(movie_id) if self._indexed else self._movies_by_id.get(movie_id)
+
+    def lesson(self, lesson_id: str) -> Optional[dict]:
+        return self.lessons.get(lesson_id) if self._indexed else self._lessons_by_id.get(lesson_id)
+
+    def vocabulary_item(self, word: str) -> Optional[dict]:
+        return self.vocabulary.get(word) if self._indexed else self._vocabulary_by_word.get(word)
+
+    def lessons_for_movie(self, movie_id: str) -> List[dict]:
+        if self._indexed:
+            return self.lessons.find("movieId", movie_id)
+        return self._lessons_by_movie.get(movie_id, [])
+
+    def movies_for_language(self, language: str) -> List[dict]:
+        if self._indexed:
+            return self.movies.find("language", language)
+        return self._movies_by_language.get(language, [])
+
+    def cached(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """Response cache scoped to this version; dropped together with it on swap"""
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = build()
+        with self._cache_lock:
+            return self._cache.setdefault(key, value)
+
+    def movie_titles(self) -> List[str]:
+        """Lower-cased titles, aligned with ``movies``, for substring search"""
+        return self.cached("movie_titles", lambda: [movie["title"].lower() for movie in self.movies])
+
+    def vocabulary_terms(self) -> List[Tuple[str, str]]:
+        """Lower-cased (word, translation) pairs, aligned with ``vocabulary``"""
+        return self.cached(
+            "vocabulary_terms",
+            lambda: [(item["word"].lower(), item["translation"].lower()) for item in self.vocabulary]
+        )
+
+    def warm(self) -> None:
+        """Read every record once (faulting in snapshot pages) and build the search keys"""
+        for records in (self.movies, self.lessons, self.vocabulary, self.quizzes):
+            for _ in records:
+                pass
+        self.movie_titles()
+        self.vocabulary_terms()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "declared_version": self.declared_version,
+            "source": self.source or "builtin",
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_time_ms": round(self.load_seconds * 1000, 2),
+            "movies": len(self.movies),
+            "lessons": len(self.lessons),
+        }
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _revision(signature: Optional[Tuple[int, int, int]]) -> Optional[str]:
+    if signature is None:
+        return None
+    return hashlib.blake2b(repr(signature).encode("ascii"), digest_size=4).hexdigest()
+
+
+class CatalogStore:
+    """Holds the active CatalogVersion and swaps in new versions of the catalog file"""
+
+    def __init__(self, path: Optional[str], builtin: Dict[str, Any]):
+        self.path = path
+        self._builtin = builtin
+        self._lock = threading.Lock()
+        self._signature = _file_signature(path) if path else None
+        self._current = self._build(self._signature)
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[CatalogVersion, CatalogVersion], None]] = []
+
+    def on_swap(self, listener: Callable[[CatalogVersion, CatalogVersion], None]) -> None:
+        """Call ``listener(previous, current)`` after every swap (on the swapping thread)"""
+        self._listeners.append(listener)
+
+    def _build(self, signature: Optional[Tuple[int, int, int]] = None) -> CatalogVersion:
+        if not self.path:
+            return CatalogVersion(self._builtin)
+        start = time.perf_counter()
+        catalog = load_catalog(self.path)
+        return CatalogVersion(catalog, source=self.path, load_seconds=time.perf_counter() - start,
+                              revision=_revision(signature))
+
+    def current(self) -> CatalogVersion:
+        return self._current
+
+    def swap(self, version: CatalogVersion) -> CatalogVersion:
+        """Make ``version`` the active catalog; returns the one it replaced"""
+        with self._lock:
+            previous, self._current = self._current, version
+        logger.info(f"Catalog swapped: {previous.version} -> {version.version} ({version.load_seconds * 1000:.1f}ms load)")
+        for listener in self._listeners:
+            try:
+                listener(previous, version)
+            except Exception as e:
+                logger.error(f"Catalog swap listener failed: {e}")
+        return previous
+
+    def reload_if_changed(self) -> bool:
+        """Load and swap in the catalog file if it changed on disk; returns True on swap"""
+        if not self.path:
+            return False
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            return False
+        try:
+            version = self._build(signature)
+            version.warm()  # Before the swap, so requests never see a cold version
+        except Exception as e:
+            # Half-copied or corrupt files are retried on the next check
+            logger.warning(f"Catalog reload from {self.path} failed: {e}")
+            return False
+        self._signature = signature
+        if version.declared_version == self._current.declared_version:
+            # Edited in place: the file revision still gives the new catalog its own cache keys
+            logger.warning(f"Catalog {self.path} changed but kept version {version.declared_version}")
+        self.swap(version)
+        return True
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.reload_if_changed()
+
+    def start_watching(self, interval: float = DEFAULT_WATCH_INTERVAL) -> None:
+        if not self.path or interval <= 0 or self._watcher:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="catalog-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching {self.path} for new catalog versions every {interval}s")
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
@@ -0,0 +1,153 @@
+"""
+CineFluent cue index - per-movie subtitle cue timings for synchronized lesson playback
+
+A lesson only has a single ``timestamp``. A synchronized subtitle player needs
+to know which cue (and which vocabulary words) is active at the playback
+position many times per second. Rather than shipping whole tracks, the client
+asks for a window of cues around the position.
+
+Batch stage: each lesson's cues from the subtitle corpus (``subtitles.lesson_cues``)
+are written into the lesson as ``cues``, each with its start and end in
+seconds, its text, and the lesson vocabulary words spoken in it. Lessons of
+movies without a subtitle file get one cue from their own ``subtitle`` line,
+as they do when no ``cues`` were written at all.
+
+Serving: a movie's cues are merged into one CueIndex per catalog version. It
+holds three sorted float arrays: starts, ends, and the running maximum of
+ends ("reach"). Cues overlapping a window [a, b) are those before
+``bisect_left(starts, b)`` whose end is past ``a``. Every cue before
+``bisect_right(reach, a)`` ends by ``a``, so a window costs two bisections
+plus its own cues, however long the movie is.
+
+Usage:
+    python cue_index.py --corpus subtitles/ --catalog catalog.json --out catalog.json
+"""
+import argparse
+import logging
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional
+
+from catalog import load_catalog, new_version, save_catalog
+from subtitles import Cue, lesson_cues, subtitle_cue
+from vocab_extraction import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 60.0
+MAX_WINDOW_SECONDS = 600.0
+
+
+def cue_words(text: str, language: str, vocabulary: Iterable[Dict[str, Any]]) -> List[str]:
+    """The vocabulary words (as written in the lesson) that occur in a cue's text, in vocabulary order"""
+    tokens = set(tokenize(text, language))
+    words = []
+    for item in vocabulary:
+        word = item.get("word", "")
+        # Multi-word items ("de nada") match when every content word occurs
+        lemmas = tokenize(word, language)
+        if lemmas and all(lemma in tokens for lemma in lemmas) and word not in words:
+            words.append(word)
+    return words
+
+
+def cue_record(cue: Cue, language: str, vocabulary: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "start": round(cue.start, 3),
+        "end": round(max(cue.end, cue.start), 3),
+        "text": cue.text,
+        "words": cue_words(cue.text, language, vocabulary),
+    }
+
+
+def apply_cues(catalog: dict, corpus_dir: Optional[str] = None) -> int:
+    """Write each lesson's cues into it; returns the number of cues written"""
+    for section in ("movies", "lessons"):
+        catalog[section] = [dict(record) for record in catalog.get(section, [])]  # snapshots are read-only
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    cues = lesson_cues(catalog, corpus_dir)
+    written = 0
+    for lesson in catalog["lessons"]:
+        language = languages.get(lesson["movieId"], "")
+        vocabulary = lesson.get("vocabulary", [])
+        lesson["cues"] = [cue_record(cue, language, vocabulary) for cue in cues.get(lesson["id"], [])]
+        written += len(lesson["cues"])
+    return written
+
+
+class CueIndex:
+    """One movie's cues sorted by start, with bisectable start, end and reach arrays"""
+
+    __slots__ = ("movie_id", "cues", "starts", "ends", "reach")
+
+    def __init__(self, movie_id: str, cues: List[Dict[str, Any]]):
+        self.movie_id = movie_id
+        self.cues = sorted(cues, key=lambda cue: (cue["start"], cue["end"]))
+        self.starts = array("d", (cue["start"] for cue in self.cues))
+        self.ends = array("d", (cue["end"] for cue in self.cues))
+        self.reach = array("d")
+        furthest = float("-inf")
+        for end in self.ends:
+            furthest = max(furthest, end)
+            self.reach.append(furthest)
+
+    def __len__(self) -> int:
+        return len(self.cues)
+
+    @property
+    def duration(self) -> float:
+        return self.reach[-1] if self.reach else 0.0
+
+    def window(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """Cues overlapping [start, end), in start order; an empty window returns the cues active at ``start``"""
+        last = bisect_left(self.starts, end) if end > start else bisect_right(self.starts, start)
+        first = bisect_right(self.reach, start, 0, last)
+        return [self.cues[i] for i in range(first, last) if self.ends[i] > start]
+
+    def active(self, position: float) -> List[Dict[str, Any]]:
+        """Cues on screen at ``position`` seconds"""
+        return self.window(position, position)
+
+
+def movie_cues(catalog, movie_id: str) -> CueIndex:
+    """The movie's cue index, built once per catalog version from its lessons' cues"""
+    def build() -> CueIndex:
+        movie = catalog.movie(movie_id)
+        language = movie["language"] if movie else ""
+        cues = []
+        for lesson in catalog.lessons_for_movie(movie_id):
+            records = lesson.get("cues")
+            if records is None:  # catalog built before the cue stage ran
+                records = [cue_record(subtitle_cue(lesson), language, lesson.get("vocabulary", []))]
+            cues.extend({**record, "lessonId": lesson["id"]} for record in records)
+        return CueIndex(movie_id, cues)
+
+    return catalog.cached(("cue_index", movie_id), build)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Write subtitle cue timings and their vocabulary words into the catalog")
+    parser.add_argument("--corpus", help="directory of <movie_id>.srt subtitle files")
+    parser.add_argument("--catalog", help="catalog JSON to update (defaults to the built-in mock catalog)")
+    parser.add_argument("--out", help="where to write the updated catalog (defaults to --catalog)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    out = args.out or args.catalog
+    if not out:
+        parser.error("--out is required when no --catalog file is given")
+
+    catalog = load_catalog(args.catalog)
+    start = time.perf_counter()
+    written = apply_cues(catalog, args.corpus)
+    catalog["version"] = new_version()
+    save_catalog(catalog, out)
+    logger.info(
+        f"Wrote {written} cues for {len(catalog['lessons'])} lessons in "
+        f"{time.perf_counter() - start:.2f}s, catalog version {catalog['version']} to {out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
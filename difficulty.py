@@ -0,0 +1,167 @@
+"""
+CineFluent difficulty scoring - batch stage computing lesson and movie difficulty from subtitle features
+
+Three features are extracted per lesson and scored in one vectorized pass over
+the whole catalog:
+
+- word rarity: mean log corpus-frequency rank of the lesson's content words
+- sentence length: mean words per sentence
+- speech rate: words per second of cue time
+
+Each feature is mapped onto 0..1 between fixed anchors (so scores stay stable
+as the catalog grows), combined into a 0-100 ``difficultyScore`` and bucketed
+into the ``difficulty`` label. Movie scores are the word-weighted mean of their
+lessons' scores.
+
+Usage:
+    python difficulty.py --corpus subtitles/ --catalog catalog.json --out catalog.json
+"""
+import argparse
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from catalog import LEVEL_SCORES, level_score, load_catalog, new_version, save_catalog
+from subtitles import Cue, lesson_cues
+from vocab_extraction import corpus_texts, count_corpus, frequency_ranks, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Label boundaries on the 0-100 score
+LEVELS = tuple(LEVEL_SCORES)
+LEVEL_THRESHOLDS = (35.0, 65.0)
+
+# (easy anchor, hard anchor, weight) per feature
+FEATURE_ANCHORS = {
+    "log_rank": (3.0, 8.5, 0.5),  # ~rank 20 .. ~rank 5000
+    "sentence_length": (4.0, 16.0, 0.25),
+    "speech_rate": (1.5, 3.5, 0.25),
+}
+
+_SENTENCE_RE = re.compile(r"[.!?¿¡…]+")
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def lesson_features(catalog: dict, cues: Dict[str, List[Cue]], ranks: Dict[str, Dict[str, int]]):
+    """Feature matrix (lessons x 3) plus per-lesson word counts.
+
+    Per-token and per-cue values are flattened into arrays tagged with their
+    lesson index, so every aggregate is a single ``np.bincount``.
+    """
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    lessons = catalog["lessons"]
+
+    token_lesson, token_rank = [], []
+    cue_lesson, cue_words, cue_sentences, cue_seconds = [], [], [], []
+    for index, lesson in enumerate(lessons):
+        language = languages.get(lesson["movieId"], "")
+        language_ranks = ranks.get(language, {})
+        unseen_rank = len(language_ranks) + 1
+        for cue in cues.get(lesson["id"], []):
+            for lemma in tokenize(cue.text, language):
+                token_lesson.append(index)
+                token_rank.append(language_ranks.get(lemma, unseen_rank))
+            cue_lesson.append(index)
+            cue_words.append(len(_WORD_RE.findall(cue.text)))
+            cue_sentences.append(max(1, len([s for s in _SENTENCE_RE.split(cue.text) if s.strip()])))
+            cue_seconds.append(max(0.1, cue.end - cue.start))
+
+    n = len(lessons)
+    token_lesson = np.asarray(token_lesson, dtype=np.int64)
+    cue_lesson = np.asarray(cue_lesson, dtype=np.int64)
+    words = np.bincount(cue_lesson, weights=np.asarray(cue_words, dtype=np.float64), minlength=n)
+    sentences = np.bincount(cue_lesson, weights=np.asarray(cue_sentences, dtype=np.float64), minlength=n)
+    seconds = np.bincount(cue_lesson, weights=np.asarray(cue_seconds, dtype=np.float64), minlength=n)
+    tokens = np.bincount(token_lesson, minlength=n).astype(np.float64)
+    log_rank_sum = np.bincount(token_lesson, weights=np.log(np.asarray(token_rank, dtype=np.float64)), minlength=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = np.column_stack([
+            np.where(tokens > 0, log_rank_sum / tokens, np.nan),
+            np.where(sentences > 0, words / sentences, np.nan),
+            np.where(seconds > 0, words / seconds, np.nan),
+        ])
+    return features, words
+
+
+def score_features(features):
+    """0-100 scores for a (lessons x 3) feature matrix; lessons without text score NaN"""
+    anchors = np.array([value for value in FEATURE_ANCHORS.values()], dtype=np.float64)
+    easy, hard, weights = anchors[:, 0], anchors[:, 1], anchors[:, 2]
+    scaled = np.clip((features - easy) / (hard - easy), 0.0, 1.0)
+    return 100.0 * (scaled @ weights) / weights.sum()
+
+
+def score_labels(scores) -> List[str]:
+    return [LEVELS[i] for i in np.digitize(scores, LEVEL_THRESHOLDS)]
+
+
+def movie_scores(catalog: dict, lesson_scores, lesson_words):
+    """Word-weighted mean lesson score per movie (NaN for movies without scored lessons)"""
+    movie_index = {movie["id"]: i for i, movie in enumerate(catalog["movies"])}
+    owners = np.array([movie_index.get(lesson["movieId"], -1) for lesson in catalog["lessons"]], dtype=np.int64)
+    valid = (owners >= 0) & ~np.isnan(lesson_scores)
+    n = len(catalog["movies"])
+    weights = np.where(lesson_words[valid] > 0, lesson_words[valid], 1.0)
+    totals = np.bincount(owners[valid], weights=lesson_scores[valid] * weights, minlength=n)
+    norms = np.bincount(owners[valid], weights=weights, minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norms > 0, totals / norms, np.nan)
+
+
+def apply_difficulty(catalog: dict, lesson_scores, lesson_words) -> int:
+    """Write scores and labels into the catalog; returns the number of movies rescored"""
+    for lesson, score, label in zip(catalog["lessons"], lesson_scores, score_labels(np.nan_to_num(lesson_scores))):
+        if not np.isnan(score):
+            lesson["difficultyScore"] = round(float(score), 1)
+            lesson["difficulty"] = label
+
+    scores = movie_scores(catalog, lesson_scores, lesson_words)
+    rescored = 0
+    for movie, score, label in zip(catalog["movies"], scores, score_labels(np.nan_to_num(scores))):
+        if np.isnan(score):
+            movie.setdefault("difficultyScore", level_score(movie["difficulty"]))
+            continue
+        movie["difficultyScore"] = round(float(score), 1)
+        movie["difficulty"] = label
+        rescored += 1
+    return rescored
+
+
+def score_catalog(catalog: dict, corpus_dir: Optional[str] = None, workers: Optional[int] = None) -> int:
+    cues = lesson_cues(catalog, corpus_dir)
+    counts = count_corpus(corpus_texts(catalog, cues=cues), workers)
+    ranks = {language: frequency_ranks(language_counts) for language, language_counts in counts.corpus.items()}
+    features, words = lesson_features(catalog, cues, ranks)
+    return apply_difficulty(catalog, score_features(features), words)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score lesson and movie difficulty from subtitle features")
+    parser.add_argument("--corpus", help="directory of <movie_id>.srt subtitle files")
+    parser.add_argument("--catalog", help="catalog JSON to update (defaults to the built-in mock catalog)")
+    parser.add_argument("--out", help="where to write the updated catalog (defaults to --catalog)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for frequency counting")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    out = args.out or args.catalog
+    if not out:
+        parser.error("--out is required when no --catalog file is given")
+
+    catalog = load_catalog(args.catalog)
+    start = time.perf_counter()
+    rescored = score_catalog(catalog, args.corpus, args.workers)
+    catalog["version"] = new_version()
+    save_catalog(catalog, out)
+    logger.info(
+        f"Scored {len(catalog['lessons'])} lessons and {rescored} movies in "
+        f"{time.perf_counter() - start:.2f}s, wrote catalog version {catalog['version']} to {out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+CineFluent distractors - batch stage generating multiple-choice quizzes from lesson vocabulary
+
+Every translated vocabulary word of a lesson gets a multiple-choice question
+whose wrong options (distractors) are other words of the same language that
+are plausible but wrong:
+
+- same part of speech, guessed from the word's suffix and its translation
+  ("to eat" is a verb); a mismatch costs POS_PENALTY
+- similar corpus frequency: a band is a power of two of frequency rank, and
+  the squared distance in bands costs BAND_PENALTY per unit
+- similar usage: words are embedded by random indexing, where each word
+  vector sums the (IDF-weighted) random vectors of the words it shares
+  subtitle lines with, so words used in the same kind of scene end up close
+
+Candidates are scored per language in one vectorized nearest-neighbour pass:
+both penalties are folded into extra feature columns, so each block of rows
+is scored by a single matrix product, and ``np.argpartition`` keeps the best
+few per word. Questions
+alternate between "What does '<word>' mean?" (translations as options) and
+"How do you say '<translation>' in <language>?" (words as options).
+
+Generated questions are written into the lessons, after any hand-written ones,
+so quiz generation never runs on the request path. Reruns replace the
+questions the previous run generated.
+
+Usage:
+    python distractors.py --corpus subtitles/ --catalog catalog.json --out catalog.json
+"""
+import argparse
+import logging
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from catalog import load_catalog, new_version, save_catalog
+from subtitles import lesson_cues
+from vocab_extraction import corpus_texts, normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+DISTRACTORS = 3  # wrong options per question
+NEIGHBOURS = 12  # candidates kept per word before duplicate translations are filtered out
+QUESTIONS_PER_LESSON = 5
+EMBEDDING_DIM = 64
+POS_PENALTY = 1.0
+BAND_PENALTY = 0.05
+BLOCK_ROWS = 2048  # words scored per matrix product
+
+# (suffix, part of speech) checked longest first; anything else is a noun
+SUFFIXES = {
+    "Spanish": (("mente", "adverb"), ("ción", "noun"), ("dad", "noun"), ("tad", "noun"), ("oso", "adjective"),
+                ("osa", "adjective"), ("ble", "adjective"), ("ar", "verb"), ("er", "verb"), ("ir", "verb")),
+    "French": (("ment", "adverb"), ("tion", "noun"), ("té", "noun"), ("eux", "adjective"), ("euse", "adjective"),
+               ("ble", "adjective"), ("er", "verb"), ("ir", "verb"), ("re", "verb")),
+    "German": (("ung", "noun"), ("heit", "noun"), ("keit", "noun"), ("lich", "adjective"), ("ig", "adjective"),
+               ("isch", "adjective"), ("en", "verb"), ("ern", "verb"), ("eln", "verb")),
+    "Italian": (("mente", "adverb"), ("zione", "noun"), ("tà", "noun"), ("oso", "adjective"), ("are", "verb"),
+                ("ere", "verb"), ("ire", "verb")),
+    "Portuguese": (("mente", "adverb"), ("ção", "noun"), ("dade", "noun"), ("oso", "adjective"), ("ar", "verb"),
+                   ("er", "verb"), ("ir", "verb")),
+}
+PARTS_OF_SPEECH = ("noun", "verb", "adjective", "adverb")
+
+
+def part_of_speech(word: str, translation: str, language: str) -> str:
+    """Suffix-based guess, overridden by an English infinitive ("to ...") or adverb ("...ly") translation"""
+    english = translation.strip().lower()
+    if english.startswith("to "):
+        return "verb"
+    if english.endswith("ly") and len(english) > 4:
+        return "adverb"
+    if language == "German" and " " not in word.strip() and word.strip()[:1].isupper():
+        return "noun"
+    word = normalize(word).strip()
+    suffixes = sorted(SUFFIXES.get(language, ()), key=lambda item: -len(item[0]))
+    for suffix, tag in suffixes:
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            return tag
+    return "noun"
+
+
+class Lexicon:
+    """Translated vocabulary words of one language, with their lemma and features"""
+
+    def __init__(self, language: str):
+        self.language = language
+        self.items: List[Dict[str, str]] = []
+        self.lemmas: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, item: Dict[str, str]) -> None:
+        if not item.get("translation") or not item.get("word"):
+            return
+        key = normalize(item["word"])
+        if key in self._index:
+            return
+        lemmas = tokenize(item["word"], self.language)
+        self._index[key] = len(self.items)
+        self.items.append(item)
+        self.lemmas.append(lemmas[0] if lemmas else key)
+
+    def index(self, word: str) -> Optional[int]:
+        return self._index.get(normalize(word))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def build_lexicons(catalog: dict) -> Dict[str, Lexicon]:
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    lexicons: Dict[str, Lexicon] = {}
+    for lesson in catalog["lessons"]:
+        language = languages.get(lesson["movieId"])
+        if language:
+            for item in lesson.get("vocabulary", []):
+                lexicons.setdefault(language, Lexicon(language)).add(item)
+    return lexicons
+
+
+def language_lines(catalog: dict, corpus_dir: Optional[str], lexicons: Dict[str, Lexicon]) -> Dict[str, List[List[str]]]:
+    """Tokenized subtitle lines per language, plus the vocabulary's example sentences"""
+    lines: Dict[str, List[List[str]]] = {}
+    for text in corpus_texts(catalog, cues=lesson_cues(catalog, corpus_dir)):
+        for line in text.lines:
+            tokens = tokenize(line, text.language)
+            if tokens:
+                lines.setdefault(text.language, []).append(tokens)
+    for language, lexicon in lexicons.items():
+        for item in lexicon.items:
+            tokens = tokenize(item.get("example", ""), language)
+            if tokens:
+                lines.setdefault(language, []).append(tokens)
+    return lines
+
+
+def embed(lexicon: Lexicon, lines: List[List[str]], seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(unit-length random-indexing embeddings, frequency bands) for the lexicon's words"""
+    terms: Dict[str, int] = {}
+    line_ids, term_ids = [], []
+    for line_id, tokens in enumerate(lines):
+        for token in set(tokens):
+            line_ids.append(line_id)
+            term_ids.append(terms.setdefault(token, len(terms)))
+    for lemma in lexicon.lemmas:
+        terms.setdefault(lemma, len(terms))
+    line_ids = np.array(line_ids, dtype=np.int64)
+    term_ids = np.array(term_ids, dtype=np.int64)
+
+    # Words on many lines say little about a context, so contexts are IDF-weighted
+    document_frequency = np.bincount(term_ids, minlength=len(terms)).astype(np.float64)
+    idf = np.log((len(lines) + 1) / (document_frequency + 1)) + 1.0
+    rng = np.random.default_rng(seed)
+    index_vectors = (rng.standard_normal((len(terms), EMBEDDING_DIM)) / math.sqrt(EMBEDDING_DIM) * idf[:, None]).astype(np.float32)
+
+    # A word's context vector: the sum of every line it is on, minus itself
+    line_sums = np.zeros((len(lines), EMBEDDING_DIM), dtype=np.float32)
+    np.add.at(line_sums, line_ids, index_vectors[term_ids])
+    contexts = np.zeros((len(terms), EMBEDDING_DIM), dtype=np.float32)
+    np.add.at(contexts, term_ids, line_sums[line_ids] - index_vectors[term_ids])
+
+    word_terms = np.array([terms[lemma] for lemma in lexicon.lemmas], dtype=np.int64)
+    vectors = contexts[word_terms]
+    # Words never seen in context keep their own random vector, so they are nobody's close neighbour
+    unseen = ~vectors.any(axis=1)
+    vectors[unseen] = index_vectors[word_terms[unseen]]
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+    # Frequency rank 1 is the most frequent line-level term; bands are powers of two of the rank
+    order = np.argsort(-document_frequency, kind="stable")
+    ranks = np.empty(len(terms), dtype=np.int64)
+    ranks[order] = np.arange(1, len(terms) + 1)
+    bands = np.floor(np.log2(ranks[word_terms])).astype(np.float32)
+    return vectors, bands
+
+
+def nearest_candidates(vectors: np.ndarray, bands: np.ndarray, tags: np.ndarray, k: int = NEIGHBOURS) -> np.ndarray:
+    """(words, k) indices of each word's best distractor candidates, best first
+
+    Within a row, ranking by ``v_i.v_j - POS_PENALTY * [t_i != t_j] - BAND_PENALTY * (b_i - b_j)^2``
+    is the same as ranking by ``v_i.v_j + POS_PENALTY * t_i.t_j + 2 BAND_PENALTY b_i b_j - BAND_PENALTY b_j^2``
+    (the dropped terms are constant along the row), which is one product of
+    augmented query and key matrices.
+    """
+    count = len(vectors)
+    k = min(k, count - 1)
+    if k <= 0:
+        return np.empty((count, 0), dtype=np.int64)
+    tags = np.eye(len(PARTS_OF_SPEECH), dtype=np.float32)[tags]
+    bands = bands.astype(np.float32)[:, None]
+    queries = np.hstack([vectors, POS_PENALTY * tags, 2 * BAND_PENALTY * bands, np.full_like(bands, -BAND_PENALTY)])
+    keys = np.hstack([vectors, tags, bands, bands ** 2])
+
+    neighbours = np.empty((count, k), dtype=np.int64)
+    for start in range(0, count, BLOCK_ROWS):
+        rows = slice(start, min(start + BLOCK_ROWS, count))
+        scores = queries[rows] @ keys.T
+        scores[np.arange(scores.shape[0]), np.arange(rows.start, rows.stop)] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        neighbours[rows] = np.take_along_axis(top, order, axis=1)
+    return neighbours
+
+
+def pick_distractors(lexicon: Lexicon, word: int, candidates: np.ndarray, field: str) -> List[str]:
+    """The first DISTRACTORS candidates whose ``field`` differs from the word's and from each other"""
+    seen = {normalize(lexicon.items[word][field])}
+    picked = []
+    for candidate in candidates.tolist():
+        value = lexicon.items[candidate][field]
+        if normalize(value) in seen:
+            continue
+        seen.add(normalize(value))
+        picked.append(value)
+        if len(picked) == DISTRACTORS:
+            break
+    return picked
+
+
+def make_question(lexicon: Lexicon, word: int, candidates: np.ndarray, question_id: str, reverse: bool) -> Optional[dict]:
+    item = lexicon.items[word]
+    field = "word" if reverse else "translation"
+    distractors = pick_distractors(lexicon, word, candidates, field)
+    if len(distractors) < DISTRACTORS:
+        return None
+    options = [item[field]] + distractors
+    random.Random(question_id).shuffle(options)  # stable across reruns
+    if reverse:
+        question = f"How do you say '{item['translation']}' in {lexicon.language}?"
+    else:
+        question = f"What does '{item['word']}' mean?"
+    return {
+        "id": question_id,
+        "type": "multiple-choice",
+        "question": question,
+        "options": options,
+        "correctAnswer": item[field],
+        "explanation": f"'{item['word']}' means {item['translation']}.",
+        "generated": True,
+    }
+
+
+def apply_quizzes(catalog: dict, neighbours: Dict[str, np.ndarray], lexicons: Dict[str, Lexicon],
+                  questions_per_lesson: int = QUESTIONS_PER_LESSON) -> int:
+    """Replace each lesson's generated questions; hand-written ones are kept first. Returns questions written."""
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    written = 0
+    for lesson in catalog["lessons"]:
+        quiz = [question for question in lesson.get("quiz", []) if not question.get("generated")]
+        # Words a hand-written question already asks about (as its answer either way round)
+        covered = {normalize(question.get("correctAnswer", "")) for question in quiz}
+        language = languages.get(lesson["movieId"])
+        lexicon = lexicons.get(language)
+        if lexicon is not None:
+            for item in lesson.get("vocabulary", []):
+                if len(quiz) >= questions_per_lesson:
+                    break
+                word = lexicon.index(item.get("word", ""))
+                if word is None or normalize(item["word"]) in covered or normalize(item["translation"]) in covered:
+                    continue
+                question = make_question(lexicon, word, neighbours[language][word], f"{lesson['id']}_q{len(quiz) + 1}",
+                                         reverse=len(quiz) % 2 == 1)
+                if question is not None:
+                    quiz.append(question)
+                    written += 1
+        lesson["quiz"] = quiz
+    return written
+
+
+def generate_quizzes(catalog: dict, corpus_dir: Optional[str] = None, questions_per_lesson: int = QUESTIONS_PER_LESSON,
+                     seed: int = 0) -> int:
+    for section in ("movies", "lessons", "vocabulary", "quizzes"):
+        catalog[section] = [dict(record) for record in catalog.get(section, [])]  # snapshots are read-only
+    lexicons = build_lexicons(catalog)
+    lines = language_lines(catalog, corpus_dir, lexicons)
+    neighbours = {}
+    for language, lexicon in lexicons.items():
+        vectors, bands = embed(lexicon, lines.get(language, []), seed)
+        tags = np.array([PARTS_OF_SPEECH.index(part_of_speech(item["word"], item["translation"], language))
+                         for item in lexicon.items], dtype=np.int64)
+        neighbours[language] = nearest_candidates(vectors, bands, tags)
+        logger.info(f"{language}: {len(lexicon)} words, {len(lines.get(language, []))} lines")
+    return apply_quizzes(catalog, neighbours, lexicons, questions_per_lesson)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate multiple-choice quizzes with vocabulary-similarity distractors")
+    parser.add_argument("--corpus", help="directory of <movie_id>.srt subtitle files")
+    parser.add_argument("--catalog", help="catalog JSON to update (defaults to the built-in mock catalog)")
+    parser.add_argument("--out", help="where to write the updated catalog (defaults to --catalog)")
+    parser.add_argument("--questions-per-lesson", type=int, default=QUESTIONS_PER_LESSON)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random index vectors")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    out = args.out or args.catalog
+    if not out:
+        parser.error("--out is required when no --catalog file is given")
+
+    catalog = load_catalog(args.catalog)
+    start = time.perf_counter()
+    written = generate_quizzes(catalog, args.corpus, args.questions_per_lesson, args.seed)
+    catalog["version"] = new_version()
+    save_catalog(catalog, out)
+    logger.info(
+        f"Generated {written} questions for {len(catalog['lessons'])} lessons in "
+        f"{time.perf_counter() - start:.2f}s, wrote catalog version {catalog['version']} to {out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
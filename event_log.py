@@ -0,0 +1,183 @@
+"""
+CineFluent event log - append-only activity events exported as compressed columnar files
+
+The request path only appends a tuple to an in-memory buffer. A background
+thread periodically (or once enough rows are buffered) turns each buffered
+(event type, hour) group into a zstd-compressed Parquet or Arrow IPC file in a
+Hive-style partition layout:
+
+    <root>/type=progress/date=2024-05-31/hour=14/part-1717164000000-1234-42.parquet
+
+Files appear atomically (written under a temporary name, then renamed), so
+DuckDB, pandas or Spark can read the tree while the API is writing to it:
+
+    SELECT * FROM read_parquet('events/type=progress/*/*/*.parquet', hive_partitioning = true)
+
+pyarrow is only imported by the flusher; without it the log disables itself.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 60.0  # seconds
+DEFAULT_MAX_ROWS = 50_000  # buffered rows that trigger an early flush
+DEFAULT_MAX_BUFFERED = 1_000_000  # beyond this, new events are dropped rather than exhausting memory
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Columns after the common (ts, user_id) pair, as (name, arrow type name)
+EVENT_FIELDS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "progress": (("lesson_id", "string"), ("completed", "bool_"), ("score", "int16"), ("time_spent", "int32"), ("words_learned", "int16")),
+    "lesson_completed": (("lesson_id", "string"), ("score", "int16"), ("time_spent", "int32"), ("new_words", "int16")),
+    "word_mastered": (("word_id", "string"),),
+    "post_liked": (("post_id", "string"),),
+    "post_unliked": (("post_id", "string"),),
+}
+
+MS_PER_HOUR = 3_600_000
+
+
+class EventLog:
+    """Buffers events per (type, hour) and writes each group as one columnar file"""
+
+    def __init__(
+        self,
+        root: Optional[str],
+        file_format: str = "parquet",
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+    ):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported event log format: {file_format}")
+        self.root = root
+        self.file_format = file_format
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_buffered = max_buffered
+        self.enabled = root is not None
+        self.buffered = 0
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+        self._buffer: Dict[Tuple[str, int], List[tuple]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = 0
+
+    def append(self, event_type: str, user_id: Optional[str], **fields: Any) -> None:
+        """Hot path: one tuple appended under a lock; unknown fields are ignored"""
+        if not self.enabled:
+            return
+        names = EVENT_FIELDS[event_type]
+        ts = int(time.time() * 1000)
+        row = (ts, user_id) + tuple(fields.get(name) for name, _ in names)
+        with self._lock:
+            if self.buffered >= self.max_buffered:
+                self.dropped += 1
+                return
+            self._buffer[(event_type, ts // MS_PER_HOUR)].append(row)
+            self.buffered += 1
+            full = self.buffered >= self.max_rows
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._lock:
+            groups, self._buffer = self._buffer, defaultdict(list)
+            self.buffered = 0
+        if not groups:
+            return 0
+        rows = 0
+        with self._flush_lock:
+            for (event_type, hour), group in groups.items():
+                try:
+                    self._write(event_type, hour, group)
+                    rows += len(group)
+                except Exception as e:
+                    self.dropped += len(group)
+                    logger.error(f"Failed to write {len(group)} {event_type} events: {e}")
+        self.written += rows
+        return rows
+
+    def _write(self, event_type: str, hour: int, rows: List[tuple]) -> None:
+        import pyarrow as pa
+
+        fields = EVENT_FIELDS[event_type]
+        columns = list(zip(*rows))
+        schema = pa.schema(
+            [pa.field("ts", pa.timestamp("ms", tz="UTC")), pa.field("user_id", pa.string())]
+            + [pa.field(name, getattr(pa, type_name)()) for name, type_name in fields]
+        )
+        table = pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+        moment = datetime.fromtimestamp(hour * MS_PER_HOUR / 1000, timezone.utc)
+        directory = os.path.join(self.root, f"type={event_type}", f"date={moment:%Y-%m-%d}", f"hour={moment:%H}")
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        # Millisecond time and pid keep names unique across restarts and workers
+        name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._sequence}{FORMATS[self.file_format]}"
+        path = os.path.join(directory, name)
+        temporary = os.path.join(directory, f".{name}.tmp")
+
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            pq.write_table(table, temporary, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(temporary, path)
+        self.files += 1
+
+    def start(self) -> None:
+        """Start the background flusher (disables the log if pyarrow is missing)"""
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow is not installed; event log disabled")
+            self.enabled = False
+            return
+        self._stop.clear()
+
+        def flush_loop() -> None:
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+
+        self._thread = threading.Thread(target=flush_loop, name="event-log-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Event log writing {self.file_format} to {self.root}")
+
+    def close(self) -> None:
+        """Stop the flusher and write whatever is still buffered"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.enabled:
+            self.flush()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "format": self.file_format,
+            "buffered": self.buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+            "files": self.files,
+        }
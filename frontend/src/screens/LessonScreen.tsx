@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { Play, Pause, RotateCcw, Volume2, BookOpen, Check, X } from 'lucide-react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { Lesson, QuizQuestion } from '../types/api';
+import { Lesson, GradingResult } from '../types/api';
 import { apiService } from '../services/api';
 import { Button } from '../components/ui/button';
 
@@ -14,9 +14,11 @@ const LessonScreen = () => {
   const [currentPhase, setCurrentPhase] = useState<'video' | 'vocabulary' | 'quiz'>('video');
   const [currentQuizIndex, setCurrentQuizIndex] = useState(0);
   const [selectedAnswer, setSelectedAnswer] = useState('');
+  const [answers, setAnswers] = useState<Record<string, string>>({});
   const [showResult, setShowResult] = useState(false);
-  const [isCorrect, setIsCorrect] = useState(false);
-  const [score, setScore] = useState(0);
+  const [isGrading, setIsGrading] = useState(false);
+  const [grading, setGrading] = useState<GradingResult | null>(null);
+  const [startedAt] = useState(() => Date.now());
   const [isLoading, setIsLoading] = useState(true);
 
   useEffect(() => {
@@ -41,48 +43,30 @@ const LessonScreen = () => {
     setSelectedAnswer(answer);
   };
 
-  const handleSubmitAnswer = () => {
+  const handleSubmitAnswer = async () => {
     if (!lesson || !selectedAnswer) return;
 
     const currentQuestion = lesson.quiz[currentQuizIndex];
-    const correct = selectedAnswer === currentQuestion.correctAnswer;
-    setIsCorrect(correct);
-    setShowResult(true);
-    
-    if (correct) {
-      setScore(score + 1);
-    }
-  };
-
-  const handleNextQuestion = () => {
-    if (!lesson) return;
+    const nextAnswers = { ...answers, [currentQuestion.id]: selectedAnswer };
+    setAnswers(nextAnswers);
 
     if (currentQuizIndex < lesson.quiz.length - 1) {
       setCurrentQuizIndex(currentQuizIndex + 1);
       setSelectedAnswer('');
-      setShowResult(false);
-    } else {
-      // Quiz completed
-      handleLessonComplete();
+      return;
     }
-  };
 
-  const handleLessonComplete = async () => {
-    if (!lesson) return;
-
-    try {
-      await apiService.updateProgress({
-        lessonId: lesson.id,
-        completed: true,
-        score: Math.round((score / lesson.quiz.length) * 100),
-        timeSpent: 0, // You could track this
-        vocabularyMastered: lesson.vocabulary.map(v => v.word),
-      });
-      
-      navigate('/');
-    } catch (error) {
-      console.error('Failed to update progress:', error);
-    }
+    // Quiz completed: the server grades every answer and records the progress
+    setIsGrading(true);
+    const result = await apiService.submitAnswers(
+      lesson.id,
+      Object.entries(nextAnswers).map(([questionId, answer]) => ({ questionId, answer })),
+      Math.round((Date.now() - startedAt) / 1000),
+      lesson.vocabulary.map(v => v.word),
+    );
+    setGrading(result);
+    setIsGrading(false);
+    setShowResult(true);
   };
 
   if (isLoading) {
@@ -207,64 +191,92 @@ const LessonScreen = () => {
               </div>
             </div>
 
-            <div className="bg-card rounded-xl p-6 border border-default mb-6">
-              <h3 className="text-lg font-semibold text-primary mb-4">
-                {lesson.quiz[currentQuizIndex].question}
-              </h3>
+            {!showResult ? (
+              <>
+                <div className="bg-card rounded-xl p-6 border border-default mb-6">
+                  <h3 className="text-lg font-semibold text-primary mb-4">
+                    {lesson.quiz[currentQuizIndex].question}
+                  </h3>
 
-              <div className="space-y-3">
-                {lesson.quiz[currentQuizIndex].options?.map((option, index) => (
-                  <button
-                    key={index}
-                    onClick={() => handleAnswerSelect(option)}
-                    disabled={showResult}
-                    className={`w-full p-4 rounded-xl border text-left transition-colors ${
-                      selectedAnswer === option
-                        ? showResult
-                          ? isCorrect
-                            ? 'border-spruce-500 bg-spruce-500 bg-opacity-10 text-spruce-500'
-                            : 'border-persimmon-500 bg-persimmon-500 bg-opacity-10 text-persimmon-500'
-                          : 'border-royalBlue-500 bg-royalBlue-500 bg-opacity-10'
-                        : showResult && option === lesson.quiz[currentQuizIndex].correctAnswer
-                          ? 'border-spruce-500 bg-spruce-500 bg-opacity-10 text-spruce-500'
-                          : 'border-default hover:border-royalBlue-500'
-                    }`}
-                  >
-                    <div className="flex items-center justify-between">
-                      <span className="text-primary">{option}</span>
-                      {showResult && selectedAnswer === option && (
-                        isCorrect ? <Check size={20} className="text-spruce-500" /> : <X size={20} className="text-persimmon-500" />
-                      )}
-                      {showResult && option === lesson.quiz[currentQuizIndex].correctAnswer && selectedAnswer !== option && (
-                        <Check size={20} className="text-spruce-500" />
-                      )}
+                  {lesson.quiz[currentQuizIndex].options ? (
+                    <div className="space-y-3">
+                      {lesson.quiz[currentQuizIndex].options?.map((option, index) => (
+                        <button
+                          key={index}
+                          onClick={() => handleAnswerSelect(option)}
+                          disabled={isGrading}
+                          className={`w-full p-4 rounded-xl border text-left transition-colors ${
+                            selectedAnswer === option
+                              ? 'border-royalBlue-500 bg-royalBlue-500 bg-opacity-10'
+                              : 'border-default hover:border-royalBlue-500'
+                          }`}
+                        >
+                          <span className="text-primary">{option}</span>
+                        </button>
+                      ))}
                     </div>
-                  </button>
-                ))}
-              </div>
-
-              {showResult && lesson.quiz[currentQuizIndex].explanation && (
-                <div className="mt-4 p-3 bg-slate-800 dark:bg-slate-600 rounded-lg">
-                  <p className="text-sm text-secondary">{lesson.quiz[currentQuizIndex].explanation}</p>
+                  ) : (
+                    <input
+                      type="text"
+                      value={selectedAnswer}
+                      onChange={(e) => handleAnswerSelect(e.target.value)}
+                      disabled={isGrading}
+                      placeholder="Type your answer"
+                      className="w-full p-4 rounded-xl border border-default bg-transparent text-primary"
+                    />
+                  )}
                 </div>
-              )}
-            </div>
 
-            {!showResult ? (
-              <Button
-                onClick={handleSubmitAnswer}
-                disabled={!selectedAnswer}
-                className="w-full btn-primary"
-              >
-                Submit Answer
-              </Button>
+                <Button
+                  onClick={handleSubmitAnswer}
+                  disabled={!selectedAnswer || isGrading}
+                  className="w-full btn-primary"
+                >
+                  {isGrading ? 'Grading...' : currentQuizIndex < lesson.quiz.length - 1 ? 'Next Question' : 'Submit Answers'}
+                </Button>
+              </>
             ) : (
-              <Button
-                onClick={handleNextQuestion}
-                className="w-full btn-primary"
-              >
-                {currentQuizIndex < lesson.quiz.length - 1 ? 'Next Question' : 'Complete Lesson'}
-              </Button>
+              <>
+                <div className="bg-card rounded-xl p-6 border border-default mb-6">
+                  {grading ? (
+                    <>
+                      <h3 className="text-lg font-semibold text-primary mb-4">
+                        {grading.correct}/{grading.total} correct ({grading.score}%)
+                      </h3>
+                      <div className="space-y-3">
+                        {grading.results.map((result) => (
+                          <div
+                            key={result.questionId}
+                            className={`p-4 rounded-xl border ${
+                              result.correct ? 'border-spruce-500 text-spruce-500' : 'border-persimmon-500 text-persimmon-500'
+                            }`}
+                          >
+                            <div className="flex items-center justify-between">
+                              <span className="text-primary">{lesson.quiz.find(q => q.id === result.questionId)?.question}</span>
+                              {result.correct ? <Check size={20} className="text-spruce-500" /> : <X size={20} className="text-persimmon-500" />}
+                            </div>
+                            {(!result.correct || !result.exact) && (
+                              <p className="text-sm text-secondary mt-2">Answer: {result.correctAnswer}</p>
+                            )}
+                            {result.explanation && (
+                              <p className="text-sm text-secondary mt-1">{result.explanation}</p>
+                            )}
+                          </div>
+                        ))}
+                      </div>
+                    </>
+                  ) : (
+                    <p className="text-secondary">Your answers could not be graded right now. Please try the quiz again later.</p>
+                  )}
+                </div>
+
+                <Button
+                  onClick={() => navigate('/')}
+                  className="w-full btn-primary"
+                >
+                  Complete Lesson
+                </Button>
+              </>
             )}
           </div>
         )}
@@ -1,5 +1,5 @@
 // src/services/api.ts - Enhanced with full backend sync
-import { User, Movie, Lesson, Progress, AuthResponse } from '../types/api';
+import { User, Movie, Lesson, Progress, AuthResponse, QuizAnswer, GradingResult, BatchResponse } from '../types/api';
 import { mockApiService } from '../data/mockData';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
@@ -312,6 +312,24 @@ class ApiService {
     }
   }
 
+  // Grades the whole quiz server-side; the graded score is recorded as progress
+  async submitAnswers(
+    lessonId: string,
+    answers: QuizAnswer[],
+    timeSpent: number,
+    vocabularyMastered: string[] = []
+  ): Promise<GradingResult | null> {
+    try {
+      return await this.request<GradingResult>(`/api/v1/lessons/${lessonId}/answers`, {
+        method: 'POST',
+        body: JSON.stringify({ answers, timeSpent, vocabularyMastered }),
+      });
+    } catch (error) {
+      console.warn('⚠️ Answer grading failed:', error);
+      return null;
+    }
+  }
+
   // Progress methods
   async updateProgress(progress: Progress): Promise<void> {
     try {
@@ -339,6 +357,15 @@ class ApiService {
     }
   }
 
+  // Several GET endpoints in one round trip (at most 10), answered in the same order
+  async batch(paths: string[]): Promise<BatchResponse[]> {
+    const { responses } = await this.request<{ responses: BatchResponse[] }>('/api/v1/batch', {
+      method: 'POST',
+      body: JSON.stringify({ paths }),
+    });
+    return responses;
+  }
+
   // User methods
   async getCurrentUser(): Promise<User> {
     try {
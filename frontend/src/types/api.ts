@@ -15,6 +15,7 @@ export interface Movie {
   title: string;
   language: string;
   difficulty: 'Beginner' | 'Intermediate' | 'Advanced';
+  difficultyScore?: number;
   rating: number;
   duration: string;
   scenes: string;
@@ -48,10 +49,40 @@ export interface QuizQuestion {
   type: 'multiple-choice' | 'fill-blank' | 'translation';
   question: string;
   options?: string[];
+  // Only in locally bundled data: the API keeps answers server-side and grades them
+  correctAnswer?: string;
+  explanation?: string;
+}
+
+export interface QuizAnswer {
+  questionId: string;
+  answer: string;
+}
+
+export interface GradedAnswer {
+  questionId: string;
+  answer?: string;
+  correct: boolean;
+  exact: boolean;
   correctAnswer: string;
   explanation?: string;
 }
 
+export interface GradingResult {
+  lessonId: string;
+  score: number;
+  correct: number;
+  total: number;
+  completed: boolean;
+  results: GradedAnswer[];
+}
+
+export interface BatchResponse<T = unknown> {
+  path: string;
+  status: number;
+  body: T;
+}
+
 export interface Progress {
   lessonId: string;
   completed: boolean;
@@ -0,0 +1,148 @@
+"""
+CineFluent grading - server-side quiz grading against a precompiled answer index
+
+Lesson payloads no longer carry ``correctAnswer``; answers stay on the server
+and a whole quiz is graded in one request. Each lesson's questions are
+compiled once per catalog version into an answer key: normalised expected
+answers, plus the typo allowance for free-text questions.
+
+Matching by question type:
+
+- multiple-choice: the submitted option must equal the answer after
+  normalisation (case, accents, punctuation and spacing are ignored). Options
+  can differ by a single letter, so there is no typo tolerance.
+- fill-blank and translation: the same normalisation, then up to one typo
+  (answers of 4-7 characters) or two (8 and longer), counted as
+  Damerau-Levenshtein distance, so a transposition like "fmailia" is one typo.
+  Answers of three characters or fewer must match exactly.
+"""
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PASS_SCORE = 60  # quiz score (percent) that completes the lesson, as in the activity data
+MAX_ANSWER_LENGTH = 200
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_answer(text: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of an answer ("¡Océano!" -> "oceano")"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(" ", stripped).strip()
+
+
+def typo_allowance(answer: str) -> int:
+    """Edits tolerated for a normalised free-text answer of this length"""
+    if len(answer) <= 3:
+        return 0
+    if len(answer) <= 7:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein distance (optimal string alignment) between a and b, capped at limit + 1
+
+    Rows are abandoned as soon as every cell exceeds ``limit``, so comparing
+    a wrong answer costs little more than its first few characters.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[len(b)], limit + 1)
+
+
+class AnswerKey:
+    """One question's expected answer, compiled for matching"""
+
+    __slots__ = ("question_id", "type", "answer", "explanation", "normalized", "allowance")
+
+    def __init__(self, question: Dict[str, Any]):
+        self.question_id = question["id"]
+        self.type = question.get("type", "multiple-choice")
+        self.answer = question["correctAnswer"]
+        self.explanation = question.get("explanation")
+        self.normalized = normalize_answer(self.answer)
+        self.allowance = 0 if self.type == "multiple-choice" else typo_allowance(self.normalized)
+
+    def grade(self, response: Optional[str]) -> Tuple[bool, bool]:
+        """(correct, exact) for a submitted answer; exact is False when typos were forgiven"""
+        if not response:
+            return False, False
+        submitted = normalize_answer(response[:MAX_ANSWER_LENGTH])
+        if submitted == self.normalized:
+            return True, True
+        if self.allowance and edit_distance(submitted, self.normalized, self.allowance) <= self.allowance:
+            return True, False
+        return False, False
+
+
+class LessonKey:
+    """Answer keys of one lesson's quiz, in question order"""
+
+    __slots__ = ("lesson_id", "questions")
+
+    def __init__(self, lesson_id: str, quiz: Iterable[Dict[str, Any]]):
+        self.lesson_id = lesson_id
+        self.questions: Dict[str, AnswerKey] = {}
+        for question in quiz:
+            if question.get("correctAnswer"):
+                self.questions[question["id"]] = AnswerKey(question)
+            else:
+                logger.warning(f"Question {question.get('id')} of lesson {lesson_id} has no answer; not graded")
+
+    def unknown(self, question_ids: Iterable[str]) -> List[str]:
+        return [question_id for question_id in question_ids if question_id not in self.questions]
+
+    def grade(self, answers: Dict[str, str]) -> Dict[str, Any]:
+        """Grade submitted answers (question id -> answer); unanswered questions count as wrong"""
+        results = []
+        for question_id, key in self.questions.items():
+            submitted = answers.get(question_id)
+            correct, exact = key.grade(submitted)
+            results.append({
+                "questionId": question_id,
+                "answer": submitted,
+                "correct": correct,
+                "exact": exact,
+                "correctAnswer": key.answer,
+                "explanation": key.explanation,
+            })
+        total = len(results)
+        correct_count = sum(result["correct"] for result in results)
+        score = round(100 * correct_count / total) if total else 0
+        return {
+            "score": score,
+            "correct": correct_count,
+            "total": total,
+            "completed": score >= PASS_SCORE,
+            "results": results,
+        }
+
+
+def answer_key(catalog, lesson_id: str, quiz: Sequence[Dict[str, Any]]) -> LessonKey:
+    """The compiled answer key of the lesson's ``quiz``, built once per catalog version"""
+    return catalog.cached(("answer_key", "lesson", lesson_id), lambda: LessonKey(lesson_id, quiz))
+
+
+def dynamic_answer_key(catalog) -> LessonKey:
+    """The key of the whole shared quiz, served with lessons that are neither in the catalog nor generated"""
+    return catalog.cached(("answer_key", "dynamic"), lambda: LessonKey("dynamic", catalog.quizzes))
@@ -3,16 +3,44 @@ CineFluent FastAPI Backend - Enhanced for Complete Frontend Support
 """
 import os
 import logging
-from fastapi import FastAPI, HTTPException, status, Depends, Header
+from contextlib import asynccontextmanager
+from fastapi import Body, FastAPI, HTTPException, status, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, EmailStr
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+import functools
+import hmac
+import inspect
 import json
+import math
+import sqlite3
+import time
 import uuid
 
+from analytics import Analytics, format_duration, format_percent
+from anki_export import (
+    FORMATS as EXPORT_FORMATS, MEDIA_TYPES as EXPORT_MEDIA_TYPES, MasteredWords, build_apkg, deck_entries,
+    export_filename, iter_delimited, iter_file
+)
+from audio import AudioLibrary
+from batch import BATCH_USER_KEY, MAX_BATCH_REQUESTS, batch_cost, run_batch, split_target
+from cache import TwoTierCache, create_backend as create_cache_backend
+from catalog import default_catalog
+from catalog_store import CatalogStore
+from cue_index import DEFAULT_WINDOW_SECONDS, MAX_WINDOW_SECONDS, movie_cues
+from event_log import EventLog
+from grading import MAX_ANSWER_LENGTH, answer_key, dynamic_answer_key
+from preferences import PreferencesStore, fingerprint, patch_paths
+from profiling import RequestProfiler, StackSampler
+from progress_overlay import ProgressOverlay
+from rate_limit import ConcurrencyLimiter, Overloaded, RateLimiter, RateLimitRule, create_backend
+from shared_state import create_state
+from singleflight import SingleFlight, SingleFlightTimeout
+from user_cache import UserStateCache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +53,40 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 PROJECT_NAME = os.getenv("PROJECT_NAME", "CineFluent")
+CATALOG_PATH = os.getenv("CATALOG_PATH")  # Catalog JSON or snapshot written by the batch jobs
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "5"))  # 0 disables hot reload
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "60"))  # seconds between dashboard refreshes
+ANALYTICS_HISTORY_DB = os.getenv("ANALYTICS_HISTORY_DB")  # activity history to replay at startup (benchmarks.datagen)
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR")  # Parquet/Arrow activity export; unset disables it
+EVENT_LOG_FORMAT = os.getenv("EVENT_LOG_FORMAT", "parquet")  # or "arrow"
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "60"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # or sqlite:///path shared by all workers
+CACHE_L1_BYTES = int(os.getenv("CACHE_L1_BYTES", str(64 * 1024 * 1024)))  # per-worker in-process cache size
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")  # or sqlite:///path for per-user and analytics state shared by all workers
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "5"))  # seconds a request waits for a shared computation
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # enables the profiling endpoints and X-Profile header; unset disables them
+PROFILER_SAMPLE_INTERVAL = float(os.getenv("PROFILER_SAMPLE_INTERVAL", "0"))  # >0 samples stacks continuously
+RECOMMENDATIONS_DIR = os.getenv("RECOMMENDATIONS_DIR")  # top-K lists from recommendations.py; unset scores every user online
+RECOMMENDATION_TTL = float(os.getenv("RECOMMENDATION_TTL", "300"))  # seconds a user's recommendations are cached
+AUDIO_DIR = os.getenv("AUDIO_DIR")  # clips/ and movies/ (with frame indexes) served under /audio; unset keeps catalog audio URLs
+AUDIO_CACHE_BYTES = int(os.getenv("AUDIO_CACHE_BYTES", str(32 * 1024 * 1024)))  # in-process LRU of hot clip bytes
+USER_CACHE_BYTES = int(os.getenv("USER_CACHE_BYTES", str(16 * 1024 * 1024)))  # per-user responses, keyed by user version
+AUDIO_MAX_CACHED_CLIP = int(os.getenv("AUDIO_MAX_CACHED_CLIP", str(1024 * 1024)))  # larger clips are streamed from disk
+PREFERENCES_DEBOUNCE = float(os.getenv("PREFERENCES_DEBOUNCE", "2"))  # seconds of quiet before a user's changes are written
+
+# Rate limiting and admission control
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # or sqlite:///path shared by all workers
+RATE_LIMIT_USER = RateLimitRule(
+    rate=float(os.getenv("RATE_LIMIT_USER_RATE", "10")),
+    capacity=float(os.getenv("RATE_LIMIT_USER_BURST", "40")),
+)
+RATE_LIMIT_IP = RateLimitRule(
+    rate=float(os.getenv("RATE_LIMIT_IP_RATE", "10")),
+    capacity=float(os.getenv("RATE_LIMIT_IP_BURST", "100")),  # a page load fans out into many requests
+)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "128"))
 
 # CORS origins - Include common development ports
 CORS_ORIGINS = [
@@ -49,9 +111,15 @@ if os.getenv("BACKEND_CORS_ORIGINS"):
         logger.warning(f"Failed to parse BACKEND_CORS_ORIGINS: {e}")
 
 # Security setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# jose and passlib are imported on first use: together they add ~50ms to every cold start
+@functools.lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def create_access_token(subject: str, expires_delta: timedelta = None) -> str:
+    from jose import jwt
+    
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
@@ -62,6 +130,8 @@ def create_access_token(subject: str, expires_delta: timedelta = None) -> str:
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[str]:
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -78,19 +148,19 @@ class VocabularyItem(BaseModel):
     pronunciation: str
     example: str
 
+# Answers and explanations stay on the server (see grading.py) and come back with graded results
 class QuizQuestion(BaseModel):
     id: str
     type: str = Field(..., description="multiple-choice, fill-blank, translation")
     question: str
     options: Optional[List[str]] = None
-    correctAnswer: str
-    explanation: Optional[str] = None
 
 class Movie(BaseModel):
     id: str
     title: str
     language: str
     difficulty: str = Field(..., description="Beginner, Intermediate, Advanced")
+    difficultyScore: Optional[float] = Field(default=None, ge=0, le=100, description="0 (easiest) to 100 (hardest)")
     rating: float
     duration: str
     scenes: str
@@ -110,6 +180,8 @@ class Lesson(BaseModel):
     vocabulary: List[VocabularyItem]
     quiz: List[QuizQuestion]
     completed: bool = False
+    difficulty: Optional[str] = None
+    difficultyScore: Optional[float] = None
 
 class User(BaseModel):
     id: str
@@ -184,6 +256,18 @@ class ProgressUpdate(BaseModel):
     timeSpent: int = Field(ge=0)
     vocabularyMastered: List[str] = []
 
+class QuizAnswer(BaseModel):
+    questionId: str
+    answer: str = Field(max_length=MAX_ANSWER_LENGTH)
+
+class AnswerSubmission(BaseModel):
+    answers: List[QuizAnswer] = Field(max_length=100)
+    timeSpent: int = Field(default=0, ge=0)
+    vocabularyMastered: List[str] = []
+
+class BatchRequest(BaseModel):
+    paths: List[str] = Field(min_length=1, max_length=MAX_BATCH_REQUESTS)  # GET paths, with query strings
+
 class PostMessageRequest(BaseModel):
     content: str
 
@@ -197,235 +281,69 @@ class ProgressResponse(BaseModel):
     message: str
     data: Dict[str, Any]
 
+class GradedAnswer(BaseModel):
+    questionId: str
+    answer: Optional[str] = None
+    correct: bool
+    exact: bool = Field(..., description="False when the answer was accepted despite typos")
+    correctAnswer: str
+    explanation: Optional[str] = None
+
+class GradingResult(BaseModel):
+    lessonId: str
+    score: int
+    correct: int
+    total: int
+    completed: bool
+    results: List[GradedAnswer]
+
+class SubtitleCue(BaseModel):
+    lessonId: str
+    start: float  # seconds
+    end: float
+    text: str
+    words: List[str] = []  # lesson vocabulary spoken in the cue
+
+class CueWindow(BaseModel):
+    movieId: str
+    start: float
+    end: float
+    duration: float  # end of the movie's last cue
+    cues: List[SubtitleCue]
+
+# Application lifecycle: background tasks run for the lifetime of each worker, and the
+# worker only starts accepting requests (and reports /ready) once warmup has finished
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    catalog_store.start_watching(CATALOG_WATCH_INTERVAL)
+    analytics.start_refreshing(ANALYTICS_REFRESH_INTERVAL, ANALYTICS_HISTORY_DB)
+    event_log.start()
+    preferences.start()
+    if PROFILER_SAMPLE_INTERVAL > 0:
+        stack_sampler.start(interval=PROFILER_SAMPLE_INTERVAL)
+    app.state.warmup = await warm_up()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    catalog_store.stop_watching()
+    analytics.stop_refreshing()
+    stack_sampler.stop()
+    event_log.close()
+    preferences.close()
+
 # Create FastAPI app
 app = FastAPI(
     title=PROJECT_NAME,
     version="3.0.0",
     description="Complete CineFluent API with full frontend feature support",
     docs_url="/docs",
-    redoc_url="/redoc"
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["*"],
-    expose_headers=["*"],
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
+app.state.ready = False
+app.state.warmup = {}
 
-# Enhanced mock data with complete frontend compatibility
-MOCK_MOVIES = [
-    {
-        "id": "1",
-        "title": "Finding Nemo",
-        "language": "Spanish",
-        "difficulty": "Beginner",
-        "rating": 4.8,
-        "duration": "100 min",
-        "scenes": "12 scenes",
-        "progress": 35,
-        "thumbnail": "🐠",
-        "totalLessons": 12,
-        "completedLessons": 4
-    },
-    {
-        "id": "2",
-        "title": "Toy Story",
-        "language": "Spanish",
-        "difficulty": "Beginner",
-        "rating": 4.9,
-        "duration": "81 min",
-        "scenes": "10 scenes",
-        "progress": 100,
-        "thumbnail": "🤠",
-        "totalLessons": 10,
-        "completedLessons": 10
-    },
-    {
-        "id": "3",
-        "title": "Ratatouille",
-        "language": "French",
-        "difficulty": "Intermediate",
-        "rating": 4.7,
-        "duration": "111 min",
-        "scenes": "15 scenes",
-        "progress": 0,
-        "thumbnail": "🐭",
-        "totalLessons": 15,
-        "completedLessons": 0
-    },
-    {
-        "id": "4",
-        "title": "The Incredibles",
-        "language": "Spanish",
-        "difficulty": "Intermediate",
-        "rating": 4.6,
-        "duration": "115 min",
-        "scenes": "14 scenes",
-        "progress": 20,
-        "thumbnail": "💪",
-        "totalLessons": 14,
-        "completedLessons": 3
-    },
-    {
-        "id": "5",
-        "title": "Monsters, Inc.",
-        "language": "German",
-        "difficulty": "Beginner",
-        "rating": 4.5,
-        "duration": "92 min",
-        "scenes": "11 scenes",
-        "progress": 0,
-        "thumbnail": "👹",
-        "totalLessons": 11,
-        "completedLessons": 0
-    },
-    {
-        "id": "6",
-        "title": "Coco",
-        "language": "Spanish",
-        "difficulty": "Intermediate",
-        "rating": 4.9,
-        "duration": "105 min",
-        "scenes": "13 scenes",
-        "progress": 60,
-        "thumbnail": "💀",
-        "totalLessons": 13,
-        "completedLessons": 8
-    },
-    {
-        "id": "7",
-        "title": "Frozen",
-        "language": "French",
-        "difficulty": "Beginner",
-        "rating": 4.7,
-        "duration": "102 min",
-        "scenes": "12 scenes",
-        "progress": 0,
-        "thumbnail": "❄️",
-        "totalLessons": 12,
-        "completedLessons": 0
-    },
-    {
-        "id": "8",
-        "title": "Moana",
-        "language": "Spanish",
-        "difficulty": "Intermediate",
-        "rating": 4.8,
-        "duration": "107 min",
-        "scenes": "14 scenes",
-        "progress": 45,
-        "thumbnail": "🌊",
-        "totalLessons": 14,
-        "completedLessons": 6
-    }
-]
-
-MOCK_VOCABULARY = [
-    {
-        "word": "océano",
-        "translation": "ocean",
-        "pronunciation": "/oh-SEH-ah-no/",
-        "example": "El pez vive en el océano."
-    },
-    {
-        "word": "familia",
-        "translation": "family",
-        "pronunciation": "/fah-MEE-lee-ah/",
-        "example": "Mi familia es muy grande."
-    },
-    {
-        "word": "aventura",
-        "translation": "adventure",
-        "pronunciation": "/ah-ben-TOO-rah/",
-        "example": "Esta es una gran aventura."
-    },
-    {
-        "word": "amistad",
-        "translation": "friendship",
-        "pronunciation": "/ah-mees-TAHD/",
-        "example": "La amistad es muy importante."
-    }
-]
-
-MOCK_QUIZ = [
-    {
-        "id": "1",
-        "type": "multiple-choice",
-        "question": "What does 'océano' mean?",
-        "options": ["river", "ocean", "lake", "sea"],
-        "correctAnswer": "ocean",
-        "explanation": "'Océano' means ocean in Spanish."
-    },
-    {
-        "id": "2",
-        "type": "multiple-choice",
-        "question": "How do you say 'family' in Spanish?",
-        "options": ["amigo", "familia", "casa", "comida"],
-        "correctAnswer": "familia",
-        "explanation": "'Familia' means family in Spanish."
-    },
-    {
-        "id": "3",
-        "type": "fill-blank",
-        "question": "Complete: 'Mi _____ es grande.'",
-        "correctAnswer": "familia",
-        "explanation": "The correct word is 'familia' (family)."
-    }
-]
-
-MOCK_LESSONS = [
-    {
-        "id": "1",
-        "movieId": "1",
-        "title": "Meeting Nemo",
-        "subtitle": "Hola, soy Nemo. Vivo en el océano con mi familia.",
-        "translation": "Hello, I am Nemo. I live in the ocean with my family.",
-        "audioUrl": "/audio/lesson1.mp3",
-        "timestamp": "00:03:24",
-        "vocabulary": MOCK_VOCABULARY[:3],
-        "quiz": MOCK_QUIZ[:2],
-        "completed": False
-    },
-    {
-        "id": "2",
-        "movieId": "1",
-        "title": "The Great Barrier Reef",
-        "subtitle": "Este es nuestro hogar, el arrecife de coral.",
-        "translation": "This is our home, the coral reef.",
-        "audioUrl": "/audio/lesson2.mp3",
-        "timestamp": "00:05:12",
-        "vocabulary": [
-            {
-                "word": "hogar",
-                "translation": "home",
-                "pronunciation": "/oh-GAHR/",
-                "example": "Mi hogar está en el océano."
-            },
-            {
-                "word": "arrecife",
-                "translation": "reef",
-                "pronunciation": "/ah-reh-SEE-feh/",
-                "example": "El arrecife es hermoso."
-            }
-        ],
-        "quiz": [
-            {
-                "id": "4",
-                "type": "multiple-choice",
-                "question": "What does 'hogar' mean?",
-                "options": ["house", "home", "hotel", "hospital"],
-                "correctAnswer": "home",
-                "explanation": "'Hogar' means home in Spanish."
-            }
-        ],
-        "completed": True
-    }
-]
-
+# Mock data with complete frontend compatibility (the builtin catalog is in builtin_catalog.py)
 MOCK_USER = {
     "id": "1",
     "email": "demo@cinefluent.com",
@@ -437,6 +355,33 @@ MOCK_USER = {
     "is_active": True
 }
 
+MOCK_USER_LANGUAGES = [
+    {
+        "name": "Spanish",
+        "level": "Intermediate B1",
+        "progress": 65,
+        "flag": "🇪🇸",
+        "wordsLearned": 847,
+        "nextMilestone": "Advanced"
+    },
+    {
+        "name": "French",
+        "level": "Beginner A2",
+        "progress": 30,
+        "flag": "🇫🇷",
+        "wordsLearned": 234,
+        "nextMilestone": "Intermediate"
+    },
+    {
+        "name": "German",
+        "level": "Beginner A1",
+        "progress": 15,
+        "flag": "🇩🇪",
+        "wordsLearned": 89,
+        "nextMilestone": "A2 Level"
+    }
+]
+
 MOCK_ACHIEVEMENTS = [
     {
         "id": "first_movie",
@@ -591,18 +536,109 @@ MOCK_LEADERBOARD = [
     }
 ]
 
+# Active catalog: the batch-built file at CATALOG_PATH (hot-reloaded), else the mock data
+catalog_store = CatalogStore(CATALOG_PATH, builtin=default_catalog())
+
+# Shared by all workers on the host when STATE_BACKEND is a SQLite file; None keeps state per worker
+shared_state = create_state(STATE_BACKEND)
+analytics = Analytics(shared=shared_state)
+# Read endpoints share one computation per key; catalog keys embed the catalog version.
+# Entries are tagged so writes and catalog reloads can evict them in every worker.
+read_cache = SingleFlight(
+    TwoTierCache(CACHE_L1_BYTES, create_cache_backend(CACHE_BACKEND)),
+    timeout=READ_TIMEOUT,
+    clock=time.time
+)
+catalog_store.on_swap(lambda previous, current: read_cache.store.invalidate_tag(f"catalog:{previous.version}"))
+event_log = EventLog(EVENT_LOG_DIR, EVENT_LOG_FORMAT, EVENT_LOG_FLUSH_INTERVAL)
+request_profiler = RequestProfiler()
+# Per-user completed lessons, merged into the shared cached listings after the cache
+progress_overlay = ProgressOverlay(shared_state)
+stack_sampler = StackSampler()
+mastered_words = MasteredWords(shared_state)
+# Per-user responses cached by (user, version); every write to a user's state bumps the version
+user_state = UserStateCache(USER_CACHE_BYTES, shared_state)
+preferences = PreferencesStore(shared_state, PREFERENCES_DEBOUNCE)
+audio_library = AudioLibrary(AUDIO_DIR, AUDIO_CACHE_BYTES, AUDIO_MAX_CACHED_CLIP)
+
+WARMUP_LESSON_MOVIES = 20  # movies whose lesson lists are pre-built (the first page of the catalog)
+
+async def warm_up() -> Dict[str, Any]:
+    """Pay the first-request costs up front; returns milliseconds per step (or its error)"""
+    def open_connections():
+        # Creates the shared cache file if needed and fails the step early if it is unreachable
+        read_cache.store.open()
+
+    def warm_auth():
+        verify_token(create_access_token("warmup"))
+
+    async def prime_responses():
+        catalog = catalog_store.current()
+        await get_movies(None, None)
+        for language in sorted({movie["language"] for movie in catalog.movies}):
+            await get_movies(language, None)
+        for movie in catalog.movies[:WARMUP_LESSON_MOVIES]:
+            await get_movie_lessons(movie["id"], None)
+        await search_movies("", None, None, None, None, None, 20, None)
+        await get_community_posts(50)
+        await get_leaderboard(10)
+
+    steps = [
+        ("catalog", catalog_store.current().warm),
+        ("connections", open_connections),
+        ("auth", warm_auth),
+        ("responses", prime_responses),
+        ("progress_overlay", lambda: progress_overlay.warm(catalog_store.current())),
+        ("recommendations", lambda: recommender(catalog_store.current())),
+    ]
+    timings: Dict[str, Any] = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                await result
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        except Exception as e:
+            # Warmup is an optimization: a failed step is logged and the worker starts anyway
+            timings[name] = f"failed: {e}"
+            logger.warning(f"Warmup step {name} failed: {e}")
+    logger.info(f"Warmup finished (ms): {timings}")
+    return timings
+
 # Dependency for token validation
-async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[str]:
+async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> Optional[str]:
+    # Batch sub-requests run as the user the batch request was authenticated as
+    if BATCH_USER_KEY in request.scope:
+        return request.scope[BATCH_USER_KEY]
     if not authorization:
         return None
     
     try:
-        token = authorization.replace("Bearer ", "")
-        user_id = verify_token(token)
+        # Already decoded by admission control when the request was rate limited
+        user_id = getattr(request.state, "user_id", None) or verify_token(authorization.replace("Bearer ", ""))
+        if user_id:
+            analytics.record_activity(user_id)
         return user_id
     except:
         return None
 
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+# Dependency for admin-only endpoints
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Admin endpoints are disabled (set ADMIN_TOKEN)"
+        )
+    if not is_admin(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token"
+        )
+
 # Root endpoints
 @app.get("/")
 def root():
@@ -643,6 +679,21 @@ def health_check():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+@app.get("/ready")
+def readiness_check():
+    # Unlike /health (the process is up), this tells load balancers the worker is warm
+    if not app.state.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Not ready"
+        )
+    return {
+        "status": "ready",
+        "catalog_version": catalog_store.current().version,
+        "warmup_ms": app.state.warmup,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
 # Authentication endpoints
 @app.post("/api/v1/auth/login", response_model=AuthResponse)
 async def login(credentials: LoginRequest):
@@ -707,6 +758,7 @@ async def register(user_data: RegisterRequest):
     
     new_user_id = str(uuid.uuid4())
     access_token = create_access_token(new_user_id)
+    analytics.record_signup(new_user_id)
     
     new_user = User(
         id=new_user_id,
@@ -729,10 +781,13 @@ async def logout():
     return {"message": "Successfully logged out"}
 
 @app.get("/api/v1/user/me", response_model=User)
-async def get_current_user_info(user_id: Optional[str] = Depends(get_current_user)):
+async def get_current_user_info(request: Request, user_id: Optional[str] = Depends(get_current_user)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    return await user_state.respond(request.headers, "me", user_id, lambda: build_user_info(user_id))
+
+def build_user_info(user_id: str) -> User:
     # Return user based on ID
     if user_id == "1":
         return User(**MOCK_USER)
@@ -751,23 +806,76 @@ async def get_current_user_info(user_id: Optional[str] = Depends(get_current_use
 
 # Movie endpoints
 @app.get("/api/v1/movies", response_model=List[Movie])
-async def get_movies(language: Optional[str] = None):
+async def get_movies(language: Optional[str] = None, user_id: Optional[str] = Depends(get_current_user)):
     logger.info(f"Fetching movies list, language filter: {language}")
     
-    movies = [Movie(**movie) for movie in MOCK_MOVIES]
-    
+    catalog = catalog_store.current()
     if language and language != "All":
-        movies = [movie for movie in movies if movie.language == language]
+        movies = catalog.movies_for_language(language)
+        if not movies:
+            return []
+        cached = await read_cache.get(
+            ("movies", catalog.version, language),
+            lambda: [Movie(**movie) for movie in movies],
+            ttl=None,
+            tags=(f"catalog:{catalog.version}",)
+        )
+    else:
+        cached = await read_cache.get(
+            ("movies", catalog.version, None),
+            lambda: [Movie(**movie) for movie in catalog.movies],
+            ttl=None,
+            tags=(f"catalog:{catalog.version}",)
+        )
+    
+    # The cached list is shared by all users; progress is overlaid per request
+    return progress_overlay.movies(await progress_overlay.load(user_id), catalog, cached)
+
+# Registered before /movies/{movie_id}, which would otherwise match "recommended"
+@app.get("/api/v1/movies/recommended", response_model=List[Movie])
+async def get_recommended_movies(
+    limit: int = Query(10, ge=1, le=50),
+    language: Optional[str] = None,
+    user_id: Optional[str] = Depends(get_current_user)
+):
+    logger.info(f"Fetching recommended movies, language filter: {language}")
+    
+    catalog = catalog_store.current()
+    if language == "All":
+        language = None
+    # Cached per user for RECOMMENDATION_TTL, so completions show up within that window
+    cached = await read_cache.get(
+        ("recommended", catalog.version, user_id, language, limit),
+        lambda: build_recommendations(catalog, user_id, language, limit),
+        ttl=RECOMMENDATION_TTL,
+        in_thread=True,
+        tags=(f"catalog:{catalog.version}",)
+    )
+    return progress_overlay.movies(await progress_overlay.load(user_id), catalog, cached)
+
+def recommender(catalog):
+    """The catalog version's item features, plus the batch job's lists if they were built for it"""
+    from recommendations import Recommender  # numpy-backed; loaded on first use (warmup does it)
+    return catalog.cached("recommender", lambda: Recommender(catalog.movies, catalog.declared_version, RECOMMENDATIONS_DIR))
+
+def build_recommendations(catalog, user_id: Optional[str], language: Optional[str], limit: int) -> List[Movie]:
+    from recommendations import declared_profile
     
-    return movies
+    # Anonymous visitors get a neutral profile: every language, intermediate difficulty
+    languages, target = declared_profile(MOCK_USER_LANGUAGES if user_id else [])
+    columns = recommender(catalog).recommend(
+        user_id, languages, target, progress_overlay.progress(user_id).completed(catalog), limit, language
+    )
+    return [Movie(**catalog.movies[column]) for column in columns]
 
 @app.get("/api/v1/movies/{movie_id}", response_model=Movie)
-async def get_movie(movie_id: str):
+async def get_movie(movie_id: str, user_id: Optional[str] = Depends(get_current_user)):
     logger.info(f"Fetching movie: {movie_id}")
     
-    for movie in MOCK_MOVIES:
-        if movie["id"] == movie_id:
-            return Movie(**movie)
+    catalog = catalog_store.current()
+    movie = catalog.movie(movie_id)
+    if movie:
+        return progress_overlay.movies(await progress_overlay.load(user_id), catalog, [Movie(**movie)])[0]
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -775,51 +883,102 @@ async def get_movie(movie_id: str):
     )
 
 @app.get("/api/v1/movies/{movie_id}/lessons", response_model=List[Lesson])
-async def get_movie_lessons(movie_id: str):
+async def get_movie_lessons(movie_id: str, user_id: Optional[str] = Depends(get_current_user)):
     logger.info(f"Fetching lessons for movie: {movie_id}")
     
-    # Filter lessons by movie ID
-    lessons = [lesson for lesson in MOCK_LESSONS if lesson["movieId"] == movie_id]
-    
-    if not lessons:
-        # Generate lessons for any movie
-        lessons = [
-            {
-                "id": f"{movie_id}_lesson_1",
-                "movieId": movie_id,
-                "title": "Introduction Scene",
-                "subtitle": "Hola, comenzamos nuestra aventura.",
-                "translation": "Hello, we begin our adventure.",
-                "audioUrl": f"/audio/{movie_id}_lesson_1.mp3",
-                "timestamp": "00:02:15",
-                "vocabulary": MOCK_VOCABULARY[:2],
-                "quiz": MOCK_QUIZ[:1],
-                "completed": False
-            },
-            {
-                "id": f"{movie_id}_lesson_2",
-                "movieId": movie_id,
-                "title": "Character Development",
-                "subtitle": "Los personajes se conocen mejor.",
-                "translation": "The characters get to know each other better.",
-                "audioUrl": f"/audio/{movie_id}_lesson_2.mp3",
-                "timestamp": "00:08:30",
-                "vocabulary": MOCK_VOCABULARY[2:4],
-                "quiz": MOCK_QUIZ[1:3],
-                "completed": False
-            }
-        ]
+    catalog = catalog_store.current()
+    lessons = await read_cache.get(
+        ("movie_lessons", catalog.version, movie_id),
+        lambda: build_movie_lessons(catalog, movie_id),
+        ttl=None,
+        in_thread=audio_library.enabled,  # hashing lesson clips for their URLs reads the audio files
+        tags=(f"catalog:{catalog.version}",)
+    )
+    return progress_overlay.lessons(await progress_overlay.load(user_id), movie_id, lessons)
+
+@app.get("/api/v1/movies/{movie_id}/cues", response_model=CueWindow)
+async def get_movie_cues(
+    movie_id: str,
+    start: float = Query(0, ge=0, alias="from"),
+    end: Optional[float] = Query(None, ge=0, alias="to")
+):
+    catalog = catalog_store.current()
+    if catalog.movie(movie_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Movie not found"
+        )
+    if end is None:
+        end = start + DEFAULT_WINDOW_SECONDS
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must not be before 'from'"
+        )
+    # Players poll a few seconds ahead; long windows are clipped rather than refused
+    end = min(end, start + MAX_WINDOW_SECONDS)
     
-    return [Lesson(**lesson) for lesson in lessons]
+    index = movie_cues(catalog, movie_id)
+    return CueWindow(movieId=movie_id, start=start, end=end, duration=index.duration, cues=index.window(start, end))
+
+def generated_lessons(catalog, movie_id: str) -> List[Dict[str, Any]]:
+    """The lessons served for a movie without catalog lessons, each with its own slice of the shared quiz"""
+    return [
+        {
+            "id": f"{movie_id}_lesson_1",
+            "movieId": movie_id,
+            "title": "Introduction Scene",
+            "subtitle": "Hola, comenzamos nuestra aventura.",
+            "translation": "Hello, we begin our adventure.",
+            "audioUrl": f"/audio/{movie_id}_lesson_1.mp3",
+            "timestamp": "00:02:15",
+            "vocabulary": catalog.vocabulary[:2],
+            "quiz": catalog.quizzes[:1],
+            "completed": False
+        },
+        {
+            "id": f"{movie_id}_lesson_2",
+            "movieId": movie_id,
+            "title": "Character Development",
+            "subtitle": "Los personajes se conocen mejor.",
+            "translation": "The characters get to know each other better.",
+            "audioUrl": f"/audio/{movie_id}_lesson_2.mp3",
+            "timestamp": "00:08:30",
+            "vocabulary": catalog.vocabulary[2:4],
+            "quiz": catalog.quizzes[1:3],
+            "completed": False
+        }
+    ]
+
+def find_lesson(catalog, lesson_id: str) -> Optional[Dict[str, Any]]:
+    """A catalog lesson, or one generated for a movie without catalog lessons ("<movie id>_lesson_<n>")"""
+    lesson = catalog.lesson(lesson_id)
+    if lesson is not None:
+        return lesson
+    movie_id, separator, _ = lesson_id.rpartition("_lesson_")
+    if not separator or catalog.movie(movie_id) is None or catalog.lessons_for_movie(movie_id):
+        return None
+    return next((lesson for lesson in generated_lessons(catalog, movie_id) if lesson["id"] == lesson_id), None)
+
+def build_movie_lessons(catalog, movie_id: str) -> List[Lesson]:
+    lessons = catalog.lessons_for_movie(movie_id) or generated_lessons(catalog, movie_id)
+    return [lesson_model(catalog, lesson) for lesson in lessons]
+
+def lesson_model(catalog, lesson: Dict[str, Any]) -> Lesson:
+    # Point audioUrl at the content-hashed clip URL, which clients may cache forever
+    return Lesson(**{**lesson, "audioUrl": audio_library.lesson_url(catalog, lesson)})
 
 # Lesson endpoints
 @app.get("/api/v1/lessons/{lesson_id}", response_model=Lesson)
 async def get_lesson(lesson_id: str):
     logger.info(f"Fetching lesson: {lesson_id}")
     
-    for lesson in MOCK_LESSONS:
-        if lesson["id"] == lesson_id:
-            return Lesson(**lesson)
+    catalog = catalog_store.current()
+    lesson = find_lesson(catalog, lesson_id)
+    if lesson:
+        if audio_library.enabled:
+            return await run_in_threadpool(lesson_model, catalog, lesson)
+        return lesson_model(catalog, lesson)
     
     # Generate a dynamic lesson if not found
     return Lesson(
@@ -830,18 +989,102 @@ async def get_lesson(lesson_id: str):
         translation="This is a dynamically generated lesson.",
         audioUrl=f"/audio/{lesson_id}.mp3",
         timestamp="00:05:00",
-        vocabulary=MOCK_VOCABULARY,
-        quiz=MOCK_QUIZ,
+        vocabulary=list(catalog.vocabulary),
+        quiz=list(catalog.quizzes),
         completed=False
     )
 
+@app.post("/api/v1/lessons/{lesson_id}/answers", response_model=GradingResult)
+async def submit_answers(
+    lesson_id: str,
+    submission: AnswerSubmission,
+    user_id: Optional[str] = Depends(get_current_user)
+):
+    logger.info(f"Grading {len(submission.answers)} answers for lesson {lesson_id}")
+    
+    catalog = catalog_store.current()
+    lesson = find_lesson(catalog, lesson_id)
+    # Graded against the questions the lesson was served with; unknown ids get the whole shared quiz (see get_lesson)
+    key = answer_key(catalog, lesson_id, lesson["quiz"]) if lesson else dynamic_answer_key(catalog)
+    answers = {answer.questionId: answer.answer for answer in submission.answers}
+    unknown = key.unknown(answers)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown question ids for lesson {lesson_id}: {', '.join(unknown)}"
+        )
+    graded = key.grade(answers)
+    
+    # The graded score replaces the client-reported one in progress, analytics and the event log
+    if user_id:
+        analytics.record_activity(
+            user_id,
+            time_spent=submission.timeSpent,
+            completed=graded["completed"],
+            language=lesson_language(lesson_id)
+        )
+        if graded["completed"]:
+            await run_in_threadpool(progress_overlay.record_completion, user_id, catalog, lesson_id)
+        await run_in_threadpool(mastered_words.record, user_id, submission.vocabularyMastered)
+        await user_state.bump(user_id)
+    event_log.append(
+        "progress",
+        user_id,
+        lesson_id=lesson_id,
+        completed=graded["completed"],
+        score=graded["score"],
+        time_spent=submission.timeSpent,
+        words_learned=len(submission.vocabularyMastered)
+    )
+    
+    return GradingResult(lessonId=lesson_id, **graded)
+
+# Audio endpoints
+@app.api_route("/audio/{filename}", methods=["GET", "HEAD"])
+def get_audio(filename: str, request: Request):
+    # Sync: resolving a clip stats files and may hash or read it on first use
+    response = audio_library.response(filename, catalog_store.current(), request.headers)
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio clip not found"
+        )
+    return response
+
 # Progress endpoints
+def lesson_language(lesson_id: str) -> Optional[str]:
+    catalog = catalog_store.current()
+    lesson = catalog.lesson(lesson_id)
+    # Generated lessons are not in the catalog but carry their movie in the id
+    movie = catalog.movie(lesson["movieId"] if lesson else lesson_id.split("_lesson_")[0])
+    return movie["language"] if movie else None
+
 @app.post("/api/v1/progress", response_model=ProgressResponse)
 async def update_progress(progress: ProgressUpdate, user_id: Optional[str] = Depends(get_current_user)):
     logger.info(f"Progress update: {progress}")
     
     if not user_id:
         logger.warning("Progress update attempted without authentication")
+    else:
+        analytics.record_activity(
+            user_id,
+            time_spent=progress.timeSpent,
+            completed=progress.completed,
+            language=lesson_language(progress.lessonId)
+        )
+        if progress.completed:
+            await run_in_threadpool(progress_overlay.record_completion, user_id, catalog_store.current(), progress.lessonId)
+        await run_in_threadpool(mastered_words.record, user_id, progress.vocabularyMastered)
+        await user_state.bump(user_id)
+    event_log.append(
+        "progress",
+        user_id,
+        lesson_id=progress.lessonId,
+        completed=progress.completed,
+        score=progress.score,
+        time_spent=progress.timeSpent,
+        words_learned=len(progress.vocabularyMastered)
+    )
     
     # Here you would typically update a database
     # For now, we'll just log the progress and return success
@@ -889,11 +1132,17 @@ async def get_achievements(user_id: Optional[str] = Depends(get_current_user)):
 
 # Community endpoints
 @app.get("/api/v1/community/posts", response_model=List[CommunityPost])
-async def get_community_posts(limit: int = 50):
+async def get_community_posts(limit: int = Query(50, ge=1, le=100)):
     logger.info(f"Fetching community posts, limit: {limit}")
     
-    posts = MOCK_COMMUNITY_POSTS[:limit]
-    return [CommunityPost(**post) for post in posts]
+    # Short TTL: new posts should show up quickly, but a burst of readers shares one build
+    return await read_cache.get(
+        ("community_posts", limit),
+        lambda: [CommunityPost(**post) for post in MOCK_COMMUNITY_POSTS[:limit]],
+        ttl=5,
+        stale_ttl=30,
+        tags=("community_posts",)
+    )
 
 @app.post("/api/v1/community/posts", response_model=CommunityPost)
 async def create_community_post(
@@ -917,73 +1166,67 @@ async def create_community_post(
         streak=12  # Current user's streak
     )
     
+    await read_cache.invalidate_tag_async("community_posts")
+    await user_state.bump(user_id)
     return new_post
 
 @app.get("/api/v1/community/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(limit: int = 10):
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100)):
     logger.info(f"Fetching leaderboard, limit: {limit}")
     
-    leaderboard = MOCK_LEADERBOARD[:limit]
-    return [LeaderboardEntry(**entry) for entry in leaderboard]
+    return await read_cache.get(
+        ("leaderboard", limit),
+        lambda: [LeaderboardEntry(**entry) for entry in MOCK_LEADERBOARD[:limit]],
+        ttl=30,
+        stale_ttl=300,
+        tags=("leaderboard",)
+    )
 
 # Language and profile endpoints
 @app.get("/api/v1/user/languages", response_model=List[LanguageProgress])
-async def get_user_languages(user_id: Optional[str] = Depends(get_current_user)):
+async def get_user_languages(request: Request, user_id: Optional[str] = Depends(get_current_user)):
     logger.info("Fetching user language progress")
     
-    languages = [
-        {
-            "name": "Spanish",
-            "level": "Intermediate B1",
-            "progress": 65,
-            "flag": "🇪🇸",
-            "wordsLearned": 847,
-            "nextMilestone": "Advanced"
-        },
-        {
-            "name": "French",
-            "level": "Beginner A2",
-            "progress": 30,
-            "flag": "🇫🇷",
-            "wordsLearned": 234,
-            "nextMilestone": "Intermediate"
-        },
-        {
-            "name": "German",
-            "level": "Beginner A1",
-            "progress": 15,
-            "flag": "🇩🇪",
-            "wordsLearned": 89,
-            "nextMilestone": "A2 Level"
-        }
-    ]
-    
-    return [LanguageProgress(**lang) for lang in languages]
+    return await user_state.respond(
+        request.headers, "languages", user_id,
+        lambda: [LanguageProgress(**lang) for lang in MOCK_USER_LANGUAGES]
+    )
 
 # Analytics and stats endpoints
 @app.get("/api/v1/analytics/dashboard")
 async def get_dashboard_analytics(user_id: Optional[str] = Depends(get_current_user)):
     logger.info("Fetching dashboard analytics")
     
+    catalog = catalog_store.current()
+    stats = analytics.snapshot()
+    session = stats["average_session_seconds"]
     return {
-        "totalUsers": 12847,
-        "totalLessonsCompleted": 156789,
-        "averageSessionTime": "23m 45s",
-        "topLanguages": ["Spanish", "French", "German"],
-        "totalMovies": len(MOCK_MOVIES),
-        "totalLessons": sum(movie["totalLessons"] for movie in MOCK_MOVIES),
-        "userGrowth": "+15.2%",
+        "totalUsers": stats["total_users"],
+        "totalLessonsCompleted": stats["lessons_completed_total"],
+        "averageSessionTime": format_duration(session) if session is not None else "n/a",
+        "topLanguages": stats["top_languages"],
+        "totalMovies": len(catalog.movies),
+        "totalLessons": catalog.cached("total_lessons", lambda: sum(movie["totalLessons"] for movie in catalog.movies)),
+        "userGrowth": format_percent(stats["user_growth"], signed=True),
         "engagement": {
-            "dailyActiveUsers": 3421,
-            "weeklyActiveUsers": 8934,
+            "dailyActiveUsers": stats["daily_active_users"],
+            "weeklyActiveUsers": stats["weekly_active_users"],
+            "monthlyActiveUsers": stats["monthly_active_users"],
             "averageStreak": 8.5
-        }
+        },
+        "scope": stats["scope"],
+        "updatedAt": stats["refreshed_at"]
     }
 
 @app.get("/api/v1/user/stats")
-async def get_user_stats(user_id: Optional[str] = Depends(get_current_user)):
+async def get_user_stats(request: Request, user_id: Optional[str] = Depends(get_current_user)):
     logger.info("Fetching detailed user statistics")
     
+    catalog = catalog_store.current()
+    # The movie count comes from the catalog, so its version is part of the key
+    return await user_state.respond(request.headers, "stats", user_id, lambda: build_user_stats(catalog), catalog.version)
+
+def build_user_stats(catalog) -> Dict[str, Any]:
     return {
         "streak": {
             "current": 12,
@@ -1004,7 +1247,7 @@ async def get_user_stats(user_id: Optional[str] = Depends(get_current_user)):
         "movies": {
             "completed": 3,
             "inProgress": 2,
-            "totalAvailable": len(MOCK_MOVIES)
+            "totalAvailable": len(catalog.movies)
         },
         "achievements": {
             "earned": 8,
@@ -1024,17 +1267,43 @@ async def search_movies(
     q: str = "",
     language: Optional[str] = None,
     difficulty: Optional[str] = None,
-    limit: int = 20
+    min_difficulty: Optional[float] = None,
+    max_difficulty: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    user_id: Optional[str] = Depends(get_current_user)
 ):
     logger.info(f"Searching movies: query='{q}', language={language}, difficulty={difficulty}")
     
-    movies = MOCK_MOVIES.copy()
-    
-    # Filter by search query
+    catalog = catalog_store.current()
+    key = ("search_movies", catalog.version, q.lower(), language, difficulty, min_difficulty, max_difficulty, sort, limit)
+    results = await read_cache.get(
+        key,
+        lambda: filter_movies(catalog, q, language, difficulty, min_difficulty, max_difficulty, sort, limit),
+        ttl=None,
+        in_thread=True,
+        tags=(f"catalog:{catalog.version}",)
+    )
+    return progress_overlay.movies(await progress_overlay.load(user_id), catalog, results)
+
+def filter_movies(
+    catalog,
+    q: str,
+    language: Optional[str],
+    difficulty: Optional[str],
+    min_difficulty: Optional[float],
+    max_difficulty: Optional[float],
+    sort: Optional[str],
+    limit: int
+) -> List[Movie]:
+    movies = list(catalog.movies)
+    
+    # Filter by search query (lower-cased titles are precomputed per catalog version)
     if q:
+        needle = q.lower()
         movies = [
-            movie for movie in movies 
-            if q.lower() in movie["title"].lower()
+            movie for movie, title in zip(movies, catalog.movie_titles())
+            if needle in title
         ]
     
     # Filter by language
@@ -1051,70 +1320,105 @@ async def search_movies(
             if movie["difficulty"] == difficulty
         ]
     
+    # Filter and sort by numeric difficulty score
+    if min_difficulty is not None:
+        movies = [movie for movie in movies if movie["difficultyScore"] >= min_difficulty]
+    if max_difficulty is not None:
+        movies = [movie for movie in movies if movie["difficultyScore"] <= max_difficulty]
+    if sort in ("difficulty", "-difficulty"):
+        movies = sorted(movies, key=lambda movie: movie["difficultyScore"], reverse=sort.startswith("-"))
+    
     return [Movie(**movie) for movie in movies[:limit]]
 
 @app.get("/api/v1/search/vocabulary")
 async def search_vocabulary(
     q: str = "",
     language: Optional[str] = None,
-    limit: int = 50
+    limit: int = Query(50, ge=1, le=200)
 ):
     logger.info(f"Searching vocabulary: query='{q}', language={language}")
     
+    catalog = catalog_store.current()
+    return await read_cache.get(
+        ("search_vocabulary", catalog.version, q.lower(), language, limit),
+        lambda: filter_vocabulary(catalog, q, limit),
+        ttl=None,
+        in_thread=True,
+        tags=(f"catalog:{catalog.version}",)
+    )
+
+def filter_vocabulary(catalog, q: str, limit: int) -> List[Dict[str, Any]]:
     # This would search through all vocabulary items in a real implementation
-    vocabulary = MOCK_VOCABULARY.copy()
+    vocabulary = list(catalog.vocabulary)
     
     if q:
+        needle = q.lower()
         vocabulary = [
-            item for item in vocabulary 
-            if q.lower() in item["word"].lower() or q.lower() in item["translation"].lower()
+            item for item, (word, translation) in zip(vocabulary, catalog.vocabulary_terms())
+            if needle in word or needle in translation
         ]
     
     return vocabulary[:limit]
 
 # Preferences and settings endpoints
 @app.get("/api/v1/user/preferences")
-async def get_user_preferences(user_id: Optional[str] = Depends(get_current_user)):
+async def get_user_preferences(request: Request, user_id: Optional[str] = Depends(get_current_user)):
     logger.info("Fetching user preferences")
     
-    return {
-        "language": {
-            "primary": "Spanish",
-            "learning": ["Spanish", "French", "German"]
-        },
-        "notifications": {
-            "dailyReminder": True,
-            "streakReminder": True,
-            "achievementAlerts": True,
-            "communityUpdates": False
-        },
-        "display": {
-            "theme": "system",
-            "subtitleSize": "medium",
-            "playbackSpeed": 1.0
-        },
-        "privacy": {
-            "profileVisible": True,
-            "progressVisible": True,
-            "achievementsVisible": True
-        }
-    }
+    try:
+        document = await run_in_threadpool(preferences.document, user_id)
+    except sqlite3.Error as e:
+        logger.error(f"Preferences read failed: {e}")
+        raise HTTPException(status_code=503, detail="Preferences store unavailable, retry shortly")
+    # Another worker's write reaches this one's copy after the version bump, so the document is part of the key
+    return await user_state.respond(request.headers, "preferences", user_id, lambda: document, fingerprint(document))
+
+def preference_errors(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()]
+
+@app.patch("/api/v1/user/preferences")
+async def patch_user_preferences(
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    user_id: Optional[str] = Depends(get_current_user)
+):
+    """JSON Merge Patch: send only the settings that change; null restores a default"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    logger.info(f"Patching user preferences: {', '.join(patch_paths(patch)) or 'no changes'}")
+    try:
+        document = await run_in_threadpool(preferences.patch, user_id, patch)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=preference_errors(e))
+    except sqlite3.Error as e:
+        logger.error(f"Preferences write failed: {e}")
+        raise HTTPException(status_code=503, detail="Preferences store unavailable, retry shortly")
+    
+    await user_state.bump(user_id)
+    return document
 
 @app.put("/api/v1/user/preferences")
 async def update_user_preferences(
-    preferences: Dict[str, Any],
+    document: Dict[str, Any],
     user_id: Optional[str] = Depends(get_current_user)
 ):
-    logger.info(f"Updating user preferences: {preferences}")
-    
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    # In a real implementation, you would save these to a database
+    logger.info(f"Replacing user preferences: {', '.join(document) or 'defaults'}")
+    try:
+        document = await run_in_threadpool(preferences.replace, user_id, document)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=preference_errors(e))
+    except sqlite3.Error as e:
+        logger.error(f"Preferences write failed: {e}")
+        raise HTTPException(status_code=503, detail="Preferences store unavailable, retry shortly")
+    
+    await user_state.bump(user_id)
     return {
         "status": "success",
         "message": "Preferences updated successfully",
-        "data": preferences
+        "data": document
     }
 
 # Lesson interaction endpoints
@@ -1129,6 +1433,23 @@ async def complete_lesson(
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    analytics.record_activity(
+        user_id,
+        time_spent=completion_data.get("timeSpent"),
+        completed=True,
+        language=lesson_language(lesson_id)
+    )
+    await run_in_threadpool(progress_overlay.record_completion, user_id, catalog_store.current(), lesson_id)
+    await user_state.bump(user_id)
+    event_log.append(
+        "lesson_completed",
+        user_id,
+        lesson_id=lesson_id,
+        score=completion_data.get("score", 0),
+        time_spent=completion_data.get("timeSpent", 0),
+        new_words=completion_data.get("newWordsLearned", 0)
+    )
+    
     return {
         "status": "success",
         "message": "Lesson completed successfully",
@@ -1151,6 +1472,10 @@ async def mark_word_mastered(
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    await run_in_threadpool(mastered_words.record, user_id, [word_id])
+    await user_state.bump(user_id)
+    event_log.append("word_mastered", user_id, word_id=word_id)
+    
     return {
         "status": "success",
         "message": "Word marked as mastered",
@@ -1160,6 +1485,39 @@ async def mark_word_mastered(
         }
     }
 
+@app.get("/api/v1/vocabulary/export")
+async def export_vocabulary(
+    format: str = Query("csv", description="apkg, csv or tsv"),
+    user_id: Optional[str] = Depends(get_current_user)
+):
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown export format '{format}'; use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    
+    try:
+        mastered = await run_in_threadpool(mastered_words.words, user_id)
+    except sqlite3.Error as e:
+        logger.error(f"Could not read mastered words of {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Vocabulary store unavailable, retry shortly"
+        )
+    logger.info(f"Exporting {len(mastered)} mastered words as {format}")
+    entries = deck_entries(catalog_store.current(), mastered)
+    headers = {"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    if format == "apkg":
+        # The package is assembled on disk in a worker thread, then streamed in chunks
+        path, _ = await run_in_threadpool(build_apkg, entries)
+        content = iter_file(path)
+    else:
+        # Sync generators are iterated in the threadpool, row chunks go out as they are written
+        content = iter_delimited(entries, "," if format == "csv" else "\t")
+    return StreamingResponse(content, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
 # Social features
 @app.post("/api/v1/community/posts/{post_id}/like")
 async def like_post(
@@ -1171,6 +1529,9 @@ async def like_post(
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    event_log.append("post_liked", user_id, post_id=post_id)
+    await user_state.bump(user_id)
+    
     return {
         "status": "success",
         "message": "Post liked successfully",
@@ -1190,6 +1551,9 @@ async def unlike_post(
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    event_log.append("post_unliked", user_id, post_id=post_id)
+    await user_state.bump(user_id)
+    
     return {
         "status": "success",
         "message": "Post unliked successfully",
@@ -1199,28 +1563,129 @@ async def unlike_post(
         }
     }
 
+# Batch endpoint
+@app.post("/api/v1/batch")
+async def batch_requests(batch: BatchRequest, request: Request, user_id: Optional[str] = Depends(get_current_user)):
+    for path in batch.paths:
+        try:
+            split_target(path)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logger.info(f"Batch of {len(batch.paths)} requests: {', '.join(batch.paths)}")
+    
+    # Items skip admission control, so the batch pays what they would cost as separate requests
+    if RATE_LIMIT_ENABLED:
+        cost = batch_cost(batch.paths, rate_limiter.cost)
+        capacity = rate_limiter.rule(user_id).capacity
+        if cost > capacity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Batch costs {cost:g} tokens, more than the {capacity:g} a client can spend at once; split it"
+            )
+        client_ip = request.client.host if request.client else "unknown"
+        decision = await rate_limiter.charge_async(cost, user_id, client_ip)
+        if not decision.allowed:
+            logger.warning(f"Rate limited {user_id or client_ip}: batch costing {cost:g}")
+            return limit_response(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", decision.retry_after)
+    
+    body = await run_batch(app, request.scope, batch.paths, user_id)
+    return Response(content=body, media_type="application/json")
+
 # Admin and development endpoints
 @app.get("/api/v1/admin/stats")
 async def get_admin_stats():
     """Admin endpoint for platform statistics"""
+    catalog = catalog_store.current()
+    stats = analytics.snapshot()
+    session = stats["average_session_seconds"]
     return {
         "users": {
-            "total": 12847,
-            "active_today": 3421,
-            "new_this_week": 234
+            "total": stats["total_users"],
+            "active_today": stats["daily_active_users"],
+            "active_this_week": stats["weekly_active_users"],
+            "new_this_week": stats["new_users_this_week"]
         },
         "content": {
-            "movies": len(MOCK_MOVIES),
-            "lessons": len(MOCK_LESSONS) * len(MOCK_MOVIES),  # Approximate
-            "vocabulary_items": len(MOCK_VOCABULARY) * 50  # Approximate
+            "movies": len(catalog.movies),
+            "lessons": len(catalog.lessons),
+            "vocabulary_items": len(catalog.vocabulary)
         },
         "engagement": {
-            "lessons_completed_today": 8934,
-            "average_session_time": "23m 45s",
-            "retention_rate": "78.5%"
-        }
+            "lessons_completed_today": stats["lessons_completed_today"],
+            "average_session_time": format_duration(session) if session is not None else "n/a",
+            "retention_rate": format_percent(stats["weekly_retention"])
+        },
+        "cohorts": stats["cohorts"],
+        "scope": {"covers": stats["scope"], "workers": stats["workers"], "worker": os.getpid()},
+        "updated_at": stats["refreshed_at"]
+    }
+
+# Profiling endpoints (admin only; captures and samples are per worker)
+PROFILE_SORTS = {"cumulative", "tottime", "calls"}
+
+@app.get("/api/v1/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Recent per-request captures in this worker, plus profiler and sampler state"""
+    return {
+        "worker": os.getpid(),
+        "profiles": request_profiler.recent(),
+        "profiler": request_profiler.info(),
+        "sampler": stack_sampler.info()
     }
 
+@app.get("/api/v1/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = "text", sort: str = "cumulative"):
+    if format not in ("text", "pstats") or sort not in PROFILE_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be text or pstats; sort one of {', '.join(sorted(PROFILE_SORTS))}"
+        )
+    
+    if format == "pstats":
+        data = request_profiler.dump(profile_id)
+        if data is not None:
+            return Response(
+                data,
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+            )
+    else:
+        report = request_profiler.report(profile_id, sort)
+        if report is not None:
+            return PlainTextResponse(report)
+    
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Profile not found in this worker"
+    )
+
+@app.post("/api/v1/admin/profiles/arm", dependencies=[Depends(require_admin)])
+async def arm_profiler(path: str, count: int = Query(1, ge=1, le=100)):
+    """Profile the next ``count`` requests whose path starts with ``path``"""
+    request_profiler.arm(path, count)
+    return {"worker": os.getpid(), "armed": request_profiler.info()["armed"]}
+
+@app.post("/api/v1/admin/sampler/start", dependencies=[Depends(require_admin)])
+async def start_sampler(
+    seconds: Optional[float] = Query(60, gt=0, le=3600),
+    interval: Optional[float] = Query(None, ge=0.001, le=1.0)
+):
+    stack_sampler.start(duration=seconds, interval=interval)
+    return stack_sampler.info()
+
+@app.post("/api/v1/admin/sampler/stop", dependencies=[Depends(require_admin)])
+async def stop_sampler():
+    stack_sampler.stop()
+    return stack_sampler.info()
+
+@app.get("/api/v1/admin/sampler/flamegraph", dependencies=[Depends(require_admin)])
+async def get_flamegraph(reset: bool = False):
+    """Folded stacks for flamegraph.pl, speedscope or inferno"""
+    folded = stack_sampler.folded()
+    if reset:
+        stack_sampler.reset()
+    return PlainTextResponse(folded)
+
 @app.post("/api/v1/dev/reset-progress")
 async def reset_user_progress(user_id: Optional[str] = Depends(get_current_user)):
     """Development endpoint to reset user progress"""
@@ -1229,6 +1694,9 @@ async def reset_user_progress(user_id: Optional[str] = Depends(get_current_user)
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    await run_in_threadpool(progress_overlay.reset, user_id)
+    await user_state.bump(user_id)
+    
     return {
         "status": "success",
         "message": "User progress reset successfully",
@@ -1241,9 +1709,10 @@ async def reset_user_progress(user_id: Optional[str] = Depends(get_current_user)
 @app.get("/api/v1/dev/generate-data")
 async def generate_mock_data():
     """Development endpoint to generate additional mock data"""
+    catalog = catalog_store.current()
     return {
-        "movies": len(MOCK_MOVIES),
-        "lessons": len(MOCK_LESSONS),
+        "movies": len(catalog.movies),
+        "lessons": len(catalog.lessons),
         "achievements": len(MOCK_ACHIEVEMENTS),
         "community_posts": len(MOCK_COMMUNITY_POSTS),
         "leaderboard_entries": len(MOCK_LEADERBOARD),
@@ -1265,6 +1734,11 @@ async def http_exception_handler(request, exc: HTTPException):
         }
     )
 
+@app.exception_handler(SingleFlightTimeout)
+async def read_timeout_handler(request, exc: SingleFlightTimeout):
+    logger.warning(f"Read timed out: {exc}")
+    return limit_response(503, "Temporarily unavailable, please retry", exc.timeout)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc: Exception):
     logger.error(f"Global exception: {exc}")
@@ -1282,6 +1756,7 @@ async def global_exception_handler(request, exc: Exception):
 # Enhanced status endpoint
 @app.get("/api/v1/status")
 async def detailed_status():
+    catalog = catalog_store.current()
     return {
         "api_version": "3.0.0",
         "status": "operational",
@@ -1297,16 +1772,28 @@ async def detailed_status():
             "search": "enabled",
             "analytics": "enabled"
         },
+        "catalog": catalog.info(),
+        "warmup_ms": app.state.warmup,
+        "event_log": event_log.info(),
+        "progress_overlay": progress_overlay.info(),
+        "recommendations": recommender(catalog).info(),
+        "audio": audio_library.info(),
+        "mastered_words": mastered_words.info(),
+        "user_state": user_state.info(),
+        "preferences": preferences.info(),
+        "rate_limit": rate_limiter.info(),
+        "read_cache": read_cache.info(),
+        "cache": read_cache.store.info(),
         "data": {
-            "movies": len(MOCK_MOVIES),
-            "lessons": len(MOCK_LESSONS),
+            "movies": len(catalog.movies),
+            "lessons": len(catalog.lessons),
             "achievements": len(MOCK_ACHIEVEMENTS),
             "community_posts": len(MOCK_COMMUNITY_POSTS),
             "leaderboard_entries": len(MOCK_LEADERBOARD)
         },
         "endpoints": {
             "total": len([route for route in app.routes if hasattr(route, 'methods')]),
-            "public": 4,  # Root, health, status, docs
+            "public": 5,  # Root, health, ready, status, docs
             "authenticated": "most endpoints"
         },
         "performance": {
@@ -1317,6 +1804,77 @@ async def detailed_status():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+# Per-request profiling: only installed when ADMIN_TOKEN is set, so it costs nothing otherwise.
+# Registered before the admission and logging middleware, so captures cover the route itself.
+async def profile_requests(request, call_next):
+    requested = request.headers.get("x-profile") == "1" and is_admin(request.headers.get("x-admin-token"))
+    if not request_profiler.wants(request.url.path, requested):
+        return await call_next(request)
+    
+    with request_profiler.profile(request.method, request.url.path) as capture:
+        response = await call_next(request)
+    if capture is not None:
+        response.headers["X-Profile-Id"] = capture["id"]
+    return response
+
+if ADMIN_TOKEN:
+    app.middleware("http")(profile_requests)
+
+# Rate limiting and admission control
+# Route costs reflect relative expense; unlisted routes cost 1 token
+ROUTE_COSTS = {
+    ("POST", "/api/v1/auth/login"): 10,
+    ("POST", "/api/v1/auth/register"): 10,
+    ("GET", "/api/v1/search/movies"): 3,
+    ("GET", "/api/v1/search/vocabulary"): 3,
+    ("POST", "/api/v1/community/posts"): 5,
+    ("GET", "/api/v1/vocabulary/export"): 10,
+    ("POST", "/api/v1/batch"): 1,  # plus its items' costs, charged by the endpoint
+}
+UNLIMITED_PATHS = {"/", "/health", "/ready", "/docs", "/redoc", "/openapi.json"}
+
+rate_limiter = RateLimiter(create_backend(RATE_LIMIT_BACKEND), RATE_LIMIT_USER, RATE_LIMIT_IP, ROUTE_COSTS)
+concurrency_limiter = ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS)
+
+def limit_response(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "error": True,
+            "status_code": status_code,
+            "detail": detail,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        },
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+@app.middleware("http")
+async def admission_control(request, call_next):
+    if not RATE_LIMIT_ENABLED or request.method == "OPTIONS" or request.url.path in UNLIMITED_PATHS:
+        return await call_next(request)
+    if BATCH_USER_KEY in request.scope:
+        # A batch item: the batch was charged for it and holds a concurrency slot
+        return await call_next(request)
+    
+    authorization = request.headers.get("authorization")
+    user_id = verify_token(authorization.replace("Bearer ", "")) if authorization else None
+    request.state.user_id = user_id  # get_current_user reuses it instead of decoding the token again
+    client_ip = request.client.host if request.client else "unknown"
+    decision = await rate_limiter.check_async(request.method, request.url.path, user_id, client_ip)
+    if not decision.allowed:
+        logger.warning(f"Rate limited {user_id or client_ip}: {request.method} {request.url.path}")
+        return limit_response(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", decision.retry_after)
+    
+    try:
+        await concurrency_limiter.acquire()
+    except Overloaded as e:
+        logger.warning(f"Shedding load: {concurrency_limiter.in_flight} requests in flight")
+        return limit_response(status.HTTP_503_SERVICE_UNAVAILABLE, "Server overloaded, retry shortly", e.retry_after)
+    try:
+        return await call_next(request)
+    finally:
+        concurrency_limiter.release()
+
 # Middleware for request logging
 @app.middleware("http")
 async def log_requests(request, call_next):
@@ -1335,24 +1893,25 @@ async def log_requests(request, call_next):
     
     return response
 
+# CORS middleware, added last so it is outermost: 429s and 503s from admission_control
+# carry the CORS headers too, and browsers let the frontend read their Retry-After
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+    allow_headers=["*"],
+    expose_headers=["*", "Retry-After"],  # "*" does not cover credentialed requests, so name what clients must read
+)
+
 # Main application entry point
 if __name__ == "__main__":
-    import uvicorn
-    
-    port = int(os.environ.get("PORT", 8000))
-    host = "0.0.0.0"
+    import serve
     
     logger.info(f"Starting Enhanced CineFluent API v3.0.0")
-    logger.info(f"Server: {host}:{port}")
     logger.info(f"Environment: {os.getenv('RAILWAY_ENVIRONMENT', 'development')}")
     logger.info(f"CORS Origins: {CORS_ORIGINS}")
     logger.info("Features: Complete frontend integration ready")
     
-    uvicorn.run(
-        "main:app",
-        host=host,
-        port=port,
-        reload=False,
-        log_level="info",
-        access_log=True
-    )
\ No newline at end of file
+    # Multi-worker production server; see serve.py for worker count, recycling and shutdown
+    serve.main()
@@ -0,0 +1,315 @@
+"""
+CineFluent preferences store - typed preferences, JSON Merge Patch updates and coalesced writes
+
+Clients change one setting at a time (a playback-speed slider, the subtitle
+size), so updates are JSON Merge Patches (RFC 7386): an object holding only the
+keys that change, where ``null`` removes a key and so restores its default.
+The patched document is validated against the Preferences schema before it is
+accepted; an invalid patch changes nothing.
+
+Only the difference from the defaults is stored, usually a key or two per
+user. Without a SharedState the diffs live in memory, one copy per worker.
+With one, its SQLite file is the source of truth, and a write is not sent to
+it right away. Each worker composes a user's patches (with nulls resolved to
+the defaults, patches compose by plain merging) until the user has been quiet
+for ``debounce`` seconds, or ``max_delay`` seconds have passed since the first
+unsaved patch. A background thread then applies the composed patch to the
+stored diff in one transaction. Dragging a slider therefore produces one row
+write, not one per step, and patches from different workers that touch
+different settings both survive. Unsaved patches are written on shutdown.
+
+Reads take the stored diff from a per-worker cache that is refreshed after
+``read_ttl`` seconds, then apply the worker's own unsaved patches on top. A
+worker sees its own writes at once, and other workers see them within
+``debounce + read_ttl`` seconds. With a SharedState, calls may block on
+SQLite, so callers on the event loop run them on a worker thread.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_READ_TTL = 1.0  # seconds a worker reuses a stored diff before reading it again
+MAX_CACHED_USERS = 100_000  # stored diffs cached per worker (least recently read are dropped)
+
+
+class _Section(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+class LanguagePreferences(_Section):
+    primary: str = Field("Spanish", min_length=1, max_length=50)
+    learning: List[str] = Field(default_factory=lambda: ["Spanish", "French", "German"], max_length=20)
+
+
+class NotificationPreferences(_Section):
+    dailyReminder: bool = True
+    streakReminder: bool = True
+    achievementAlerts: bool = True
+    communityUpdates: bool = False
+
+
+class DisplayPreferences(_Section):
+    theme: Literal["light", "dark", "system"] = "system"
+    subtitleSize: Literal["small", "medium", "large"] = "medium"
+    playbackSpeed: float = Field(1.0, ge=0.5, le=2.0)
+
+
+class PrivacyPreferences(_Section):
+    profileVisible: bool = True
+    progressVisible: bool = True
+    achievementsVisible: bool = True
+
+
+class Preferences(_Section):
+    language: LanguagePreferences = Field(default_factory=LanguagePreferences)
+    notifications: NotificationPreferences = Field(default_factory=NotificationPreferences)
+    display: DisplayPreferences = Field(default_factory=DisplayPreferences)
+    privacy: PrivacyPreferences = Field(default_factory=PrivacyPreferences)
+
+
+DEFAULTS: Dict[str, Any] = Preferences().model_dump()
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """RFC 7386: apply ``patch`` to ``target`` without modifying either"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def diff(base: Dict[str, Any], document: Dict[str, Any]) -> Dict[str, Any]:
+    """The merge patch that turns ``base`` into ``document`` (keys are never removed, so no nulls)"""
+    changes = {}
+    for key, value in document.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            nested = diff(base[key], value)
+            if nested:
+                changes[key] = nested
+        elif key not in base or base[key] != value:
+            changes[key] = value
+    return changes
+
+
+def resolve_nulls(patch: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """The patch with each null replaced by the default it restores; nulls for unknown keys are dropped"""
+    resolved = {}
+    for key, value in patch.items():
+        if value is None:
+            if key in defaults:
+                resolved[key] = json.loads(json.dumps(defaults[key]))  # a copy the caller may not alias
+        elif isinstance(value, dict) and isinstance(defaults.get(key), dict):
+            resolved[key] = resolve_nulls(value, defaults[key])
+        else:
+            resolved[key] = value
+    return resolved
+
+
+def fingerprint(document: Dict[str, Any]) -> str:
+    """Short hash of a document, for ETags"""
+    return hashlib.blake2b(json.dumps(document, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def patch_paths(patch: Dict[str, Any], prefix: str = "") -> List[str]:
+    """Dotted paths of the settings a patch touches, for logging without the values"""
+    paths = []
+    for key, value in patch.items():
+        if isinstance(value, dict) and value:
+            paths.extend(patch_paths(value, f"{prefix}{key}."))
+        else:
+            paths.append(f"{prefix}{key}")
+    return paths
+
+
+class PreferencesStore:
+    """Per-user preference diffs: in memory, or in a SharedState with coalesced writes"""
+
+    def __init__(self, shared: Optional[SharedState] = None, debounce: float = DEFAULT_DEBOUNCE,
+                 max_delay: float = DEFAULT_MAX_DELAY, read_ttl: float = DEFAULT_READ_TTL):
+        self.shared = shared
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self.read_ttl = read_ttl
+        self.stats = {"writes": 0, "coalesced": 0, "persisted": 0, "loaded": 0, "failed": 0}
+        self._diffs: Dict[str, Dict[str, Any]] = {}  # without a SharedState
+        self._rows: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()  # user -> (stored diff, read at)
+        self._pending: Dict[str, Dict[str, Any]] = {}  # user -> composed patch not yet written
+        self._flushing: Dict[str, Dict[str, Any]] = {}  # patches being written right now
+        self._dirty: Dict[str, Tuple[float, float]] = {}  # user -> (first unsaved write, latest write)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if shared is not None:
+            shared.create_tables(
+                "CREATE TABLE IF NOT EXISTS preferences (user_id TEXT PRIMARY KEY, diff TEXT NOT NULL, updated REAL NOT NULL);"
+            )
+
+    @property
+    def persistent(self) -> bool:
+        return self.shared is not None
+
+    def _stored(self, user_id: str) -> Dict[str, Any]:
+        """The user's stored diff, from the worker's cache while it is younger than ``read_ttl``"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._rows.get(user_id)
+        if cached is not None and now - cached[1] < self.read_ttl:
+            return cached[0]
+        row = self.shared.connection().execute("SELECT diff FROM preferences WHERE user_id = ?", (user_id,)).fetchone()
+        changes = json.loads(row[0]) if row else {}
+        self.stats["loaded"] += 1
+        with self._lock:
+            self._rows[user_id] = (changes, now)
+            self._rows.move_to_end(user_id)
+            if len(self._rows) > MAX_CACHED_USERS:
+                self._rows.popitem(last=False)
+        return changes
+
+    def document(self, user_id: Optional[str]) -> Dict[str, Any]:
+        """The user's full preferences: the defaults with their diff (and any unsaved patches) applied"""
+        if not user_id:
+            return merge_patch(DEFAULTS, {})
+        if not self.persistent:
+            return merge_patch(DEFAULTS, self._diffs.get(user_id, {}))
+        document = merge_patch(DEFAULTS, self._stored(user_id))
+        with self._lock:
+            unsaved = [self._flushing.get(user_id), self._pending.get(user_id)]
+        for patch in unsaved:
+            if patch:
+                document = merge_patch(document, patch)
+        return document
+
+    def patch(self, user_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a merge patch; raises pydantic.ValidationError (and stores nothing) if the result is invalid"""
+        patch = resolve_nulls(patch, DEFAULTS)
+        document = Preferences.model_validate(merge_patch(self.document(user_id), patch)).model_dump()
+        self._write(user_id, document, patch)
+        return document
+
+    def replace(self, user_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the whole document; settings it leaves out return to their defaults"""
+        document = Preferences.model_validate(document).model_dump()
+        self._write(user_id, document, document)  # every setting is present, so as a patch it replaces them all
+        return document
+
+    def _write(self, user_id: str, document: Dict[str, Any], patch: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.stats["writes"] += 1
+            if not self.persistent:
+                self._diffs[user_id] = diff(DEFAULTS, document)
+                return
+            self._pending[user_id] = merge_patch(self._pending.get(user_id, {}), patch)
+            pending = self._dirty.get(user_id)
+            if pending is not None:
+                self.stats["coalesced"] += 1
+            self._dirty[user_id] = (pending[0] if pending else now, now)
+
+    def flush(self, force: bool = False) -> int:
+        """Write the patches of users whose writes have settled (all of them with ``force``); returns the count"""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    user_id for user_id, (first, latest) in self._dirty.items()
+                    if force or now - latest >= self.debounce or now - first >= self.max_delay
+                ]
+                batch = {}
+                for user_id in due:
+                    batch[user_id] = self._flushing[user_id] = self._pending.pop(user_id)
+                    del self._dirty[user_id]
+            if not batch:
+                return 0
+            try:
+                written = self._apply(batch)
+            except sqlite3.Error as e:
+                self.stats["failed"] += len(batch)
+                logger.error(f"Failed to persist preferences of {len(batch)} users: {e}")
+                with self._lock:
+                    for user_id, patch in batch.items():
+                        # Retried on the next pass, with anything written since composed on top
+                        self._pending[user_id] = merge_patch(patch, self._pending.get(user_id, {}))
+                        self._dirty.setdefault(user_id, (now, now))
+                        del self._flushing[user_id]
+                return 0
+            with self._lock:
+                for user_id in batch:
+                    if user_id in written:
+                        self._rows[user_id] = (written[user_id], time.monotonic())
+                    del self._flushing[user_id]
+            self.stats["persisted"] += len(written)
+            return len(written)
+
+    def _apply(self, batch: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Apply each patch to the stored diff in one transaction; returns the new diffs"""
+        written = {}
+        updated = time.time()
+        with self.shared.transaction() as connection:
+            for user_id, patch in batch.items():
+                row = connection.execute("SELECT diff FROM preferences WHERE user_id = ?", (user_id,)).fetchone()
+                stored = merge_patch(DEFAULTS, json.loads(row[0]) if row else {})
+                try:
+                    document = Preferences.model_validate(merge_patch(stored, patch)).model_dump()
+                except ValidationError as e:
+                    # Settings are validated one by one on write, so this needs a schema change in between
+                    logger.error(f"Dropping unsaved preferences of {user_id} that no longer validate: {e}")
+                    continue
+                written[user_id] = diff(DEFAULTS, document)
+                connection.execute(
+                    "INSERT OR REPLACE INTO preferences (user_id, diff, updated) VALUES (?, ?, ?)",
+                    (user_id, json.dumps(written[user_id], separators=(",", ":")), updated),
+                )
+        return written
+
+    def start(self) -> None:
+        """Start the background writer (a no-op without a SharedState)"""
+        if not self.persistent or self._thread is not None:
+            return
+        self._stop.clear()
+
+        def flush_loop() -> None:
+            while not self._stop.wait(self.debounce / 2):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Preferences flush failed: {e}")
+
+        self._thread = threading.Thread(target=flush_loop, name="preferences-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Preferences written to {self.shared.path} after {self.debounce:g}s of quiet")
+
+    def close(self) -> None:
+        """Stop the writer and persist every unsaved patch"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.persistent:
+            self.flush(force=True)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "persistent": self.persistent,
+            "users": len(self._rows) if self.persistent else len(self._diffs),
+            "pending": len(self._dirty),
+            **self.stats,
+        }
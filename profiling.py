@@ -0,0 +1,243 @@
+"""
+CineFluent profiling - per-request cProfile captures and a low-rate stack sampler
+
+Two complementary views of where time goes in a running worker:
+
+- RequestProfiler runs cProfile around single requests (asked for with a
+  header, or armed by an admin for the next N requests to a path) and keeps
+  the most recent captures. cProfile hooks the event-loop thread, so a capture
+  also includes whatever other requests the loop ran meanwhile, and work sent
+  to thread pools is not in it.
+- StackSampler wakes every ``interval`` seconds, records the stack of every
+  thread via ``sys._current_frames()`` and aggregates them as folded stacks
+  ("thread;outer;...;inner count"), the input format of flamegraph.pl,
+  speedscope and inferno. It sees every thread, at a cost proportional to the
+  sample rate rather than to the amount of Python executed.
+
+Captures stay in memory in the worker that took them.
+"""
+import cProfile
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEP = 20  # request profiles kept per worker
+DEFAULT_TOP = 40  # functions listed in a profile's text report
+DEFAULT_SAMPLE_INTERVAL = 0.02  # seconds; 50 Hz
+MAX_STACKS = 20_000  # distinct folded stacks kept; further new stacks are counted as truncated
+MAX_DEPTH = 128
+
+
+class RequestProfiler:
+    """Profiles single requests with cProfile; one capture at a time per worker"""
+
+    def __init__(self, keep: int = DEFAULT_KEEP, top: int = DEFAULT_TOP):
+        self.keep = keep
+        self.top = top
+        self.busy_skips = 0
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._armed: Dict[str, int] = {}
+        self._active = False
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def arm(self, path_prefix: str, count: int = 1) -> None:
+        """Profile the next ``count`` requests whose path starts with ``path_prefix``"""
+        with self._lock:
+            self._armed[path_prefix] = count
+
+    def wants(self, path: str, requested: bool = False) -> bool:
+        """Whether to profile a request; consumes one armed capture when it matches"""
+        if requested:
+            return True
+        if not self._armed:
+            return False
+        with self._lock:
+            for prefix, remaining in self._armed.items():
+                if path.startswith(prefix):
+                    if remaining <= 1:
+                        del self._armed[prefix]
+                    else:
+                        self._armed[prefix] = remaining - 1
+                    return True
+        return False
+
+    @contextmanager
+    def profile(self, method: str, path: str) -> Iterator[Optional[Dict[str, Any]]]:
+        """Profile the block; yields the capture's summary, or None if another capture is running"""
+        with self._lock:
+            # cProfile hooks the whole thread, so overlapping captures would corrupt each other
+            busy = self._active
+            if busy:
+                self.busy_skips += 1
+            else:
+                self._active = True
+        if busy:
+            yield None
+            return
+
+        summary = {
+            "id": f"{os.getpid()}-{next(self._ids)}",
+            "method": method,
+            "path": path,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield summary
+        finally:
+            profiler.disable()
+            summary["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            with self._lock:
+                self._active = False
+            self._store(summary, profiler)
+
+    def _store(self, summary: Dict[str, Any], profiler: cProfile.Profile) -> None:
+        profiler.create_stats()
+        summary["stats"] = profiler.stats
+        with self._lock:
+            self._profiles[summary["id"]] = summary
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        logger.info(f"Profiled {summary['method']} {summary['path']} in {summary['duration_ms']}ms as {summary['id']}")
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{k: v for k, v in p.items() if k != "stats"} for p in reversed(self._profiles.values())]
+
+    def report(self, profile_id: str, sort: str = "cumulative") -> Optional[str]:
+        """pstats text report (top functions by ``sort``) for one capture"""
+        profile = self._profiles.get(profile_id)
+        if profile is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(_Loaded(profile["stats"]), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(self.top)
+        header = f"{profile['method']} {profile['path']} at {profile['started_at']} ({profile['duration_ms']}ms)\n"
+        return header + out.getvalue()
+
+    def dump(self, profile_id: str) -> Optional[bytes]:
+        """The capture in pstats' binary format, for snakeviz or ``pstats.Stats(path)``"""
+        profile = self._profiles.get(profile_id)
+        return marshal.dumps(profile["stats"]) if profile else None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "kept": len(self._profiles),
+            "armed": dict(self._armed),
+            "busy_skips": self.busy_skips,
+        }
+
+
+class _Loaded:
+    """Adapter so pstats.Stats accepts an already collected stats dict"""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed low rate and aggregates folded stacks"""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL, max_stacks: int = MAX_STACKS):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self.truncated = 0
+        self.started_at: Optional[datetime] = None
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._until: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: Optional[float] = None, interval: Optional[float] = None) -> None:
+        """Sample until stop(), or for ``duration`` seconds; restarting extends or shortens the run"""
+        if interval:
+            self.interval = interval
+        self._until = time.monotonic() + duration if duration else None
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = datetime.now(timezone.utc)
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"Stack sampler started at {1 / self.interval:.0f} Hz" + (f" for {duration}s" if duration else ""))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self._until is not None and time.monotonic() >= self._until:
+                break
+            self.sample(skip=own)
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Take one sample of every thread (except ``skip``)"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            calls = []
+            while frame is not None and len(calls) < MAX_DEPTH:
+                code = frame.f_code
+                calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":"))
+                frame = frame.f_back
+            calls.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            stacks.append(";".join(reversed(calls)))
+        with self._lock:
+            self.samples += 1
+            for stack in stacks:
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += 1
+                else:
+                    self.truncated += 1
+
+    def folded(self) -> str:
+        """Aggregated stacks, one "frame;frame;... count" line each, heaviest first"""
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.truncated = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+            "truncated": self.truncated,
+        }
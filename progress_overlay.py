@@ -0,0 +1,225 @@
+"""
+CineFluent progress overlay - per-user lesson completion merged into shared movie listings
+
+Movie listings are cached once per catalog version and shared by every user,
+so they cannot carry anyone's progress. Instead each user's completed lesson
+ids are kept per movie, updated by progress writes, and a request reads them
+once as a UserProgress. Responses are personalised after the cache: a
+listing's movies are matched against the user's completed counts in one
+vectorized pass (a sorted-array join with numpy), and only the per-user fields
+are copied onto the shared models.
+
+Completions are keyed by lesson id, not by a lesson's position, so a catalog
+reload that reorders, adds or drops lessons leaves them on the right lessons.
+Counts only include lessons that still belong to the movie in the catalog
+being served. Without a SharedState completions live in memory per worker.
+With one, its SQLite file is the source of truth and every worker reads the
+same progress; reads and writes then block, so callers on the event loop use
+``load()`` or a worker thread.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+MAX_LESSONS = 64  # completed lessons tracked per user and movie; later ones are not recorded
+
+
+def lesson_movie(catalog, lesson_id: str) -> Optional[str]:
+    """The movie a catalog or generated lesson id belongs to in ``catalog``"""
+    lesson = catalog.lesson(lesson_id)
+    if lesson is not None:
+        return lesson["movieId"]
+    # Lessons generated for movies without catalog lessons are "<movie id>_lesson_<n>"
+    movie_id, separator, number = lesson_id.rpartition("_lesson_")
+    if (separator and number.isdigit() and int(number) > 0 and catalog.movie(movie_id) is not None
+            and not catalog.lessons_for_movie(movie_id)):
+        return movie_id
+    return None
+
+
+def movie_columns(catalog) -> Dict[str, int]:
+    """Movie id -> position in the catalog, built once per catalog version"""
+    return catalog.cached("movie_columns", lambda: {movie["id"]: i for i, movie in enumerate(catalog.movies)})
+
+
+class UserProgress:
+    """One user's completed lesson ids by movie, as read for one request (or cached until the next write)"""
+
+    __slots__ = ("lessons", "_arrays", "_lock")
+
+    def __init__(self, lessons: Optional[Dict[str, FrozenSet[str]]] = None):
+        self.lessons: Dict[str, FrozenSet[str]] = lessons or {}
+        self._arrays: Optional[Tuple[str, Any, Any]] = None  # (catalog version, sorted movie columns, completed counts)
+        self._lock = threading.Lock()
+
+    def completed(self, catalog) -> Dict[str, int]:
+        """Movie id -> number of completed lessons that belong to it in ``catalog``"""
+        counts = {}
+        for movie_id, lesson_ids in self.lessons.items():
+            count = sum(1 for lesson_id in lesson_ids if lesson_movie(catalog, lesson_id) == movie_id)
+            if count:
+                counts[movie_id] = count
+        return counts
+
+    def arrays(self, catalog):
+        """(sorted movie columns, completed counts) for this catalog version"""
+        import numpy as np  # Deferred like the other numpy users; warm() loads it before the first request
+
+        arrays = self._arrays
+        if arrays is None or arrays[0] != catalog.version:
+            columns = movie_columns(catalog)
+            pairs = sorted((columns[movie_id], count) for movie_id, count in self.completed(catalog).items() if movie_id in columns)
+            arrays = (
+                catalog.version,
+                np.array([column for column, _ in pairs], dtype=np.int64),
+                np.array([count for _, count in pairs], dtype=np.int64),
+            )
+            with self._lock:
+                self._arrays = arrays
+        return arrays[1], arrays[2]
+
+
+ANONYMOUS = UserProgress()  # no user: cached models are served as they are
+NO_PROGRESS = UserProgress()  # a user without completions: progress fields are zeroed
+
+
+class ProgressOverlay:
+    """Per-user completed lessons (in memory or a SharedState) and the merge that personalises cached responses"""
+
+    def __init__(self, shared: Optional[SharedState] = None):
+        self.shared = shared
+        self.completions = 0
+        self.errors = 0
+        self._users: Dict[str, UserProgress] = {}  # without a SharedState; replaced, never mutated, on write
+        self._lock = threading.Lock()
+        if shared is not None:
+            shared.create_tables(
+                """
+                CREATE TABLE IF NOT EXISTS lesson_completions (
+                    user_id TEXT NOT NULL, lesson_id TEXT NOT NULL, movie_id TEXT NOT NULL, completed_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, lesson_id)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def record_completion(self, user_id: str, catalog, lesson_id: str) -> bool:
+        """Mark the lesson completed for the user; returns False for lessons that can't be placed"""
+        movie_id = lesson_movie(catalog, lesson_id)
+        if movie_id is None:
+            logger.debug(f"Lesson {lesson_id} belongs to no movie")
+            return False
+        if self.shared is not None:
+            return self._record_shared(user_id, movie_id, lesson_id)
+        with self._lock:
+            user = self._users.get(user_id, NO_PROGRESS)
+            completed = user.lessons.get(movie_id, frozenset())
+            if lesson_id in completed or len(completed) >= MAX_LESSONS:
+                return lesson_id in completed
+            self._users[user_id] = UserProgress({**user.lessons, movie_id: completed | {lesson_id}})
+            self.completions += 1
+        return True
+
+    def _record_shared(self, user_id: str, movie_id: str, lesson_id: str) -> bool:
+        try:
+            with self.shared.transaction() as connection:
+                tracked = connection.execute(
+                    "SELECT COUNT(*) FROM lesson_completions WHERE user_id = ? AND movie_id = ?", (user_id, movie_id)
+                ).fetchone()[0]
+                if tracked >= MAX_LESSONS:
+                    return False
+                inserted = connection.execute(
+                    "INSERT OR IGNORE INTO lesson_completions (user_id, lesson_id, movie_id, completed_at) VALUES (?, ?, ?, ?)",
+                    (user_id, lesson_id, movie_id, time.time()),
+                ).rowcount
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not record completion of {lesson_id}: {e}")
+            return False
+        self.completions += inserted
+        return True
+
+    def reset(self, user_id: str) -> None:
+        if self.shared is not None:
+            with self.shared.transaction() as connection:
+                connection.execute("DELETE FROM lesson_completions WHERE user_id = ?", (user_id,))
+            return
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def progress(self, user_id: Optional[str]) -> UserProgress:
+        """The user's completed lessons (blocking with a SharedState; an unreadable store counts as none)"""
+        if not user_id:
+            return ANONYMOUS
+        if self.shared is None:
+            return self._users.get(user_id, NO_PROGRESS)
+        try:
+            rows = self.shared.connection().execute(
+                "SELECT movie_id, lesson_id FROM lesson_completions WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not read the progress of {user_id}, serving it without: {e}")
+            return NO_PROGRESS
+        lessons: Dict[str, set] = {}
+        for movie_id, lesson_id in rows:
+            lessons.setdefault(movie_id, set()).add(lesson_id)
+        return UserProgress({movie_id: frozenset(ids) for movie_id, ids in lessons.items()})
+
+    async def load(self, user_id: Optional[str]) -> UserProgress:
+        """progress() for callers on the event loop"""
+        if not user_id or self.shared is None:
+            return self.progress(user_id)
+        return await run_in_threadpool(self.progress, user_id)
+
+    def movies(self, progress: UserProgress, catalog, movies: Sequence[Any]) -> List[Any]:
+        """Copies of the cached Movie models with the user's progress and completedLessons"""
+        if progress is ANONYMOUS or not movies:
+            return list(movies)
+        import numpy as np
+
+        columns = movie_columns(catalog)
+        listing = np.fromiter((columns.get(movie.id, -1) for movie in movies), dtype=np.int64, count=len(movies))
+        totals = np.fromiter((movie.totalLessons for movie in movies), dtype=np.int64, count=len(movies))
+
+        # Join the listing with the user's sorted movie columns
+        user_columns, user_counts = progress.arrays(catalog)
+        completed = np.zeros(len(movies), dtype=np.int64)
+        if len(user_columns):
+            positions = np.minimum(np.searchsorted(user_columns, listing), len(user_columns) - 1)
+            completed = np.where(user_columns[positions] == listing, user_counts[positions], 0)
+        completed = np.minimum(completed, totals)
+        progress_percent = np.where(totals > 0, (completed * 100 + totals // 2) // np.maximum(totals, 1), 0)
+
+        return [
+            movie.model_copy(update={"progress": percent, "completedLessons": done})
+            for movie, percent, done in zip(movies, progress_percent.tolist(), completed.tolist())
+        ]
+
+    def lessons(self, progress: UserProgress, movie_id: str, lessons: Sequence[Any]) -> List[Any]:
+        """Copies of the cached Lesson models with the user's completed flags"""
+        if progress is ANONYMOUS:
+            return list(lessons)
+        completed = progress.lessons.get(movie_id, frozenset())
+        return [lesson.model_copy(update={"completed": lesson.id in completed}) for lesson in lessons]
+
+    def warm(self, catalog) -> None:
+        """Import numpy and build the catalog's movie columns ahead of the first personalised request"""
+        import numpy  # noqa: F401
+
+        movie_columns(catalog)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "shared": self.shared is not None,
+            "users": len(self._users),
+            "completions": self.completions,
+            "errors": self.errors,
+        }
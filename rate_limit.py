@@ -0,0 +1,244 @@
+"""
+CineFluent rate limiting - token buckets per user/IP and global admission control
+
+Each client (authenticated user id, else client IP) owns a token bucket that
+refills at ``rate`` tokens per second up to ``capacity``; every request spends
+its route's cost. Buckets live in a pluggable backend: in-process memory by
+default, or a SQLite file shared by all workers on a host. A separate
+ConcurrencyLimiter caps in-flight requests and sheds excess load with 503
+before the event loop saturates.
+
+Shared backends block on a file lock, so their checks run on a worker thread
+rather than the event loop. A backend error (such as a locked database) lets
+the request through: the limiter fails open, counts the error and logs it.
+"""
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitRule(NamedTuple):
+    rate: float  # tokens refilled per second
+    capacity: float  # burst size
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: float
+    retry_after: float  # seconds until the request would be allowed (0 when allowed)
+
+
+def _refill(tokens: float, updated: float, now: float, rule: RateLimitRule) -> float:
+    return min(rule.capacity, tokens + (now - updated) * rule.rate)
+
+
+def _decide(tokens: float, cost: float, rule: RateLimitRule) -> Tuple[Decision, float]:
+    if tokens >= cost:
+        return Decision(True, tokens - cost, 0.0), tokens - cost
+    wait = (min(cost, rule.capacity) - tokens) / rule.rate if rule.rate > 0 else math.inf
+    return Decision(False, tokens, wait), tokens
+
+
+class BucketBackend:
+    """Storage for token buckets; implementations must make consume() atomic per key"""
+
+    blocking = False  # True when consume() may wait on I/O or locks and must stay off the event loop
+
+    def consume(self, key: str, cost: float, rule: RateLimitRule, now: Optional[float] = None) -> Decision:
+        raise NotImplementedError
+
+    def open(self) -> None:
+        """Connect for the calling thread ahead of its first request (no-op for in-process storage)"""
+
+
+class MemoryBucketBackend(BucketBackend):
+    """Per-process buckets; idle buckets are pruned once ``max_keys`` is exceeded"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, cost: float, rule: RateLimitRule, now: Optional[float] = None) -> Decision:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            decision, tokens = _decide(_refill(tokens, updated, now, rule), cost, rule)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, rule)
+        return decision
+
+    def _prune(self, now: float, rule: RateLimitRule) -> None:
+        # A bucket that has refilled completely is indistinguishable from a new one
+        full_after = rule.capacity / rule.rate if rule.rate > 0 else math.inf
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+
+
+class SQLiteBucketBackend(BucketBackend):
+    """Buckets in a SQLite file so every worker on the host shares the same limits.
+
+    Uses wall-clock time (monotonic clocks are per process) and a
+    ``BEGIN IMMEDIATE`` transaction so concurrent workers serialize per update.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # A connection must not cross fork(): workers forked from a preloading master open their own
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def open(self) -> None:
+        self._connection()
+
+    def consume(self, key: str, cost: float, rule: RateLimitRule, now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (rule.capacity, now)
+            decision, tokens = _decide(_refill(tokens, updated, now, rule), cost, rule)
+            connection.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return decision
+
+
+def create_backend(url: str) -> BucketBackend:
+    """Backend from a RATE_LIMIT_BACKEND setting: "memory" or "sqlite:///path/to/file.db" """
+    if url.startswith("sqlite:///"):
+        return SQLiteBucketBackend(url[len("sqlite:///"):])
+    if url in ("", "memory"):
+        return MemoryBucketBackend()
+    raise ValueError(f"Unsupported rate limit backend: {url}")
+
+
+class RateLimiter:
+    """Charges per-route costs against per-client buckets"""
+
+    def __init__(
+        self,
+        backend: BucketBackend,
+        user_rule: RateLimitRule,
+        ip_rule: RateLimitRule,
+        route_costs: Optional[Dict[Tuple[str, str], float]] = None,
+    ):
+        self.backend = backend
+        self.user_rule = user_rule
+        self.ip_rule = ip_rule
+        self.route_costs = route_costs or {}
+        self.errors = 0
+
+    def cost(self, method: str, path: str) -> float:
+        return self.route_costs.get((method, path), 1.0)
+
+    def rule(self, user_id: Optional[str]) -> RateLimitRule:
+        return self.user_rule if user_id else self.ip_rule
+
+    def check(self, method: str, path: str, user_id: Optional[str], client_ip: str) -> Decision:
+        return self.charge(self.cost(method, path), user_id, client_ip)
+
+    def charge(self, cost: float, user_id: Optional[str], client_ip: str) -> Decision:
+        """Spend ``cost`` tokens from the client's bucket, or none if it holds fewer"""
+        rule = self.rule(user_id)
+        key = f"user:{user_id}" if user_id else f"ip:{client_ip}"
+        try:
+            return self.backend.consume(key, cost, rule)
+        except sqlite3.Error as e:
+            # Fail open: a broken limiter must not take the API down with it
+            self.errors += 1
+            logger.error(f"Rate limit check for {key} failed, allowing the request: {e}")
+            return Decision(True, rule.capacity, 0.0)
+
+    async def check_async(self, method: str, path: str, user_id: Optional[str], client_ip: str) -> Decision:
+        """check() from the event loop; blocking backends run on a worker thread"""
+        return await self.charge_async(self.cost(method, path), user_id, client_ip)
+
+    async def charge_async(self, cost: float, user_id: Optional[str], client_ip: str) -> Decision:
+        """charge() from the event loop; blocking backends run on a worker thread"""
+        if self.backend.blocking:
+            return await run_in_threadpool(self.charge, cost, user_id, client_ip)
+        return self.charge(cost, user_id, client_ip)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": type(self.backend).__name__, "errors": self.errors}
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Server overloaded")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight requests; a bounded number may wait briefly for a slot.
+
+    When the wait queue is full, or a slot does not free up within
+    ``queue_timeout``, ``acquire()`` raises Overloaded so the caller can answer 503
+    immediately instead of piling more work onto a saturated event loop.
+    """
+
+    def __init__(self, max_concurrent: int, max_waiting: int, queue_timeout: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def acquire(self) -> None:
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                raise Overloaded(self.queue_timeout)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Overloaded(self.queue_timeout) from None
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._get_semaphore().release()
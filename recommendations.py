@@ -0,0 +1,444 @@
+"""
+CineFluent recommendations - "recommended for you" movies from vectorized similarity
+
+Movies and users share one small feature space:
+
+- language: one column per catalog language
+- difficulty: soft membership in five difficulty bands (Gaussian bumps over
+  the 0-100 ``difficultyScore``), L2-normalised so two equal scores match at 1
+- quality: the movie's rating scaled to 0..1
+
+The item matrix (movies x features) is built once per catalog version. A
+user's profile row weights their languages (declared ones blended with what
+they actually complete) and centres the difficulty bands on their level,
+nudged towards, and slightly past, the difficulty of what they have
+completed. Scoring many users is one matrix product, ``profiles @ items.T``,
+and each row's top K comes from ``np.argpartition``; movies the user has
+finished are masked out first.
+
+The batch job scores every user of an activity database (benchmarks.datagen
+layout) in row blocks and writes .npy arrays the API memory-maps, so all
+workers share one copy of the lists. Each run writes its arrays into a fresh
+build directory and then atomically replaces the metadata that names it, so
+a worker starting mid-run loads either the previous build or the new one,
+never a mix:
+
+    python recommendations.py --db activity.db --catalog catalog.snap --out recommendations/
+
+Lists are tied to the catalog version they were built for; users missing from
+them, or any user after a catalog change, are scored online from the same
+matrices.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog import LEVEL_SCORES, level_score, load_catalog
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTY_CENTRES = (10.0, 30.0, 50.0, 70.0, 90.0)
+DIFFICULTY_WIDTH = 15.0
+# Per-block weights: language dominates, so a movie in a language the user isn't
+# learning can't make up for it with a good difficulty fit or rating
+LANGUAGE_WEIGHT = 1.0
+DIFFICULTY_WEIGHT = 0.5
+RATING_WEIGHT = 0.2
+HISTORY_WEIGHT = 0.5  # share of the language and difficulty preference taken from completions
+STRETCH = 5.0  # recommend a little harder than what the user has been completing
+LEVEL_STEP = 6.0  # difficulty score per numeric level (the activity database's 1, 2, ...)
+DEFAULT_TOP_K = 50  # lists kept per user by the batch job
+BLOCK_CELLS = 16_000_000  # users x movies scored per matrix product (64 MB of float32)
+
+# Files written by the batch job: the metadata, and the arrays in the build directory it names
+META_FILE = "meta.json"
+USERS_FILE = "users.npy"
+TOP_FILE = "top.npy"
+BUILD_PREFIX = "build-"
+
+
+def level_target(level) -> float:
+    """Target difficulty score for a numeric level or a label like "Intermediate B1" """
+    if isinstance(level, str):
+        return float(level_score(level.split()[0] if level else ""))
+    return float(min(95.0, 10.0 + LEVEL_STEP * level))
+
+
+def declared_profile(language_progress: Sequence[Dict[str, Any]]) -> Tuple[Dict[str, float], float]:
+    """Language weights and target difficulty from the user's language progress entries
+
+    Each language counts in proportion to the progress made in it, and the
+    target is the progress-weighted mean of the per-language levels.
+    """
+    weights = {entry["name"]: max(float(entry.get("progress", 0)), 1.0) for entry in language_progress}
+    if not weights:
+        return {}, LEVEL_SCORES["Intermediate"]
+    total = sum(weights.values())
+    target = sum(level_target(entry["level"]) * weights[entry["name"]] for entry in language_progress) / total
+    return weights, target
+
+
+def _normalise_rows(matrix: np.ndarray) -> np.ndarray:
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0)
+
+
+def difficulty_bands(scores: np.ndarray) -> np.ndarray:
+    """(n, bands) soft band membership of difficulty scores, unit length per row"""
+    centres = np.asarray(DIFFICULTY_CENTRES)
+    bands = np.exp(-0.5 * ((np.asarray(scores, dtype=np.float64)[:, None] - centres) / DIFFICULTY_WIDTH) ** 2)
+    return bands / np.linalg.norm(bands, axis=1, keepdims=True)
+
+
+class ItemFeatures:
+    """Item-feature matrix for one catalog's movies, and top-K scoring against it"""
+
+    def __init__(self, movies: Sequence[Dict[str, Any]]):
+        movies = list(movies)
+        self.movie_ids = [movie["id"] for movie in movies]
+        self.column = {movie_id: i for i, movie_id in enumerate(self.movie_ids)}
+        self.languages = sorted({movie["language"] for movie in movies})
+        self.language_column = {language: i for i, language in enumerate(self.languages)}
+        self.language = np.array([self.language_column[movie["language"]] for movie in movies], dtype=np.int64)
+        self.difficulty = np.array([movie.get("difficultyScore", level_score(movie["difficulty"])) for movie in movies], dtype=np.float64)
+        self.total_lessons = np.array([movie["totalLessons"] for movie in movies], dtype=np.int64)
+        rating = np.array([movie["rating"] for movie in movies], dtype=np.float64) / 5.0
+
+        language = np.zeros((len(movies), len(self.languages)))
+        language[np.arange(len(movies)), self.language] = 1.0
+        self.matrix = np.hstack([
+            LANGUAGE_WEIGHT * language,
+            DIFFICULTY_WEIGHT * difficulty_bands(self.difficulty),
+            RATING_WEIGHT * rating[:, None],
+        ]).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+
+    def profiles(
+        self,
+        declared: np.ndarray,
+        targets: np.ndarray,
+        history: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    ) -> np.ndarray:
+        """User-profile matrix, one row per user.
+
+        ``declared`` is (users, languages) weights in ``self.languages`` order,
+        ``targets`` the level-based difficulty targets and ``history`` the
+        (row, movie column, completed lessons) triples of the users' progress.
+        """
+        rows, columns, counts = history
+        users = len(targets)
+        counts = counts.astype(np.float64)
+
+        watched = np.zeros((users, len(self.languages)))
+        np.add.at(watched, (rows, self.language[columns]), counts)
+        completed = np.bincount(rows, weights=counts, minlength=users)
+        completed_difficulty = np.bincount(rows, weights=counts * self.difficulty[columns], minlength=users)
+
+        languages = (1 - HISTORY_WEIGHT) * _normalise_rows(declared) + HISTORY_WEIGHT * _normalise_rows(watched)
+        languages = _normalise_rows(languages)
+        languages[languages.sum(axis=1) == 0] = 1.0 / max(len(self.languages), 1)  # nothing known: every language
+
+        targets = np.asarray(targets, dtype=np.float64).copy()
+        active = completed > 0
+        targets[active] = (
+            (1 - HISTORY_WEIGHT) * targets[active]
+            + HISTORY_WEIGHT * (completed_difficulty[active] / completed[active] + STRETCH)
+        )
+
+        return np.hstack([
+            languages,
+            difficulty_bands(targets),
+            np.ones((users, 1)),
+        ]).astype(np.float32)
+
+    def finished(self, history: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(row, movie column) pairs of movies whose every lesson the user has completed"""
+        rows, columns, counts = history
+        done = counts >= self.total_lessons[columns]
+        return rows[done], columns[done]
+
+    def top_k(
+        self,
+        profiles: np.ndarray,
+        k: int,
+        exclude: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(movie columns, scores) of each profile's best ``k`` movies, best first.
+
+        Excluded (row, column) pairs and columns outside ``allowed`` score
+        -inf; they only appear when fewer than ``k`` movies are left.
+        """
+        scores = profiles @ self.matrix.T
+        if exclude is not None and len(exclude[0]):
+            scores[exclude] = -np.inf
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        k = min(k, scores.shape[1])
+        if k == 0:
+            empty = np.empty((len(profiles), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class Precomputed:
+    """Top-K lists written by the batch job, memory-mapped read-only"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.catalog_version = meta["catalog_version"]
+        self.movies = meta["movies"]
+        self.k = meta["k"]
+        self.built_at = meta["built_at"]
+        arrays = os.path.join(directory, meta.get("build", ""))  # Lists from before build directories sit alongside
+        self.users = np.load(os.path.join(arrays, USERS_FILE), mmap_mode="r")
+        self.top = np.load(os.path.join(arrays, TOP_FILE), mmap_mode="r")
+
+    def lookup(self, user_id: str) -> Optional[np.ndarray]:
+        """Movie columns precomputed for the user (best first), or None"""
+        if not user_id.isdigit() or not len(self.users):
+            return None
+        user = int(user_id)
+        position = int(np.searchsorted(self.users, user))
+        if position < len(self.users) and self.users[position] == user:
+            return np.asarray(self.top[position])
+        return None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "catalog_version": self.catalog_version,
+            "users": len(self.users),
+            "k": self.k,
+            "built_at": self.built_at,
+        }
+
+
+def load_precomputed(directory: Optional[str], catalog_version: str) -> Optional[Precomputed]:
+    """The batch job's lists in ``directory`` if they were built for this catalog version"""
+    if not directory or not os.path.exists(os.path.join(directory, META_FILE)):
+        return None
+    try:
+        precomputed = Precomputed(directory)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring precomputed recommendations in {directory}: {e}")
+        return None
+    if precomputed.catalog_version != catalog_version:
+        logger.info(
+            f"Precomputed recommendations are for catalog {precomputed.catalog_version}, "
+            f"serving {catalog_version}; scoring online"
+        )
+        return None
+    return precomputed
+
+
+class Recommender:
+    """Per-catalog-version recommendations: precomputed lists when available, else online scoring"""
+
+    def __init__(self, movies: Sequence[Dict[str, Any]], catalog_version: str, precomputed_dir: Optional[str] = None):
+        self.features = ItemFeatures(movies)
+        self.precomputed = load_precomputed(precomputed_dir, catalog_version)
+        self.served_precomputed = 0
+        self.served_online = 0
+
+    def recommend(
+        self,
+        user_id: Optional[str],
+        languages: Dict[str, float],
+        target: float,
+        completed: Dict[str, int],
+        limit: int,
+        language: Optional[str] = None,
+    ) -> List[int]:
+        """Movie columns of the user's top ``limit`` movies, best first.
+
+        ``languages`` and ``target`` come from :func:`declared_profile`;
+        ``completed`` maps movie ids to the user's completed lesson counts.
+        """
+        features = self.features
+        pairs = [(features.column[movie_id], count) for movie_id, count in completed.items() if movie_id in features.column]
+        history = (
+            np.zeros(len(pairs), dtype=np.int64),
+            np.array([column for column, _ in pairs], dtype=np.int64),
+            np.array([count for _, count in pairs], dtype=np.int64),
+        )
+        finished = set(features.finished(history)[1].tolist())
+
+        if self.precomputed is not None and user_id and not language:
+            row = self.precomputed.lookup(user_id)
+            if row is not None:
+                # Lists predate completions made since the batch ran, so drop those here
+                columns = [column for column in row.tolist() if column >= 0 and column not in finished]
+                if len(columns) >= limit:
+                    self.served_precomputed += 1
+                    return columns[:limit]
+
+        declared = np.zeros((1, len(features.languages)))
+        for name, weight in languages.items():
+            if name in features.language_column:
+                declared[0, features.language_column[name]] = weight
+        allowed = None
+        if language:
+            if language not in features.language_column:
+                return []
+            allowed = features.language == features.language_column[language]
+
+        profiles = features.profiles(declared, np.array([target]), history)
+        columns, scores = features.top_k(profiles, limit, exclude=features.finished(history), allowed=allowed)
+        self.served_online += 1
+        return [column for column, score in zip(columns[0].tolist(), scores[0].tolist()) if score > -np.inf]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "movies": len(self.features),
+            "languages": len(self.features.languages),
+            "precomputed": self.precomputed.info() if self.precomputed else None,
+            "served_precomputed": self.served_precomputed,
+            "served_online": self.served_online,
+        }
+
+
+# Batch job
+
+def iter_user_blocks(connection: sqlite3.Connection, block: int) -> Iterator[List[Tuple[int, str, int]]]:
+    """(id, learning language, level) of every user, ``block`` users at a time in id order"""
+    cursor = connection.execute("SELECT id, learning_language, level FROM users ORDER BY id")
+    while True:
+        rows = cursor.fetchmany(block)
+        if not rows:
+            return
+        yield rows
+
+
+def block_history(connection: sqlite3.Connection, features: ItemFeatures, first: int, last: int, positions: Dict[int, int]):
+    """(row, movie column, completed lessons) for users ``first``..``last`` (rows from ``positions``)"""
+    cursor = connection.execute(
+        "SELECT user_id, movie_id, COUNT(DISTINCT lesson_id) FROM progress_events "
+        "WHERE user_id BETWEEN ? AND ? AND completed = 1 GROUP BY user_id, movie_id",
+        (first, last),
+    )
+    rows, columns, counts = [], [], []
+    for user_id, movie_id, count in cursor:
+        column = features.column.get(movie_id)
+        if column is not None and user_id in positions:
+            rows.append(positions[user_id])
+            columns.append(column)
+            counts.append(count)
+    return (
+        np.array(rows, dtype=np.int64),
+        np.array(columns, dtype=np.int64),
+        np.array(counts, dtype=np.int64),
+    )
+
+
+def build(db_path: str, catalog: Dict[str, Any], out_dir: str, k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+    """Score every user in the activity database and write their top-K lists to ``out_dir``"""
+    start = time.perf_counter()
+    features = ItemFeatures(catalog["movies"])
+    k = min(k, len(features))
+    block = max(1, BLOCK_CELLS // max(len(features), 1))
+
+    connection = sqlite3.connect(db_path)
+    try:
+        user_count = connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        users = np.empty(user_count, dtype=np.int64)
+        top = np.full((user_count, k), -1, dtype=np.int32)
+        done = 0
+        for rows in iter_user_blocks(connection, block):
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            positions = {user_id: i for i, user_id in enumerate(ids.tolist())}
+            declared = np.zeros((len(rows), len(features.languages)))
+            for i, (_, learning, _) in enumerate(rows):
+                if learning in features.language_column:
+                    declared[i, features.language_column[learning]] = 1.0
+            targets = np.array([level_target(level) for _, _, level in rows])
+            history = block_history(connection, features, int(ids[0]), int(ids[-1]), positions)
+
+            columns, scores = features.top_k(features.profiles(declared, targets, history), k, exclude=features.finished(history))
+            columns[~np.isfinite(scores)] = -1
+            users[done:done + len(rows)] = ids
+            top[done:done + len(rows)] = columns
+            done += len(rows)
+            logger.info(f"Scored {done}/{user_count} users")
+    finally:
+        connection.close()
+
+    os.makedirs(out_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=BUILD_PREFIX, dir=out_dir)
+    os.chmod(build_dir, 0o755)  # mkdtemp makes it private to the job's user
+    np.save(os.path.join(build_dir, USERS_FILE), users[:done])
+    np.save(os.path.join(build_dir, TOP_FILE), top[:done])
+    meta = {
+        "catalog_version": catalog.get("version", "unversioned"),
+        "movies": len(features),
+        "k": k,
+        "users": done,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "build": os.path.basename(build_dir),
+    }
+    previous = _published_build(out_dir)
+    # Written last and swapped in whole: readers only see the arrays once the metadata names them
+    tmp_path = os.path.join(out_dir, f".{META_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, META_FILE))
+    _remove_old_builds(out_dir, keep={meta["build"], previous})
+    meta["seconds"] = round(time.perf_counter() - start, 2)
+    return meta
+
+
+def _published_build(out_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(out_dir, META_FILE)) as f:
+            return json.load(f).get("build")
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_old_builds(out_dir: str, keep: set) -> None:
+    """Delete superseded builds; the one the previous metadata named stays for workers still loading it"""
+    for name in os.listdir(out_dir):
+        if name.startswith(BUILD_PREFIX) and name not in keep:
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    if None not in keep:
+        # Arrays from before build directories; mapped copies stay readable after the unlink
+        for name in (USERS_FILE, TOP_FILE):
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute top-K movie recommendations for every user")
+    parser.add_argument("--db", required=True, help="activity database (benchmarks.datagen layout)")
+    parser.add_argument("--catalog", help="catalog JSON or snapshot the API serves (defaults to the built-in mock catalog)")
+    parser.add_argument("--out", required=True, help="directory for the lists (RECOMMENDATIONS_DIR)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_K, help="movies kept per user")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    meta = build(args.db, load_catalog(args.catalog), args.out, args.top)
+    logger.info(
+        f"Wrote top-{meta['k']} lists for {meta['users']} users over {meta['movies']} movies "
+        f"(catalog {meta['catalog_version']}) to {args.out} in {meta['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
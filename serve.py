@@ -0,0 +1,189 @@
+"""
+CineFluent production server - multi-worker launcher with tuned gunicorn/uvicorn settings
+
+    python serve.py                       # workers sized from the CPUs available
+    WEB_CONCURRENCY=4 python serve.py --port 8000
+
+With gunicorn installed (Linux/macOS) the app is imported once in the master
+(catalog and mock data loaded before fork, then frozen out of the cyclic GC
+so workers share those pages copy-on-write) and served by uvicorn workers on
+uvloop/httptools. Workers are recycled after a jittered number of requests
+and given ``graceful_timeout`` to drain in-flight requests and run the
+lifespan shutdown (which flushes the event log). Without gunicorn it falls
+back to uvicorn's own multi-process mode, which imports the app per worker
+and does not recycle workers.
+
+Background threads (catalog watcher, analytics refresh, event log flusher)
+are started per worker by the app's lifespan handler, never in the master, so
+none are lost across fork; each worker also warms up there before accepting
+requests.
+"""
+import argparse
+import gc
+import importlib
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+APP = "main:app"
+DEFAULT_MAX_REQUESTS = 10_000
+DEFAULT_GRACEFUL_TIMEOUT = 30  # seconds
+DEFAULT_KEEPALIVE = 5  # seconds
+
+
+def available_cpus() -> int:
+    """CPUs this process may actually use: affinity mask, capped by a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set (Render/Heroku convention), else one async worker per CPU"""
+    configured = os.getenv("WEB_CONCURRENCY")
+    return max(1, int(configured)) if configured else available_cpus()
+
+
+def _fast_option(module: str, preferred: str) -> str:
+    try:
+        __import__(module)
+        return preferred
+    except ImportError:
+        return "auto"
+
+
+def uvicorn_options() -> Dict[str, Any]:
+    """Event loop, HTTP parser and logging settings shared by both server modes"""
+    return {
+        "loop": _fast_option("uvloop", "uvloop"),
+        "http": _fast_option("httptools", "httptools"),
+        "access_log": False,  # Requests are already logged by the app's middleware
+        "proxy_headers": True,
+        # Peers whose X-Forwarded-For is believed. Only a proxy in front of every request may be trusted,
+        # else clients choose their own IP (and so their rate-limit bucket); platforms set this explicitly
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        "timeout_keep_alive": DEFAULT_KEEPALIVE,
+    }
+
+
+def gunicorn_available() -> bool:
+    if os.name != "posix":
+        return False
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _uvicorn_worker_class():
+    try:
+        from uvicorn_worker import UvicornWorker  # Where the worker lives in newer uvicorn releases
+    except ImportError:
+        from uvicorn.workers import UvicornWorker
+
+    options = uvicorn_options()
+
+    class TunedUvicornWorker(UvicornWorker):
+        CONFIG_KWARGS = {
+            **UvicornWorker.CONFIG_KWARGS,
+            "loop": options["loop"],
+            "http": options["http"],
+            "proxy_headers": options["proxy_headers"],
+            "forwarded_allow_ips": options["forwarded_allow_ips"],
+        }
+
+    return TunedUvicornWorker
+
+
+def _freeze_preloaded(server, worker) -> None:
+    # Everything the master imported is long-lived; moving it to the permanent
+    # generation stops GC passes in the workers from touching (and copying) those pages
+    gc.collect()
+    gc.freeze()
+
+
+def run_gunicorn(host: str, port: int, workers: int, max_requests: int, graceful_timeout: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    # Preload in the master, before fork (this also sets up the app's logging)
+    module_name, app_name = APP.split(":")
+    application = getattr(importlib.import_module(module_name), app_name)
+    logger.info(f"Starting CineFluent API with gunicorn: {workers} workers on {host}:{port}")
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": _uvicorn_worker_class(),
+        "preload_app": True,
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests // 10,  # Stagger recycling so workers don't restart together
+        "graceful_timeout": graceful_timeout,
+        "timeout": graceful_timeout + 30,
+        "keepalive": DEFAULT_KEEPALIVE,
+        "accesslog": None,
+        "errorlog": "-",
+        "loglevel": "info",
+        "pre_fork": _freeze_preloaded,
+    }
+
+    class ProductionServer(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    ProductionServer().run()
+
+
+def run_uvicorn(host: str, port: int, workers: int, graceful_timeout: int) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        APP,
+        host=host,
+        port=port,
+        workers=workers,
+        log_level="info",
+        timeout_graceful_shutdown=graceful_timeout,
+        **uvicorn_options(),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the CineFluent API with production settings")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None, help="default: WEB_CONCURRENCY or one per CPU")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", str(DEFAULT_MAX_REQUESTS))),
+                        help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", str(DEFAULT_GRACEFUL_TIMEOUT))))
+    parser.add_argument("--server", choices=("auto", "gunicorn", "uvicorn"), default=os.getenv("SERVER", "auto"))
+    args = parser.parse_args(argv)
+
+    workers = args.workers or worker_count()
+    server = args.server
+    if server == "auto":
+        server = "gunicorn" if gunicorn_available() else "uvicorn"
+    if server == "gunicorn":
+        run_gunicorn(args.host, args.port, workers, args.max_requests, args.graceful_timeout)
+    else:
+        run_uvicorn(args.host, args.port, workers, args.graceful_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+CineFluent shared state - a SQLite file for state every worker on a host must agree on
+
+The read cache and the rate limiter each have their own shared backend. This
+one holds state that must outlive any one worker and must not be evicted the
+way a cache entry can: per-user versions, mastered words, preferences, and
+the analytics aggregates each worker publishes. A subsystem given a
+SharedState keeps its state in its own tables in this file. Without one, it
+keeps its state in process memory, one copy per worker.
+
+Connections are opened per thread and per process, as in the other SQLite
+backends. A call can wait up to ``timeout`` seconds for the file lock, so
+callers on the event loop run it on a worker thread.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SharedState:
+    """A SQLite file (WAL) shared by every worker on the host"""
+
+    def __init__(self, path: str, timeout: float = 1.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # A connection must not cross fork(): workers forked from a preloading master open their own
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the app, not of the host
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def create_tables(self, script: str) -> None:
+        self.connection().executescript(script)
+
+    def open(self) -> None:
+        """Connect from the calling thread ahead of its first use"""
+        self.connection()
+
+
+def create_state(url: str) -> Optional[SharedState]:
+    """Shared state from a STATE_BACKEND setting: "memory" (per worker) or "sqlite:///path/to/file.db" """
+    if url.startswith("sqlite:///"):
+        return SharedState(url[len("sqlite:///"):])
+    if url in ("", "memory"):
+        return None
+    raise ValueError(f"Unsupported state backend: {url}")
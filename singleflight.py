@@ -0,0 +1,265 @@
+"""
+CineFluent single-flight reads - one computation per key, however many requests ask at once
+
+When a cached value is missing or expired, the first request for a key starts
+computing it and every concurrent request for the same key awaits that one
+computation instead of rebuilding it (no thundering herd). Values can outlive
+their TTL by a stale window, during which callers get the previous value
+immediately while a single background refresh replaces it. Waiters give up
+after a per-key timeout, but the computation itself carries on so the next
+caller can still use it.
+
+Values live in a pluggable store; MemoryStore is a bounded per-process LRU and
+cache.TwoTierCache adds a store shared by all workers. Entries can carry tags
+(e.g. the catalog version they were built from) for bulk invalidation. A
+store whose reads and writes may wait on I/O sets ``blocking``; lookups then
+try its ``local()`` tier on the event loop and do everything else on the
+default executor, so a busy shared tier never stalls the loop.
+"""
+import asyncio
+import inspect
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 2048
+
+_DEFAULT: Any = object()
+
+
+class Entry(NamedTuple):
+    value: Any
+    fresh_until: float  # clock time after which the value is stale
+    stale_until: float  # clock time after which it may not be served at all
+
+
+class Store:
+    """Where single-flight results are kept; get() may return expired entries"""
+
+    blocking = False  # True when get/set/delete may wait on I/O; SingleFlight then calls them off the event loop
+
+    def local(self, key: Hashable) -> Optional[Entry]:
+        """The entry if it can be found without blocking; None sends a blocking store to get()"""
+        return self.get(key)
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, entry: Entry, tags: Tuple[str, ...] = ()) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def invalidate_tag(self, tag: str) -> None:
+        """Drop every entry stored with ``tag``"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryStore(Store):
+    """Per-process LRU holding at most ``max_entries`` keys"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Entry]" = OrderedDict()
+        self._tags: Dict[Hashable, Tuple[str, ...]] = {}
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, entry: Entry, tags: Tuple[str, ...] = ()) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if tags:
+            self._tags[key] = tags
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._tags.pop(evicted, None)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._tags.pop(key, None)
+
+    def invalidate_tag(self, tag: str) -> None:
+        for key in [key for key, tags in self._tags.items() if tag in tags]:
+            self.delete(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlightTimeout(Exception):
+    def __init__(self, key: Hashable, timeout: float):
+        super().__init__(f"Timed out after {timeout}s waiting for {key!r}")
+        self.key = key
+        self.timeout = timeout
+
+
+Compute = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class SingleFlight:
+    """Coalesces concurrent computations per key, with TTL and stale-while-revalidate.
+
+    ``ttl=None`` keeps a value until it is evicted or invalidated, which suits
+    keys that already embed a version (e.g. the catalog version).
+    """
+
+    def __init__(
+        self,
+        store: Optional[Store] = None,
+        ttl: Optional[float] = 30.0,
+        stale_ttl: float = 0.0,
+        timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.store = store if store is not None else MemoryStore()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.clock = clock
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self._flight_tags: Dict[Hashable, Tuple[str, ...]] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def get(
+        self,
+        key: Hashable,
+        compute: Compute,
+        ttl: Optional[float] = _DEFAULT,
+        stale_ttl: float = _DEFAULT,
+        timeout: Optional[float] = _DEFAULT,
+        in_thread: bool = False,
+        tags: Tuple[str, ...] = (),
+    ) -> Any:
+        """Cached value for ``key``, computing it at most once at a time.
+
+        ``compute`` may be a plain function or return an awaitable; pass
+        ``in_thread=True`` for CPU-heavy functions so they run off the event loop.
+        """
+        ttl = self.ttl if ttl is _DEFAULT else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is _DEFAULT else stale_ttl
+        timeout = self.timeout if timeout is _DEFAULT else timeout
+
+        entry = self.store.local(key)
+        if entry is None and self.store.blocking:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self.store.get, key)
+        if entry is not None:
+            now = self.clock()
+            if now < entry.fresh_until:
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._flight(key, compute, ttl, stale_ttl, in_thread, tags)  # Refresh in the background
+                return entry.value
+
+        flight, started = self._flight(key, compute, ttl, stale_ttl, in_thread, tags)
+        if started:
+            self.misses += 1
+        else:
+            self.coalesced += 1
+        try:
+            # shield() so a waiter timing out or disconnecting never cancels the shared computation
+            return await asyncio.wait_for(asyncio.shield(flight), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SingleFlightTimeout(key, timeout) from None
+
+    def _flight(self, key: Hashable, compute: Compute, ttl: Optional[float], stale_ttl: float, in_thread: bool, tags: Tuple[str, ...]):
+        flight = self._flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = asyncio.ensure_future(self._run(key, compute, ttl, stale_ttl, in_thread, tags))
+        self._flights[key] = flight
+        if tags:
+            self._flight_tags[key] = tags
+        flight.add_done_callback(lambda done: self._landed(key, done))
+        return flight, True
+
+    async def _run(self, key: Hashable, compute: Compute, ttl: Optional[float], stale_ttl: float, in_thread: bool, tags: Tuple[str, ...]) -> Any:
+        loop = asyncio.get_running_loop()
+        if in_thread:
+            value = await loop.run_in_executor(None, compute)
+        else:
+            value = compute()
+        if inspect.isawaitable(value):
+            value = await value
+        # An invalidate() while computing detaches this flight; its result must not be stored
+        if self._flights.get(key) is asyncio.current_task():
+            fresh_until = self.clock() + (math.inf if ttl is None else ttl)
+            entry = Entry(value, fresh_until, fresh_until + stale_ttl)
+            if not self.store.blocking:
+                self.store.set(key, entry, tags)
+            else:
+                # The flight stays registered until the write lands, so callers keep coalescing onto it
+                await loop.run_in_executor(None, self.store.set, key, entry, tags)
+                if self._flights.get(key) is not asyncio.current_task():
+                    # Invalidated while the write was in flight: it may have landed after the eviction
+                    await loop.run_in_executor(None, self.store.delete, key)
+        return value
+
+    def _landed(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+            self._flight_tags.pop(key, None)
+        if not flight.cancelled() and flight.exception() is not None:
+            # Retrieved here so background refreshes with no waiter don't warn; waiters still get it raised
+            logger.warning(f"Computing {key!r} failed: {flight.exception()}")
+
+    def invalidate(self, key: Hashable) -> None:
+        self.store.delete(key)
+        self._flights.pop(key, None)
+        self._flight_tags.pop(key, None)
+
+    def invalidate_tag(self, tag: str) -> None:
+        """Drop entries tagged ``tag``; computations already running for them won't be stored"""
+        self.store.invalidate_tag(tag)
+        for key, tags in list(self._flight_tags.items()):
+            if tag in tags:
+                self._flights.pop(key, None)
+                self._flight_tags.pop(key, None)
+
+    async def invalidate_tag_async(self, tag: str) -> None:
+        """invalidate_tag() for callers on the event loop; a blocking store is invalidated off it"""
+        for key, tags in list(self._flight_tags.items()):
+            if tag in tags:
+                self._flights.pop(key, None)
+                self._flight_tags.pop(key, None)
+        if self.store.blocking:
+            await asyncio.get_running_loop().run_in_executor(None, self.store.invalidate_tag, tag)
+        else:
+            self.store.invalidate_tag(tag)
+
+    def clear(self) -> None:
+        self.store.clear()
+        self._flights.clear()
+        self._flight_tags.clear()
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._flights),
+        }
@@ -0,0 +1,111 @@
+"""
+CineFluent subtitle corpus - SRT parsing and cue loading for the batch jobs
+"""
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+_TIMING_RE = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})"
+)
+_TAG_RE = re.compile(r"<[^>]+>|\{[^}]+\}")
+
+
+class Cue(NamedTuple):
+    start: float  # seconds
+    end: float  # seconds
+    text: str
+
+
+def _seconds(hours: str, minutes: str, seconds: str, millis: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis.ljust(3, "0")) / 1000
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert a lesson timestamp like "00:03:24" (or "00:03:24,500") to seconds"""
+    value = value.strip().replace(",", ".")
+    parts = value.split(":")
+    total = 0.0
+    for part in parts:
+        total = total * 60 + float(part or 0)
+    return total
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_srt(text: str) -> List[Cue]:
+    """Parse SRT text into cues sorted by start time, stripping formatting tags"""
+    cues = []
+    for block in re.split(r"\r?\n\s*\r?\n", text.lstrip("\ufeff")):
+        lines = [line.strip() for line in block.strip().splitlines()]
+        for i, line in enumerate(lines):
+            match = _TIMING_RE.search(line)
+            if match:
+                groups = match.groups()
+                body = " ".join(_TAG_RE.sub("", l) for l in lines[i + 1:] if l)
+                if body:
+                    cues.append(Cue(_seconds(*groups[:4]), _seconds(*groups[4:]), body))
+                break
+    cues.sort(key=lambda cue: cue.start)
+    return cues
+
+
+def load_srt(path: str) -> List[Cue]:
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        return parse_srt(f.read())
+
+
+def corpus_path(directory: str, movie_id: str) -> str:
+    return os.path.join(directory, f"{movie_id}.srt")
+
+
+def assign_cues_to_lessons(cues: List[Cue], lessons: List[dict]) -> Dict[str, List[Cue]]:
+    """Split a movie's cues between its lessons.
+
+    Lessons are ordered by their ``timestamp``; a cue belongs to the last lesson
+    starting at or before it (cues before the first lesson go to the first one).
+    """
+    ordered = sorted(lessons, key=lambda lesson: parse_timestamp(lesson.get("timestamp", "0")))
+    starts = [parse_timestamp(lesson.get("timestamp", "0")) for lesson in ordered]
+    assigned: Dict[str, List[Cue]] = {lesson["id"]: [] for lesson in ordered}
+    if not ordered:
+        return assigned
+    index = 0
+    for cue in cues:
+        while index + 1 < len(starts) and starts[index + 1] <= cue.start:
+            index += 1
+        assigned[ordered[index]["id"]].append(cue)
+    return assigned
+
+
+def lesson_cues(catalog: dict, corpus_dir: str = None) -> Dict[str, List[Cue]]:
+    """Cues per lesson id for the whole catalog.
+
+    With a corpus directory the movie subtitle files are split between lessons;
+    lessons of movies without a subtitle file (or without a corpus at all) fall
+    back to a single cue built from the lesson's own ``subtitle`` line.
+    """
+    by_movie: Dict[str, List[dict]] = {}
+    for lesson in catalog["lessons"]:
+        by_movie.setdefault(lesson["movieId"], []).append(lesson)
+
+    result: Dict[str, List[Cue]] = {}
+    for movie_id, lessons in by_movie.items():
+        path = corpus_path(corpus_dir, movie_id) if corpus_dir else None
+        if path and os.path.exists(path):
+            result.update(assign_cues_to_lessons(load_srt(path), lessons))
+            continue
+        for lesson in lessons:
+            result[lesson["id"]] = [subtitle_cue(lesson)]
+    return result
+
+
+def subtitle_cue(lesson: dict) -> Cue:
+    """A single cue for the lesson's own ``subtitle`` line, starting at its ``timestamp``"""
+    start = parse_timestamp(lesson.get("timestamp", "0"))
+    # Without real cue timings assume a typical 2.5 words/second delivery
+    duration = max(1.0, len(lesson.get("subtitle", "").split()) / 2.5)
+    return Cue(start, start + duration, lesson.get("subtitle", ""))
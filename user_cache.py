@@ -0,0 +1,156 @@
+"""
+CineFluent user state cache - per-user version counters, versioned responses and ETags
+
+Per-user responses (profile, stats, languages, preferences) are cached by
+(endpoint, user, user version) instead of by time. Every write to a user's
+state (progress, preferences, mastered words, posts and likes) calls
+``bump(user_id)``, so the next read misses and rebuilds: a user always reads
+their own writes, and an unchanged user is served from memory however long
+ago the entry was built. Superseded versions are never read again and simply
+age out of the LRU.
+
+Cached values are the encoded JSON body, so a hit skips serialization too.
+ETags are derived from the version (plus anything else the response depends
+on, such as the catalog version), so ``If-None-Match`` is answered with a 304
+before anything is looked up.
+
+With a SharedState, versions are rows in its SQLite file, read on every
+request and incremented on every write. A write handled by one worker is
+then seen by all of them. Without one, versions live in memory per worker.
+They come from a single write sequence, and only the MAX_USERS most recently
+written users are remembered. A user who is forgotten reads as the sequence
+value at the time they were forgotten. That value is higher than any version
+they had, so no old ETag matches it. ETags carry a per-process epoch, so an
+ETag from another worker, or from before a restart, never matches by accident.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
+
+from cache import LRUCache
+from shared_state import SharedState
+from singleflight import Entry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+MAX_USERS = 100_000  # versions remembered per worker without a SharedState
+CACHE_CONTROL = "private, no-cache"  # clients may keep the body but must revalidate with If-None-Match
+
+
+class UserStateCache:
+    """User version counters and the response cache keyed by them"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, shared: Optional[SharedState] = None,
+                 max_users: int = MAX_USERS):
+        self.shared = shared
+        self.max_users = max_users
+        self.epoch = uuid.uuid4().hex[:8]
+        self.bumps = 0
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0  # version of users no longer in _versions
+        self._cache = LRUCache(max_bytes)
+        self._lock = threading.Lock()
+        if shared is not None:
+            shared.create_tables(
+                "CREATE TABLE IF NOT EXISTS user_versions (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID;"
+            )
+
+    def version(self, user_id: Optional[str]) -> int:
+        """The user's current version (blocks on SQLite with a SharedState)"""
+        if not user_id:
+            return 0
+        if self.shared is not None:
+            row = self.shared.connection().execute(
+                "SELECT version FROM user_versions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return row[0] if row else 0
+        with self._lock:
+            return self._versions.get(user_id, self._floor)
+
+    def _bump(self, user_id: str) -> int:
+        if self.shared is not None:
+            with self.shared.transaction() as connection:
+                version = connection.execute(
+                    "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+                    "ON CONFLICT(user_id) DO UPDATE SET version = version + 1 RETURNING version",
+                    (user_id,),
+                ).fetchone()[0]
+            self.bumps += 1
+            return version
+        with self._lock:
+            self._sequence += 1
+            self._versions[user_id] = self._sequence
+            self._versions.move_to_end(user_id)
+            if len(self._versions) > self.max_users:
+                self._versions.popitem(last=False)
+                self._floor = self._sequence
+            self.bumps += 1
+        return self._sequence
+
+    async def bump(self, user_id: Optional[str]) -> int:
+        """Record a write to the user's state; cached responses of older versions stop being served"""
+        if not user_id:
+            return 0
+        if self.shared is None:
+            return self._bump(user_id)
+        try:
+            return await run_in_threadpool(self._bump, user_id)
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to bump the version of {user_id}; other workers may serve stale responses: {e}")
+            return 0
+
+    def etag(self, name: str, user_id: Optional[str], version: int, *parts: Hashable) -> str:
+        """Weak ETag of ``version`` of the user's ``name``"""
+        tag = f"{self.epoch}:{name}:{user_id or ''}:{version}:{parts!r}"
+        return f'W/"{hashlib.blake2b(tag.encode("utf-8"), digest_size=8).hexdigest()}"'
+
+    def body(self, name: str, user_id: Optional[str], version: int, build: Callable[[], Any], *parts: Hashable) -> bytes:
+        """JSON body of ``build()`` for ``version``, built at most once per version"""
+        key = (name, user_id, version, parts)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry.value
+        self.stats["misses"] += 1
+        data = JSONResponse(jsonable_encoder(build())).body
+        self._cache.set(key, Entry(data, float("inf"), float("inf")), len(data))
+        return data
+
+    async def respond(self, headers: Mapping[str, str], name: str, user_id: Optional[str], build: Callable[[], Any],
+                      *parts: Hashable) -> Response:
+        """304 when the client's ETag is current, else the (cached) JSON body with its ETag"""
+        try:
+            version = await run_in_threadpool(self.version, user_id) if self.shared is not None else self.version(user_id)
+        except sqlite3.Error as e:
+            # Without the current version nothing cached can be trusted: answer fresh and uncacheable
+            self.stats["errors"] += 1
+            logger.warning(f"Could not read the version of {user_id}, answering uncached: {e}")
+            return JSONResponse(jsonable_encoder(build()), headers={"cache-control": "no-store"})
+        etag = self.etag(name, user_id, version, *parts)
+        response_headers = {"etag": etag, "cache-control": CACHE_CONTROL, "vary": "Authorization"}
+        if etag in (tag.strip() for tag in headers.get("if-none-match", "").split(",")):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=response_headers)
+        return Response(self.body(name, user_id, version, build, *parts), media_type="application/json", headers=response_headers)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "shared": self.shared is not None,
+            "users": len(self._versions),
+            "bumps": self.bumps,
+            "cached_responses": len(self._cache),
+            "cached_bytes": self._cache.size,
+            **self.stats,
+        }
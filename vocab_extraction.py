@@ -0,0 +1,297 @@
+"""
+CineFluent vocabulary extraction - batch job building per-lesson vocabulary from the subtitle corpus
+
+Tokenizes every cue, reduces tokens to lemma-lite forms and counts them in
+parallel: the corpus is sharded by lesson across a ProcessPoolExecutor, each
+worker returns Counters and the results are merged map-reduce style. Words are
+then ranked per lesson by salience (how much more often the lesson uses a word
+than the corpus does) weighted by corpus frequency, and the top words are
+written back into the catalog as VocabularyItem dicts.
+
+Usage:
+    python vocab_extraction.py --corpus subtitles/ --catalog catalog.json --out catalog.json
+    python vocab_extraction.py --corpus subtitles/ --benchmark
+"""
+import argparse
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from catalog import load_catalog, new_version, save_catalog
+from subtitles import lesson_cues
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORDS_PER_LESSON = 8
+MIN_WORD_LENGTH = 3
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+STOPWORDS = {
+    "Spanish": {
+        "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "y", "o",
+        "en", "con", "por", "para", "que", "qué", "es", "son", "soy", "eres", "está", "están",
+        "mi", "mis", "tu", "tus", "su", "sus", "se", "lo", "le", "les", "me", "te", "nos",
+        "yo", "él", "ella", "ellos", "ellas", "nosotros", "usted", "ustedes", "no", "sí", "si",
+        "pero", "muy", "más", "como", "este", "esta", "esto", "ese", "esa", "eso", "hay", "ya",
+    },
+    "French": {
+        "le", "la", "les", "un", "une", "des", "de", "du", "et", "ou", "en", "dans", "avec",
+        "pour", "par", "que", "qui", "est", "sont", "suis", "es", "mon", "ma", "mes", "ton",
+        "ta", "tes", "son", "sa", "ses", "se", "ce", "cette", "ces", "je", "tu", "il", "elle",
+        "nous", "vous", "ils", "elles", "ne", "pas", "oui", "non", "mais", "très", "plus",
+        "comme", "au", "aux", "on", "y", "c'est", "qu", "est-ce",
+    },
+    "German": {
+        "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer",
+        "und", "oder", "in", "im", "mit", "für", "von", "zu", "zum", "zur", "ist", "sind",
+        "bin", "bist", "mein", "meine", "dein", "deine", "sein", "seine", "ich", "du", "er",
+        "sie", "es", "wir", "ihr", "nicht", "ja", "nein", "aber", "sehr", "mehr", "wie", "auf",
+    },
+}
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def lemmatize(token: str, language: str) -> str:
+    """Lemma-lite: fold plural inflections so "peces"/"pez" and "océans"/"océan" count together"""
+    if language == "Spanish" and len(token) > 4:
+        if token.endswith("ces"):
+            return token[:-3] + "z"
+        if token.endswith("es") and token[-3] not in "aeiouáéíóú":
+            return token[:-2]
+        if token.endswith("s") and token[-2] in "aeiou":
+            return token[:-1]
+    elif language == "French" and len(token) > 3:
+        if token.endswith("aux"):
+            return token[:-3] + "al"
+        if token[-1] in "sx" and not token.endswith("ss"):
+            return token[:-1]
+    elif language == "German" and len(token) > 5 and token.endswith("en"):
+        return token[:-1] if token.endswith("nen") else token[:-2]
+    return token
+
+
+def tokenize(text: str, language: str) -> List[str]:
+    """Lemmatized content words of a subtitle line (stopwords and short tokens dropped)"""
+    stopwords = STOPWORDS.get(language, set())
+    return [
+        lemmatize(token, language)
+        for token in _WORD_RE.findall(normalize(text))
+        if len(token) >= MIN_WORD_LENGTH and token not in stopwords
+    ]
+
+
+class LessonText(NamedTuple):
+    lesson_id: str
+    language: str
+    lines: List[str]
+
+
+class ShardCounts(NamedTuple):
+    corpus: Dict[str, Counter]  # language -> lemma counts
+    lessons: Dict[str, Counter]  # lesson id -> lemma counts
+    examples: Dict[str, Dict[str, str]]  # lesson id -> lemma -> first subtitle line using it
+    tokens: int
+
+
+def count_shard(shard: List[LessonText]) -> ShardCounts:
+    """Map step: count lemmas for one shard of lessons (runs in a worker process)"""
+    corpus: Dict[str, Counter] = {}
+    lessons: Dict[str, Counter] = {}
+    examples: Dict[str, Dict[str, str]] = {}
+    tokens = 0
+    for lesson in shard:
+        counts = Counter()
+        lesson_examples: Dict[str, str] = {}
+        for line in lesson.lines:
+            lemmas = tokenize(line, lesson.language)
+            counts.update(lemmas)
+            for lemma in lemmas:
+                lesson_examples.setdefault(lemma, line)
+        tokens += sum(counts.values())
+        corpus.setdefault(lesson.language, Counter()).update(counts)
+        lessons[lesson.lesson_id] = counts
+        examples[lesson.lesson_id] = lesson_examples
+    return ShardCounts(corpus, lessons, examples, tokens)
+
+
+def merge_counts(results: Iterable[ShardCounts]) -> ShardCounts:
+    """Reduce step: fold the per-shard Counters into corpus-wide totals"""
+    corpus: Dict[str, Counter] = {}
+    lessons: Dict[str, Counter] = {}
+    examples: Dict[str, Dict[str, str]] = {}
+    tokens = 0
+    for result in results:
+        for language, counts in result.corpus.items():
+            corpus.setdefault(language, Counter()).update(counts)
+        lessons.update(result.lessons)
+        examples.update(result.examples)
+        tokens += result.tokens
+    return ShardCounts(corpus, lessons, examples, tokens)
+
+
+def build_shards(texts: List[LessonText], shard_count: int) -> List[List[LessonText]]:
+    """Split lessons into roughly equal shards by line count (lessons are never split)"""
+    shards: List[List[LessonText]] = [[] for _ in range(max(1, shard_count))]
+    sizes = [0] * len(shards)
+    for text in sorted(texts, key=lambda t: len(t.lines), reverse=True):
+        smallest = sizes.index(min(sizes))
+        shards[smallest].append(text)
+        sizes[smallest] += len(text.lines)
+    return [shard for shard in shards if shard]
+
+
+def count_corpus(texts: List[LessonText], workers: Optional[int] = None) -> ShardCounts:
+    """Count the whole corpus, in-process for one worker or across a process pool"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return count_shard(texts)
+    # Several shards per worker keep the pool busy when shard sizes are uneven
+    shards = build_shards(texts, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_counts(pool.map(count_shard, shards))
+
+
+def corpus_texts(catalog: dict, corpus_dir: Optional[str] = None, cues: Optional[Dict[str, list]] = None) -> List[LessonText]:
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    cues = cues if cues is not None else lesson_cues(catalog, corpus_dir)
+    return [
+        LessonText(lesson["id"], languages.get(lesson["movieId"], ""), [cue.text for cue in cues.get(lesson["id"], [])])
+        for lesson in catalog["lessons"]
+    ]
+
+
+def frequency_ranks(counts: Counter) -> Dict[str, int]:
+    """1-based corpus frequency rank per lemma (1 = most frequent)"""
+    return {word: rank for rank, (word, _) in enumerate(counts.most_common(), start=1)}
+
+
+def rank_lesson_words(lesson_counts: Counter, corpus_counts: Counter, limit: int) -> List[Tuple[str, float]]:
+    """Rank a lesson's lemmas by salience weighted by corpus frequency.
+
+    Salience is the log ratio between the lemma's relative frequency in the
+    lesson and in the whole corpus, so lesson-specific words win over words that
+    are everywhere; the log corpus count then favours words learners will meet
+    again over one-off names and typos.
+    """
+    lesson_total = sum(lesson_counts.values()) or 1
+    corpus_total = sum(corpus_counts.values()) or 1
+    scored = []
+    for word, count in lesson_counts.items():
+        corpus_count = corpus_counts.get(word, count)
+        salience = math.log((count / lesson_total) / (corpus_count / corpus_total) + 1.0)
+        scored.append((word, salience * math.log1p(corpus_count)))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+
+def apply_vocabulary(catalog: dict, counts: ShardCounts, words_per_lesson: int = DEFAULT_WORDS_PER_LESSON) -> int:
+    """Write ranked vocabulary lists back into the catalog lessons.
+
+    Hand-curated items already on a lesson are kept first; extracted words fill
+    the list up to ``words_per_lesson``, reusing known translations where the
+    catalog has them. Returns the number of words added.
+    """
+    languages = {movie["id"]: movie["language"] for movie in catalog["movies"]}
+    known = {item["word"]: item for item in catalog["vocabulary"]}
+    for lesson in catalog["lessons"]:
+        for item in lesson.get("vocabulary", []):
+            known.setdefault(item["word"], item)
+
+    added = 0
+    for lesson in catalog["lessons"]:
+        language = languages.get(lesson["movieId"], "")
+        corpus_counts = counts.corpus.get(language, Counter())
+        lesson_counts = counts.lessons.get(lesson["id"], Counter())
+        vocabulary = list(lesson.get("vocabulary", []))
+        present = set()
+        for item in vocabulary:
+            lemmas = tokenize(item["word"], language)
+            present.add(lemmas[0] if lemmas else normalize(item["word"]))
+        for word, _ in rank_lesson_words(lesson_counts, corpus_counts, limit=words_per_lesson * 2):
+            if len(vocabulary) >= words_per_lesson:
+                break
+            if word in present:
+                continue
+            item = dict(known.get(word) or {
+                "word": word,
+                "translation": "",
+                "pronunciation": "",
+                "example": counts.examples.get(lesson["id"], {}).get(word, ""),
+            })
+            vocabulary.append(item)
+            present.add(word)
+            if word not in known:
+                known[word] = item
+                catalog["vocabulary"].append(item)
+            added += 1
+        lesson["vocabulary"] = vocabulary
+    return added
+
+
+def benchmark(texts: List[LessonText], max_workers: Optional[int] = None) -> List[dict]:
+    """Time the counting stage at 1, 2, 4, ... workers and report the scaling"""
+    max_workers = max_workers or os.cpu_count() or 1
+    worker_counts = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers})
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        counts = count_corpus(texts, workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        results.append({
+            "workers": workers,
+            "seconds": round(elapsed, 3),
+            "tokens_per_second": int(counts.tokens / elapsed) if elapsed else 0,
+            "speedup": round(baseline / elapsed, 2) if elapsed else 0.0,
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Extract per-lesson vocabulary from the subtitle corpus")
+    parser.add_argument("--corpus", help="directory of <movie_id>.srt subtitle files")
+    parser.add_argument("--catalog", help="catalog JSON to update (defaults to the built-in mock catalog)")
+    parser.add_argument("--out", help="where to write the updated catalog (defaults to --catalog)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to CPU count)")
+    parser.add_argument("--words-per-lesson", type=int, default=DEFAULT_WORDS_PER_LESSON)
+    parser.add_argument("--benchmark", action="store_true", help="report CPU scaling instead of writing the catalog")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    out = args.out or args.catalog
+    if not out and not args.benchmark:
+        parser.error("--out is required when no --catalog file is given")
+
+    catalog = load_catalog(args.catalog)
+    texts = corpus_texts(catalog, args.corpus)
+    logger.info(f"Loaded {len(texts)} lessons, {sum(len(t.lines) for t in texts)} subtitle lines")
+
+    if args.benchmark:
+        print(f"{'workers':>8} {'seconds':>9} {'tokens/s':>12} {'speedup':>8}")
+        for row in benchmark(texts, args.workers):
+            print(f"{row['workers']:>8} {row['seconds']:>9.3f} {row['tokens_per_second']:>12} {row['speedup']:>7.2f}x")
+        return
+
+    start = time.perf_counter()
+    counts = count_corpus(texts, args.workers)
+    logger.info(f"Counted {counts.tokens} tokens in {time.perf_counter() - start:.2f}s")
+
+    added = apply_vocabulary(catalog, counts, args.words_per_lesson)
+    catalog["version"] = new_version()
+    save_catalog(catalog, out)
+    logger.info(f"Added {added} vocabulary items, wrote catalog version {catalog['version']} to {out}")
+
+
+if __name__ == "__main__":
+    main()